@@ -0,0 +1,40 @@
+"""add url_stats_shards
+
+Revision ID: 5e0d2f6b1a38
+Revises: c81e4b7a90d5
+Create Date: 2026-10-17 11:26:05.904417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0d2f6b1a38'
+down_revision: Union[str, Sequence[str], None] = 'c81e4b7a90d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # fresh databases get the table from create_all at startup
+    if not inspector.has_table("url_mappings") or inspector.has_table("url_stats_shards"):
+        return
+    op.create_table(
+        "url_stats_shards",
+        sa.Column("short_code", sa.String(length=10), nullable=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("click_count", sa.BigInteger(), nullable=False),
+        sa.Column("last_clicked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["short_code"], ["url_mappings.short_code"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("short_code", "shard"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("url_stats_shards")
@@ -0,0 +1,50 @@
+"""add url_digests and shard_slots
+
+Revision ID: 9b4d7e21c6f3
+Revises: 5e0d2f6b1a38
+Create Date: 2026-10-17 13:02:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4d7e21c6f3'
+down_revision: Union[str, Sequence[str], None] = '5e0d2f6b1a38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # fresh databases get both tables from create_all at startup
+    if not inspector.has_table("url_mappings") or inspector.has_table("url_digests"):
+        return
+    op.create_table(
+        "url_digests",
+        sa.Column("long_url_hash", sa.String(length=64), primary_key=True),
+        sa.Column("short_code", sa.String(length=10), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        "shard_slots",
+        sa.Column("slot", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("moved_from", sa.Integer(), nullable=True),
+    )
+    # this database becomes shard 0; its existing URLs seed the dedup directory
+    op.execute(
+        "INSERT INTO url_digests (long_url_hash, short_code, created_at) "
+        "SELECT long_url_hash, short_code, created_at FROM url_mappings "
+        "WHERE long_url_hash IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("shard_slots")
+    op.drop_table("url_digests")
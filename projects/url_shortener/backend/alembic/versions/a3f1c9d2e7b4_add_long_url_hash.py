@@ -0,0 +1,78 @@
+"""add long_url_hash
+
+Revision ID: a3f1c9d2e7b4
+Revises: 316bab228b0d
+Create Date: 2026-10-17 09:12:44.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.url_digest import url_digest
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d2e7b4'
+down_revision: Union[str, Sequence[str], None] = '316bab228b0d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    # fresh databases get the column from create_all at startup
+    if not inspector.has_table("url_mappings"):
+        return
+    if "long_url_hash" not in {c["name"] for c in inspector.get_columns("url_mappings")}:
+        op.add_column("url_mappings", sa.Column("long_url_hash", sa.String(length=64), nullable=True))
+
+    # backfill in id-ordered batches, committing each one so locks stay short
+    last_id = 0
+    while True:
+        with op.get_context().autocommit_block():
+            rows = conn.execute(
+                sa.text(
+                    "SELECT id, long_url FROM url_mappings "
+                    "WHERE id > :last_id AND long_url_hash IS NULL "
+                    "ORDER BY id LIMIT :batch"
+                ),
+                {"last_id": last_id, "batch": BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                sa.text("UPDATE url_mappings SET long_url_hash = :digest WHERE id = :id"),
+                [{"id": row.id, "digest": url_digest(row.long_url)} for row in rows],
+            )
+            last_id = rows[-1].id
+
+    # rows created by the old check-then-insert race: keep the oldest mapping per url
+    op.execute(
+        "UPDATE url_mappings SET long_url_hash = NULL "
+        "WHERE long_url_hash IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM url_mappings WHERE long_url_hash IS NOT NULL GROUP BY long_url_hash)"
+    )
+
+    if conn.dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_url_mappings_long_url_hash", "url_mappings", ["long_url_hash"],
+                unique=True, postgresql_concurrently=True, if_not_exists=True,
+            )
+    else:
+        op.create_index(
+            "ix_url_mappings_long_url_hash", "url_mappings", ["long_url_hash"],
+            unique=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_url_mappings_long_url_hash", table_name="url_mappings")
+    op.drop_column("url_mappings", "long_url_hash")
@@ -0,0 +1,60 @@
+"""add id_blocks and make short_code not null
+
+Revision ID: c81e4b7a90d5
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-17 10:03:12.527610
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.id_to_base import id_to_base
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81e4b7a90d5'
+down_revision: Union[str, Sequence[str], None] = 'a3f1c9d2e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    # fresh databases get both tables from create_all at startup
+    if not inspector.has_table("url_mappings"):
+        return
+
+    if not inspector.has_table("id_blocks"):
+        op.create_table(
+            "id_blocks",
+            sa.Column("name", sa.String(length=64), primary_key=True),
+            sa.Column("next_id", sa.BigInteger(), nullable=False),
+        )
+    # leased ids continue after everything the autoincrement path handed out
+    op.execute(
+        "INSERT INTO id_blocks (name, next_id) "
+        "SELECT 'url_mappings', COALESCE(MAX(id), 0) + 1 FROM url_mappings "
+        "WHERE NOT EXISTS (SELECT 1 FROM id_blocks WHERE name = 'url_mappings')"
+    )
+
+    # rows left half-written by the old insert-then-update flow
+    rows = conn.execute(sa.text("SELECT id FROM url_mappings WHERE short_code IS NULL")).all()
+    if rows:
+        conn.execute(
+            sa.text("UPDATE url_mappings SET short_code = :code WHERE id = :id"),
+            [{"id": row.id, "code": id_to_base(row.id)} for row in rows],
+        )
+
+    with op.batch_alter_table("url_mappings") as batch_op:
+        batch_op.alter_column("short_code", existing_type=sa.String(length=10), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("url_mappings") as batch_op:
+        batch_op.alter_column("short_code", existing_type=sa.String(length=10), nullable=True)
+    op.drop_table("id_blocks")
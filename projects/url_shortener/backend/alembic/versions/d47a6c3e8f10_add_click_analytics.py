@@ -0,0 +1,51 @@
+"""add click_rollups and click_events
+
+Revision ID: d47a6c3e8f10
+Revises: 9b4d7e21c6f3
+Create Date: 2026-10-17 14:20:09.551873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd47a6c3e8f10'
+down_revision: Union[str, Sequence[str], None] = '9b4d7e21c6f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # fresh databases get both tables from create_all at startup
+    if not inspector.has_table("url_mappings") or inspector.has_table("click_rollups"):
+        return
+    op.create_table(
+        "click_rollups",
+        sa.Column("short_code", sa.String(length=10), nullable=False),
+        sa.Column("granularity", sa.String(length=6), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("click_count", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["short_code"], ["url_mappings.short_code"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("short_code", "granularity", "bucket_start"),
+    )
+    op.create_table(
+        "click_events",
+        sa.Column("short_code", sa.String(length=10), nullable=False),
+        sa.Column("clicked_at", sa.DateTime(timezone=True), nullable=False),
+        postgresql_partition_by="RANGE (clicked_at)",
+    )
+    op.create_index("ix_click_events_short_code", "click_events", ["short_code"])
+    if op.get_bind().dialect.name == "postgresql":
+        # monthly partitions are created ahead of time by the click aggregator
+        op.execute("CREATE TABLE IF NOT EXISTS click_events_default PARTITION OF click_events DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("click_events")
+    op.drop_table("click_rollups")
@@ -0,0 +1,41 @@
+"""add redirect policy columns to url_mappings
+
+Revision ID: e5b20c9f7a14
+Revises: d47a6c3e8f10
+Create Date: 2026-10-17 16:02:31.274518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b20c9f7a14'
+down_revision: Union[str, Sequence[str], None] = 'd47a6c3e8f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # fresh databases get the columns from create_all at startup
+    if not inspector.has_table("url_mappings"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("url_mappings")}
+    # constant server defaults: no table rewrite on Postgres 11+
+    if "redirect_status" not in columns:
+        op.add_column("url_mappings", sa.Column("redirect_status", sa.SmallInteger(), nullable=False, server_default="302"))
+    if "cache_max_age" not in columns:
+        op.add_column("url_mappings", sa.Column("cache_max_age", sa.Integer(), nullable=True))
+    if "immutable" not in columns:
+        op.add_column("url_mappings", sa.Column("immutable", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("url_mappings", "immutable")
+    op.drop_column("url_mappings", "cache_max_age")
+    op.drop_column("url_mappings", "redirect_status")
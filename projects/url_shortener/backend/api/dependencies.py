@@ -1,15 +1,56 @@
-from database import get_db
+from database import LazySession,get_db,get_read_db
 from services.cache import CacheService
+from services.local_cache import get_local_cache
+from services.ttl_policy import get_ttl_policy
+from services.short_code_filter import get_short_code_filter
+from services.id_allocator import get_id_allocator
+from services.background import get_background_executor
 from repository.stats import StatsRepository
 from repository.url import UrlRepository
+from repository.sharded import ShardedStatsRepository,ShardedUrlRepository
+from sharding import ShardSessions,get_shard_router
 from services.url import UrlShortenerService
-from sqlalchemy.ext.asyncio import AsyncSession
 from redis_client import get_redis
 from fastapi import Depends
 
-async def get_url_service(db:AsyncSession=Depends(get_db))->UrlShortenerService:
+async def get_shard_sessions(db:LazySession=Depends(get_db)):
+    """
+    Per-request shard sessions, or None when DATABASE_SHARD_URLS is not set.
+    The request's primary session is the directory.
+    """
+    router = get_shard_router()
+    if router is None:
+        yield None
+        return
+    shards = ShardSessions(router,db)
+    try:
+        yield shards
+    finally:
+        await shards.close()
+
+async def get_url_service(
+    db:LazySession=Depends(get_db),
+    read_db:LazySession=Depends(get_read_db),
+    shards:ShardSessions | None=Depends(get_shard_sessions)
+    )->UrlShortenerService:
     redis_client = await get_redis()
-    url_repo = UrlRepository(db)
-    stats_repo = StatsRepository(db)
-    cache = CacheService(redis_client)
-    return UrlShortenerService(url_repo,stats_repo,cache)
\ No newline at end of file
+    cache = CacheService(redis_client,get_local_cache(),get_ttl_policy())
+    if shards is not None:
+        return UrlShortenerService(
+            ShardedUrlRepository(shards),
+            ShardedStatsRepository(shards),
+            cache,
+            code_filter=get_short_code_filter(),
+            id_allocator=get_id_allocator(),
+            executor=get_background_executor()
+        )
+    return UrlShortenerService(
+        UrlRepository(db),
+        StatsRepository(db),
+        cache,
+        code_filter=get_short_code_filter(),
+        id_allocator=get_id_allocator(),
+        read_url_repo=UrlRepository(read_db) if read_db is not db else None,
+        read_stats_repo=StatsRepository(read_db) if read_db is not db else None,
+        executor=get_background_executor()
+    )
\ No newline at end of file
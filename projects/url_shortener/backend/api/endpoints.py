@@ -1,19 +1,54 @@
-from fastapi import Request,Depends,HTTPException,APIRouter
-from fastapi.responses import RedirectResponse
-from api.models import ShortenRequest, ShortenResponse,StatsResponse
-from database import get_db, get_engine
+from fastapi import Request,Depends,HTTPException,APIRouter,Query
+from fastapi.responses import RedirectResponse,StreamingResponse,Response
+from api.models import (
+    ShortenRequest,
+    ShortenResponse,
+    StatsResponse,
+    BulkShortenRequest,
+    BulkShortenResponse,
+    BulkShortenItem,
+    BatchResolveRequest,
+    BatchResolveResponse,
+    ClickBucket,
+    HotLink,
+    TopLinksResponse
+)
+from pydantic import ValidationError
+from datetime import datetime
+from typing import Literal
+import json
+import logging
 import os
 
 from models.model import UrlMapping,UrlStats
-from repository.stats import StatsRepository
 from services.url import UrlShortenerService
-from sqlalchemy.ext.asyncio import AsyncSession
+from services.click_aggregator import ClickAggregator,get_click_aggregator
+from services.unique_visitors import UniqueVisitors,get_unique_visitors
+from services.hot_links import HotLinks,get_hot_links,parse_window
+from services.export import EXPORT_MEDIA_TYPES,ExportEncoder,encode_export
+from repository.url import BATCH_SIZE
+from utils.fingerprint import visitor_fingerprint
+from utils.redirect_policy import RedirectPolicy
+
+logger = logging.getLogger(__name__)
 
-import asyncio
 from api.dependencies import get_url_service
 
 router = APIRouter()
-engine = get_engine()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that lets the body generator keep reading the request.
+
+    The stock response listens for http.disconnect on older ASGI servers,
+    which races the generator for receive() messages; here a disconnect
+    surfaces through request.stream() instead.
+    """
+    async def __call__(self,scope,receive,send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
 @router.post("/shorten",response_model=ShortenResponse,status_code=201)
 async def shorten_url(
     req:ShortenRequest,
@@ -24,9 +59,12 @@ async def shorten_url(
     """
     Shorten a given long URL.
     """
+    # a request without policy fields takes an existing code as it is
+    policy_set = req.model_fields_set & {"redirect_status","cache_max_age","immutable"}
     short_code = await service.shorten_url(
         long_url=str(req.long_url),
-        custom_code=req.custom_code
+        custom_code=req.custom_code,
+        policy=RedirectPolicy(req.redirect_status,req.cache_max_age,req.immutable) if policy_set else None
     )
 
     base_url = os.getenv("BASE_URL",str(request.base_url).rstrip('/'))
@@ -37,50 +75,250 @@ async def shorten_url(
     )
 
 
+@router.post("/shorten/bulk",response_model=BulkShortenResponse,status_code=201)
+async def shorten_urls_bulk(
+    req:BulkShortenRequest,
+    request:Request,
+    service:UrlShortenerService = Depends(get_url_service)
+    ):
+    """
+    Shorten a batch of long URLs in one request.
+    """
+    long_urls = [str(url) for url in req.long_urls]
+    short_codes = await service.shorten_many(long_urls)
+
+    base_url = os.getenv("BASE_URL",str(request.base_url).rstrip('/'))
+
+    return BulkShortenResponse(results=[
+        BulkShortenItem(
+            long_url=long_url,
+            short_code=short_codes[long_url],
+            short_url=f"{base_url}/{short_codes[long_url]}"
+        )
+        for long_url in long_urls
+    ])
+
+
+@router.post("/shorten/bulk/stream")
+async def shorten_urls_stream(
+    request:Request,
+    service:UrlShortenerService = Depends(get_url_service)
+    ):
+    """
+    Shorten an NDJSON stream of {"long_url": ...} lines.
+
+    Input is consumed in chunks of BULK_CHUNK_SIZE lines and each chunk is
+    shortened with shorten_many, so memory stays bounded however large the
+    upload is. Emits one NDJSON result (or error) line per input line.
+    """
+    base_url = os.getenv("BASE_URL",str(request.base_url).rstrip('/'))
+    chunk_size = int(os.getenv("BULK_CHUNK_SIZE","1000"))
+
+    async def shorten_chunk(chunk:list[tuple[int,bytes]]):
+        parsed,errors = [],{}
+        for line_no,line in chunk:
+            try:
+                parsed.append((line_no,str(ShortenRequest.model_validate_json(line).long_url)))
+            except ValidationError as exc:
+                errors[line_no] = exc.errors(include_url=False,include_context=False,include_input=False)
+        short_codes = await service.shorten_many([url for _,url in parsed]) if parsed else {}
+        results = {
+            line_no:{"long_url":url,"short_code":short_codes[url],"short_url":f"{base_url}/{short_codes[url]}"}
+            for line_no,url in parsed
+        }
+        for line_no,_ in chunk:
+            item = results.get(line_no) or {"line":line_no,"error":errors[line_no]}
+            yield json.dumps(item) + "\n"
+
+    async def results():
+        chunk,buffer,line_no = [],b"",0
+        async for data in request.stream():
+            buffer += data
+            *lines,buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    chunk.append((line_no,line))
+                if len(chunk) >= chunk_size:
+                    async for item in shorten_chunk(chunk):
+                        yield item
+                    chunk = []
+        if buffer.strip():
+            chunk.append((line_no + 1,buffer))
+        if chunk:
+            async for item in shorten_chunk(chunk):
+                yield item
+
+    return DuplexStreamingResponse(results(),media_type="application/x-ndjson")
+
+
+@router.post("/resolve/batch",response_model=BatchResolveResponse)
+async def resolve_batch(
+    req:BatchResolveRequest,
+    service:UrlShortenerService = Depends(get_url_service)
+    ):
+    """
+    Resolve many short codes at once without counting clicks.
+    """
+    return BatchResolveResponse(results=await service.resolve_many(req.short_codes))
+
+
+def record_click(
+    short_code:str,
+    request:Request,
+    clicks:ClickAggregator | None,
+    visitors:UniqueVisitors | None,
+    hot:HotLinks | None
+    ):
+    """
+    Buffers a click in the click aggregator, the hot link tracker and the
+    unique visitor sketches; all of them flush in the background.
+    """
+    if clicks:
+        clicks.record(short_code)
+    if hot:
+        hot.record(short_code)
+    if visitors:
+        client_ip = request.client.host if request.client else ""
+        visitors.record(short_code,visitor_fingerprint(client_ip,request.headers.get("user-agent","")))
+
+
+@router.get("/export")
+async def export_mappings(
+    fmt:Literal["csv","ndjson"] = Query("csv",alias="format"),
+    gzip:bool = False,
+    after_id:int = Query(0,ge=0),
+    batch_size:int = Query(BATCH_SIZE,ge=1,le=BATCH_SIZE),
+    service:UrlShortenerService = Depends(get_url_service)
+    ):
+    """
+    Streams every mapping with its click stats as CSV or NDJSON, in id order.
+
+    Rows are read in keyset pages of batch_size and encoded as they arrive,
+    so memory stays flat however many mappings there are. An interrupted
+    export resumes with after_id set to the last id received.
+    """
+    filename = f"url_mappings.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        encode_export(service.export_pages(after_id,batch_size),ExportEncoder(fmt,gzip)),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition":f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/{short_code}")
 async def redirect_url(
     short_code:str,
-    service:UrlShortenerService = Depends(get_db)
+    request:Request,
+    service:UrlShortenerService = Depends(get_url_service),
+    clicks:ClickAggregator | None = Depends(get_click_aggregator),
+    visitors:UniqueVisitors | None = Depends(get_unique_visitors),
+    hot:HotLinks | None = Depends(get_hot_links)
     ):
-    # check cache first
     """
     Redirects a shortened URL back to its original long URL.
 
-    Also schedules an asynchronous task to increment the click count for the shortened URL.
-
+    The status code and Cache-Control come from the mapping's redirect
+    policy. Redirects that browsers or CDNs may cache only reach the app
+    on the first click; later ones are counted through the beacon.
     """
-   
+    long_url,policy = await service.resolve_redirect(short_code)
+    record_click(short_code,request,clicks,visitors,hot)
 
-    long_url = await service.resolve_short_code(short_code)
+    redirect_response = RedirectResponse(url=long_url,status_code=policy.status,headers=policy.headers())
+    return redirect_response
 
-    # fire and forget click tracking
-    asyncio.create_task(track_click_background(short_code))
 
-    redirect_response = RedirectResponse(url=long_url,status_code=302)
-    return redirect_response
+@router.post("/beacon/{short_code}",status_code=204)
+async def click_beacon(
+    short_code:str,
+    request:Request,
+    service:UrlShortenerService = Depends(get_url_service),
+    clicks:ClickAggregator | None = Depends(get_click_aggregator),
+    visitors:UniqueVisitors | None = Depends(get_unique_visitors),
+    hot:HotLinks | None = Depends(get_hot_links)
+    ):
+    """
+    Counts a click that was served from a browser or CDN cache, e.g. sent
+    with navigator.sendBeacon by the landing page or by an edge worker.
+    Unknown codes get a 404 so they never reach the click counters.
+    """
+    await service.resolve_redirect(short_code)
+    record_click(short_code,request,clicks,visitors,hot)
+    return Response(status_code=204)
 
 
-async def track_click_background(short_code:str):
-    async with AsyncSession(engine) as session:
-        stats_repo = StatsRepository(session)
-        await stats_repo.increment_click(short_code)
+# declared ahead of /stats/{short_code}, which would otherwise match it
+@router.get("/stats/top",response_model=TopLinksResponse)
+async def get_top_links(
+    window:str = "5m",
+    limit:int = Query(10,ge=1,le=100),
+    hot:HotLinks | None = Depends(get_hot_links)
+    ):
+    """
+    The most redirected short codes over the last window (e.g. 30s, 5m, 1h),
+    across all workers, or as seen by this worker if Redis is unavailable.
+    """
+    if hot is None:
+        raise HTTPException(404,"Hot link tracking is disabled")
+    seconds = parse_window(window,hot.retention_minutes * 60)
+    ranked,scope = await hot.cluster_top(seconds,limit),"cluster"
+    if ranked is None:
+        ranked,scope = hot.top(seconds,limit),"worker"
+    return TopLinksResponse(
+        window=window,
+        scope=scope,
+        links=[HotLink(short_code=code,redirects=count) for code,count in ranked]
+    )
 
 
 @router.get("/stats/{short_code}", response_model=StatsResponse)
 async def get_stats(
     short_code:str, 
-    service:UrlShortenerService = Depends(get_url_service)
+    granularity:Literal["minute","hour","day"] | None = None,
+    start:datetime | None = None,
+    end:datetime | None = None,
+    visitor_days:int | None = Query(None,ge=1,le=366),
+    service:UrlShortenerService = Depends(get_url_service),
+    visitors:UniqueVisitors | None = Depends(get_unique_visitors)
     ):
-
+    """
+    Click totals for a short code. With granularity, also a time series of
+    clicks per minute/hour/day bucket between start and end (UTC), read
+    from the rollups. Unique visitors are HyperLogLog estimates (about 1%
+    error); visitor_days adds the count over the last N UTC days.
+    """
     url_mapping,url_stats = await service.get_stats(short_code)
     
     url_mapping:UrlMapping
     url_stats:UrlStats
 
+    series = None
+    if granularity:
+        series = [
+            ClickBucket(bucket_start=bucket,clicks=clicks)
+            for bucket,clicks in await service.get_click_series(short_code,granularity,start,end)
+        ]
+
+    unique_visitors = recent_unique_visitors = None
+    if visitors:
+        # the click stats do not depend on Redis; without it the estimates stay None
+        try:
+            unique_visitors = await visitors.count(short_code)
+            if visitor_days:
+                recent_unique_visitors = await visitors.count(short_code,days=visitor_days)
+        except Exception:
+            logger.exception("unique visitor count failed for %s",short_code)
+
     return StatsResponse(
         short_code=url_mapping.short_code,
         long_url=url_mapping.long_url,
         clicks=url_stats.click_count,
         created_at=url_mapping.created_at,
-        last_clicked_at=url_stats.last_clicked_at
+        last_clicked_at=url_stats.last_clicked_at,
+        granularity=granularity,
+        series=series,
+        unique_visitors=unique_visitors,
+        visitor_days=visitor_days if visitors else None,
+        recent_unique_visitors=recent_unique_visitors
     )
\ No newline at end of file
@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.requests import Request
+
+from api.endpoints import record_click
+from metrics import Counter, REQUEST_LATENCY
+from redis_client import get_redis
+from services.cache import CacheService, MISSING
+from services.click_aggregator import get_click_aggregator
+from services.hot_links import get_hot_links
+from services.local_cache import get_local_cache
+from services.short_code_filter import get_short_code_filter
+from services.ttl_policy import get_ttl_policy
+from services.unique_visitors import get_unique_visitors
+from utils.id_to_base import BASE62
+from utils.redirect_policy import decode_entry
+
+logger = logging.getLogger(__name__)
+
+_BASE62 = frozenset(BASE62)
+# same characters RedirectResponse leaves unescaped in Location
+_LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;"
+
+FAST_PATH_REQUESTS = Counter(
+    "redirect_fast_path_total","GET /{short_code} requests by fast path outcome",("outcome",)
+)
+
+class RedirectFastPath:
+    """
+    Pure ASGI wrapper answering cached redirects before FastAPI sees them.
+
+    GET /{short_code} with a base62 code whose entry is in the L1 or Redis
+    gets its redirect written straight to the socket: no routing, dependency
+    graph, CORS or response class. The click is recorded exactly as the
+    endpoint would. Everything else falls through to the app unchanged:
+    other methods and paths, codes shadowed by the app's own routes, cache
+    misses and negative entries (so 404s and DB loads keep one code path),
+    and requests with an Origin header, which need the CORS headers.
+    """
+    def __init__(self,app):
+        self.app = app
+        # fixed paths such as /metrics, /ready and /docs win over short codes
+        self.reserved = {path[1:] for route in app.routes if "{" not in (path := getattr(route,"path",""))}
+        self._cache:Optional[CacheService] = None
+
+    def _code(self,scope)->Optional[str]:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return None
+        code = scope["path"][1:]
+        if not code or code in self.reserved or not _BASE62.issuperset(code):
+            return None
+        for name,_ in scope["headers"]:
+            if name == b"origin":
+                return None
+        return code
+
+    async def _lookup(self,code:str)->Optional[str]:
+        code_filter = get_short_code_filter()
+        if code_filter is not None and not await code_filter.may_exist([code]):
+            return None
+        redis_client = await get_redis()
+        if redis_client is None:
+            return None
+        # built once per redis client; the dependency builds one per request
+        if self._cache is None or self._cache.redis is not redis_client:
+            self._cache = CacheService(redis_client,get_local_cache(),get_ttl_policy())
+        entry = await self._cache.get_url(code)
+        return entry if entry and entry != MISSING else None
+
+    async def __call__(self,scope,receive,send):
+        code = self._code(scope)
+        if code is None:
+            await self.app(scope,receive,send)
+            return
+
+        started = time.perf_counter()
+        try:
+            entry = await self._lookup(code)
+        except Exception:
+            logger.exception("fast path lookup failed for %s",code)
+            entry = None
+        if entry is None:
+            FAST_PATH_REQUESTS.inc(outcome="fallback")
+            await self.app(scope,receive,send)
+            return
+
+        long_url,policy = decode_entry(entry)
+        record_click(code,Request(scope),get_click_aggregator(),get_unique_visitors(),get_hot_links())
+        headers = [
+            (b"location",quote(long_url,safe=_LOCATION_SAFE).encode("latin-1")),
+            (b"content-length",b"0"),
+            # as the CORS middleware would, so shared caches key on Origin
+            (b"vary",b"Origin")
+        ]
+        headers.extend((name.lower().encode("latin-1"),value.encode("latin-1")) for name,value in policy.headers().items())
+        await send({"type":"http.response.start","status":policy.status,"headers":headers})
+        await send({"type":"http.response.body","body":b""})
+        FAST_PATH_REQUESTS.inc(outcome="served")
+        REQUEST_LATENCY.observe(time.perf_counter() - started,method="GET",route="/{short_code}",status=policy.status)
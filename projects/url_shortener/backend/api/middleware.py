@@ -0,0 +1,49 @@
+import time
+
+from metrics import (
+    DB_CHECKOUTS_PER_REQUEST,
+    DB_QUERIES_PER_REQUEST,
+    DB_SECONDS_PER_REQUEST,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    RequestStats,
+    current_request
+)
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and DB work per route.
+
+    The route label is the matched path template (e.g. /{short_code}),
+    so label cardinality stays bounded.
+    """
+    def __init__(self,app):
+        self.app = app
+
+    async def __call__(self,scope,receive,send):
+        if scope["type"] != "http":
+            await self.app(scope,receive,send)
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope,receive,send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            current_request.reset(token)
+            route = getattr(scope.get("route"),"path","unmatched")
+            REQUEST_LATENCY.observe(elapsed,method=scope["method"],route=route,status=status)
+            DB_QUERIES_PER_REQUEST.observe(stats.db_queries,route=route)
+            DB_SECONDS_PER_REQUEST.observe(stats.db_seconds,route=route)
+            DB_CHECKOUTS_PER_REQUEST.observe(stats.pool_checkouts,route=route)
@@ -1,9 +1,21 @@
 from datetime import datetime
-from pydantic import BaseModel,HttpUrl
+from typing import Literal
+from pydantic import BaseModel,Field,HttpUrl
 
 class ShortenRequest(BaseModel):
+    """
+    Request model for shortening a URL.
+
+    Attributes:
+    redirect_status (int): 302/307 for temporary, 301/308 for permanent redirects.
+    cache_max_age (int | None): Seconds browsers and CDNs may cache the redirect.
+    immutable (bool): The target never changes, so caches may keep it for a year.
+    """
     long_url:HttpUrl
     custom_code:str | None = None
+    redirect_status:Literal[301,302,307,308] = 302
+    cache_max_age:int | None = Field(None,ge=0,le=31_536_000)
+    immutable:bool = False
 
 class ShortenResponse(BaseModel):
     """
@@ -16,9 +28,74 @@ class ShortenResponse(BaseModel):
     short_code:str
     short_url:str
 
+class BulkShortenRequest(BaseModel):
+    long_urls:list[HttpUrl] = Field(min_length=1,max_length=10_000)
+
+class BulkShortenItem(ShortenResponse):
+    long_url:str
+
+class BulkShortenResponse(BaseModel):
+    """
+    Response model for bulk shortening.
+
+    Attributes:
+    results (list[BulkShortenItem]): One entry per input URL, in request order.
+    """
+    results:list[BulkShortenItem]
+
+class BatchResolveRequest(BaseModel):
+    short_codes:list[str] = Field(min_length=1,max_length=1000)
+
+class BatchResolveResponse(BaseModel):
+    """
+    Response model for batch resolution.
+
+    Attributes:
+    results (dict[str, str | None]): short_code -> long_url, None for unknown codes.
+    """
+    results:dict[str,str | None]
+
+class ClickBucket(BaseModel):
+    bucket_start:datetime
+    clicks:int
+
 class StatsResponse(BaseModel):
+    """
+    Response model for URL stats.
+
+    Attributes:
+    granularity (str | None): Bucket size of series, when one was requested.
+    series (list[ClickBucket] | None): Clicks per bucket, oldest first.
+    unique_visitors (int | None): Estimated distinct visitors, all time.
+    visitor_days (int | None): Window of recent_unique_visitors, in UTC days.
+    recent_unique_visitors (int | None): Estimated distinct visitors in that window.
+    """
     short_code:str
     long_url:str
     clicks:int
     created_at:datetime
-    last_clicked_at:datetime | None
\ No newline at end of file
+    last_clicked_at:datetime | None
+    granularity:str | None = None
+    series:list[ClickBucket] | None = None
+    unique_visitors:int | None = None
+    visitor_days:int | None = None
+    recent_unique_visitors:int | None = None
+
+class HotLink(BaseModel):
+    short_code:str
+    redirects:int
+
+class TopLinksResponse(BaseModel):
+    """
+    Response model for the hottest short codes.
+
+    Attributes:
+    window (str): The window the counts cover, as requested.
+    scope (str): "cluster" for counts from every worker as of their last
+        flush, "worker" for this worker's alone when Redis is unavailable.
+    links (list[HotLink]): Codes by estimated redirects in that window,
+        highest first. Counts may overestimate.
+    """
+    window:str
+    scope:Literal["cluster","worker"]
+    links:list[HotLink]
@@ -0,0 +1,49 @@
+import json
+import math
+
+from services.rate_limiter import get_rate_limiter
+
+_BODY = json.dumps({"detail":"Too many requests"}).encode()
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware applying the rate limiter's per-route rules.
+
+    Sits outside the redirect fast path so cached redirects are limited too.
+    A throttled request gets 429 with Retry-After (whole seconds, rounded
+    up) and never reaches the app. Without a limiter (before startup, or
+    RATE_LIMIT=false) requests pass straight through, as do exempt paths
+    such as /metrics, which the redirect rule would otherwise match.
+    """
+    def __init__(self,app,exempt:frozenset[str]=frozenset()):
+        self.app = app
+        self.exempt = exempt
+
+    async def __call__(self,scope,receive,send):
+        limiter = get_rate_limiter() if scope["type"] == "http" and scope["path"] not in self.exempt else None
+        rule = limiter.match(scope["method"],scope["path"]) if limiter is not None else None
+        if rule is None:
+            await self.app(scope,receive,send)
+            return
+
+        retry_after = await limiter.check(rule,limiter.client(scope))
+        if not retry_after:
+            await self.app(scope,receive,send)
+            return
+
+        headers = [
+            (b"content-type",b"application/json"),
+            (b"content-length",str(len(_BODY)).encode()),
+            (b"retry-after",str(max(1,math.ceil(retry_after))).encode())
+        ]
+        origin = next((value for name,value in scope["headers"] if name == b"origin"),None)
+        if origin is not None:
+            # the CORS middleware never sees this response; without these
+            # a browser reports a network error instead of the 429
+            headers += [
+                (b"access-control-allow-origin",origin),
+                (b"access-control-allow-credentials",b"true"),
+                (b"vary",b"Origin")
+            ]
+        await send({"type":"http.response.start","status":429,"headers":headers})
+        await send({"type":"http.response.body","body":_BODY})
@@ -0,0 +1,104 @@
+"""
+Worker scaling benchmark.
+
+Starts serve.py with 1, 2, 4 ... workers in turn and drives each from
+several client processes, so the client is not what saturates. Reports
+redirect RPS, latency and the speedup and efficiency (speedup / workers)
+against one worker. Linear scaling keeps efficiency near 1.0 until the
+workers outnumber the free cores.
+
+    python -m benchmarks.scaling --workers 1,2,4,8 --requests 40000 --output scaling.json
+
+The clients share the machine with the server: give them cores to spare
+(--client-processes) or expect efficiency to fall off early.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from benchmarks import load
+
+def client_run(base_url:str,args:argparse.Namespace,short_codes:list[str],run_id:str)->dict:
+    async def run()->dict:
+        async with load.http_client(base_url) as client:
+            return await load.drive(client,args,short_codes,run_id)
+    return asyncio.run(run())
+
+async def measure(workers:int,args)->dict:
+    """
+    One server with workers processes, driven by args.client_processes clients.
+    """
+    run_id = f"{int(time.time())}-{random.randrange(1 << 30):x}"
+    async with load.uvicorn_server(workers,args.port,args.asgi_app) as base_url:
+        async with load.http_client(base_url) as client:
+            short_codes = await load.seed(client,args.keys,run_id)
+        client_args = [
+            (base_url,argparse.Namespace(**{**vars(args),"requests":args.requests // args.client_processes,"seed":args.seed + i}),short_codes,run_id)
+            for i in range(args.client_processes)
+        ]
+        with multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+            started = time.perf_counter()
+            results = await asyncio.to_thread(pool.starmap,client_run,client_args)
+            elapsed = time.perf_counter() - started
+
+    redirects = [result["redirect"] for result in results]
+    return {
+        "workers":workers,
+        "redirect_rps":round(sum(r["requests"] for r in redirects) / elapsed,1),
+        "errors":sum(result["overall"]["errors"] for result in results),
+        # the worst client's percentiles; all clients hit the same server
+        "p50_ms":max(r["p50_ms"] for r in redirects),
+        "p99_ms":max(r["p99_ms"] for r in redirects),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers",default=None,help="comma-separated worker counts (default 1,2,4,... up to the core count)")
+    parser.add_argument("--client-processes",type=int,default=max(1,(os.cpu_count() or 2) // 2))
+    parser.add_argument("--port",type=int,default=8089)
+    parser.add_argument("--asgi-app",choices=("application","app"),default="application")
+    parser.add_argument("--requests",type=int,default=40_000,help="requests per worker count, split across clients")
+    parser.add_argument("--concurrency",type=int,default=64,help="connections per client process")
+    parser.add_argument("--keys",type=int,default=10_000)
+    parser.add_argument("--zipf-s",type=float,default=1.1)
+    parser.add_argument("--shorten-ratio",type=float,default=0.0,help="redirect-only by default")
+    parser.add_argument("--seed",type=int,default=42)
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+    if args.workers:
+        args.worker_counts = [int(n) for n in args.workers.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        args.worker_counts = [n for n in (1,2,4,8,16,32,64) if n < cores] + [cores]
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    # one client address would otherwise be throttled like an abuser
+    os.environ.setdefault("RATE_LIMIT","false")
+    os.environ.setdefault("DATABASE_URL",load.DEFAULT_DATABASE_URL)
+    runs = []
+    for workers in args.worker_counts:
+        runs.append(asyncio.run(measure(workers,args)))
+        baseline = runs[0]["redirect_rps"] / runs[0]["workers"]
+        runs[-1]["speedup"] = round(runs[-1]["redirect_rps"] / baseline,2) if baseline else None
+        runs[-1]["efficiency"] = round(runs[-1]["speedup"] / workers,2) if baseline else None
+    report = json.dumps({
+        "commit":load.git_commit(),
+        "started_at":datetime.now(timezone.utc).isoformat(),
+        "config":{k:v for k,v in vars(args).items() if k not in ("output","worker_counts")},
+        "runs":runs
+    },indent=2)
+    if args.output:
+        with open(args.output,"w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
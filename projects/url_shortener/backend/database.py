@@ -1,25 +1,129 @@
 from sqlalchemy.ext.asyncio import create_async_engine , AsyncSession
+from fastapi import Depends
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event,text
+from sqlalchemy.exc import DBAPIError
+import asyncio
+import itertools
+import logging
 import os
+import time
+from typing import Callable, Optional
 from utils.postgres_conversion import convert_postgres_sync_to_async
+from utils.pool_budget import per_worker_pool_size
+from metrics import DB_QUERY_SECONDS,POOL_WAIT_SECONDS,Gauge,current_request
+from models.database import Base
+
+logger = logging.getLogger(__name__)
 
 _engine = None
+_engine_pid = None
 _AsyncSessionLocal = None
 
-def get_engine():
-    global _engine
-    if _engine is None:
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waits for a connection.
+    """
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+def _on_checkout(dbapi_connection,connection_record,connection_proxy):
+    stats = current_request.get()
+    if stats is not None:
+        stats.pool_checkouts += 1
+
+def _before_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+    conn.info.setdefault("query_started",[]).append(time.perf_counter())
+
+def _after_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine):
+    """
+    Times every statement and attributes it and every pool checkout to the
+    current request, if any.
+    """
+    event.listen(engine.sync_engine,"checkout",_on_checkout)
+    event.listen(engine.sync_engine,"before_cursor_execute",_before_cursor_execute)
+    event.listen(engine.sync_engine,"after_cursor_execute",_after_cursor_execute)
+    event.listen(engine.sync_engine,"handle_error",_handle_error)
+
+def _checked_out()->int:
+    checkedout = getattr(_engine.pool,"checkedout",None) if _engine is not None else None
+    return checkedout() if checkedout else 0
+
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out","Connections currently checked out of the pool",fn=_checked_out)
+
+def build_engine(url:str):
+    """
+    An instrumented engine for url. Every database (primary, replica or
+    shard) gets a pool of DB_POOL_SIZE connections per worker, or its share
+    of DB_POOL_BUDGET across WEB_CONCURRENCY workers.
+    """
+    url = convert_postgres_sync_to_async(url)
+    if url and "sqlite" in url:
+        engine = create_async_engine(url,echo=False)
+    else:
+        engine = create_async_engine(
+            url,echo=False,
+            poolclass=TimedQueuePool,
+            pool_size=per_worker_pool_size("DB_POOL_SIZE","DB_POOL_BUDGET",20),
+            max_overflow=0
+        )
+    instrument_engine(engine)
+    return engine
+
+# pg_advisory_xact_lock key serializing startup DDL across worker processes
+SCHEMA_LOCK_KEY = 0x75726c73
+
+async def create_schema(engine,attempts:int=5):
+    """
+    Creates any missing tables on engine's database.
 
-        DATABASE_URL = convert_postgres_sync_to_async(os.getenv("DATABASE_URL"))
+    Workers starting together would race on CREATE TABLE. On Postgres the
+    DDL runs under a transaction-level advisory lock, so they take turns and
+    all but the first find the tables there. Elsewhere a lost race is
+    retried, by which time the tables exist.
+    """
+    for attempt in range(attempts):
+        try:
+            async with engine.begin() as conn:
+                if conn.dialect.name == "postgresql":
+                    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"),{"key":SCHEMA_LOCK_KEY})
+                await conn.run_sync(Base.metadata.create_all)
+            return
+        except DBAPIError:
+            if attempt == attempts - 1:
+                raise
+            logger.warning("creating the schema raced another worker, retrying")
 
-        if DATABASE_URL and "sqlite" in DATABASE_URL:
-            _engine = create_async_engine(DATABASE_URL,echo=False)
-        else:
-            _engine = create_async_engine(
-                DATABASE_URL,echo=False,
-                pool_size=20,
-                max_overflow=0
-            )
+def get_engine():
+    """
+    This process's engine, built on first use. If the process was forked
+    after the engine was built (e.g. gunicorn --preload), the inherited pool
+    is dropped without closing the parent's connections.
+    """
+    global _engine,_engine_pid
+    if _engine is not None and _engine_pid != os.getpid():
+        _engine.sync_engine.dispose(close=False)
+    if _engine is None:
+        _engine = build_engine(os.getenv("DATABASE_URL"))
+    _engine_pid = os.getpid()
     return _engine
 def get_session_local():
     global _AsyncSessionLocal
@@ -32,7 +136,170 @@ def get_session_local():
         )
     return _AsyncSessionLocal
 
-async def get_db ():
-    async with get_session_local()() as session:
+class LazySession:
+    """
+    Stands in for an AsyncSession that is only created on first use.
+
+    Repositories call it like a session; the real one is built, and a pooled
+    connection checked out, only when a query runs. Requests answered from
+    the cache never create a session, and commit, rollback and close are
+    no-ops until one exists.
+    """
+    def __init__(self,factory:Callable[[],AsyncSession]):
+        self._factory = factory
+        self._session:Optional[AsyncSession] = None
+
+    @property
+    def started(self)->bool:
+        return self._session is not None
+
+    def _get(self)->AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self,name):
+        return getattr(self._get(),name)
+
+    async def commit(self):
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self):
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc_info):
+        await self.close()
+
+
+async def get_db():
+    async with LazySession(get_session_local()) as session:
+        yield session
+
+
+class ReplicaRouter:
+    """
+    Chooses a read replica engine for each read session.
+
+    Only replicas that passed their last health check are candidates, picked
+    round-robin or by fewest checked-out connections. With none healthy,
+    reads go to the primary.
+    """
+    def __init__(
+        self,
+        primary,
+        replicas:list,
+        strategy:str="round_robin",
+        check_interval:float=5.0,
+        check_timeout:float=2.0
+        ):
+        if strategy not in ("round_robin","least_connections"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.healthy = list(replicas)
+        self._turn = itertools.count()
+        self._task:Optional[asyncio.Task] = None
+
+    def pick(self):
+        candidates = self.healthy
+        if not candidates:
+            return self.primary
+        if self.strategy == "least_connections":
+            return min(candidates,key=lambda engine:engine.pool.checkedout())
+        return candidates[next(self._turn) % len(candidates)]
+
+    async def _ping(self,engine)->bool:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    async def check(self):
+        results = await asyncio.gather(*(self._ping(engine) for engine in self.replicas))
+        healthy = [engine for engine,ok in zip(self.replicas,results) if ok]
+        if len(healthy) != len(self.healthy):
+            logger.warning("%d of %d read replicas healthy",len(healthy),len(self.replicas))
+        self.healthy = healthy
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self):
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.replicas:
+            await engine.dispose()
+
+
+_replica_router:Optional[ReplicaRouter] = None
+
+REPLICAS_HEALTHY = Gauge(
+    "db_replicas_healthy","Read replicas that passed their last health check",
+    fn=lambda:len(_replica_router.healthy) if _replica_router is not None else 0
+)
+
+async def init_replicas()->Optional[ReplicaRouter]:
+    """
+    Starts routing reads to DATABASE_REPLICA_URLS (comma-separated), if set.
+    """
+    global _replica_router
+    urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS","").split(",") if url.strip()]
+    if not urls:
+        return None
+    _replica_router = ReplicaRouter(
+        get_engine(),
+        [build_engine(url) for url in urls],
+        strategy=os.getenv("DATABASE_REPLICA_STRATEGY","round_robin"),
+        check_interval=float(os.getenv("DATABASE_REPLICA_CHECK_INTERVAL","5"))
+    )
+    await _replica_router.start()
+    return _replica_router
+
+async def close_replicas():
+    global _replica_router
+    if _replica_router is not None:
+        await _replica_router.stop()
+        _replica_router = None
+
+def get_replica_router()->Optional[ReplicaRouter]:
+    return _replica_router
+
+async def get_read_db(db:LazySession=Depends(get_db)):
+    """
+    Session for read-only queries, bound to a replica when any are configured.
+    Without replicas this is the request's primary session. The replica is
+    picked when the first query runs.
+    """
+    if _replica_router is None:
+        yield db
+        return
+    async with LazySession(lambda:get_session_local()(bind=_replica_router.pick())) as session:
         yield session
       
\ No newline at end of file
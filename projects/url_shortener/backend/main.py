@@ -1,12 +1,29 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse,JSONResponse
 from contextlib import asynccontextmanager
-from database import get_engine
+import os
+from database import create_schema,get_engine,get_session_local,init_replicas,close_replicas
 from redis_client import init_redis,close_redis
+from services.click_aggregator import init_click_aggregator,close_click_aggregator
+from services.short_code_filter import init_short_code_filter,close_short_code_filter
+from services.unique_visitors import init_unique_visitors,close_unique_visitors
+from services.hot_links import init_hot_links,close_hot_links
+from services.cache_warmup import init_cache_warmup,close_cache_warmup,get_cache_warmup
+from services.ttl_policy import init_ttl_policy,close_ttl_policy
+from services.background import init_background_executor,close_background_executor
+from services.rate_limiter import init_rate_limiter,close_rate_limiter
+from services.cache import CacheService
+from services.local_cache import get_local_cache
+from sharding import init_shards,close_shards,shard_sessions_factory
+from repository.sharded import ShardedStatsRepository,ShardedUrlRepository
 
-from models.database import Base
 
 from api.endpoints import router
+from api.middleware import MetricsMiddleware
+from api.fast_path import RedirectFastPath
+from api.rate_limit import RateLimitMiddleware
+from metrics import render_metrics
 
 
 
@@ -14,15 +31,61 @@ from api.endpoints import router
 async def lifespan(app:FastAPI):
     # startup
     # create tables
-    engine = get_engine()
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # serve.py has done this once already; safe if several workers get here at once
+    await create_schema(get_engine())
     
     # initialize redis
-    await init_redis()
+    redis_client = await init_redis()
+
+    # hyperloglog sketches of unique visitors per short code
+    await init_unique_visitors(redis_client)
+
+    # top-k of recent redirects; the hottest stay pinned in the L1 and redis
+    cache = CacheService(redis_client,get_local_cache())
+    hot_links = await init_hot_links(cache)
+
+    # per-key redis ttls from the hot link rates, plus redis memory gauges
+    cache.ttl_policy = await init_ttl_policy(redis_client,hot_links.rate if hot_links else None)
+
+    # per-client token buckets in redis for /shorten and redirects
+    await init_rate_limiter(redis_client)
+
+    # bounded queue for work done after the response (cache fills)
+    await init_background_executor()
+
+    # route resolve/stats reads to replicas when DATABASE_REPLICA_URLS is set
+    await init_replicas()
+
+    # spread url tables over DATABASE_SHARD_URLS; this database stays the directory
+    shard_router = await init_shards(get_session_local())
+
+    # start the write-behind click counter and load issued short codes into
+    # the bloom filter (in the background), reading from the shards if sharded
+    if shard_router is not None:
+        shard_sessions = shard_sessions_factory(shard_router,get_session_local())
+        await init_click_aggregator(shard_sessions,repository=ShardedStatsRepository)
+        await init_short_code_filter(shard_sessions,repository=ShardedUrlRepository,redis_client=redis_client)
+        # preload the most clicked mappings; /ready reports 503 until done
+        await init_cache_warmup(shard_sessions,cache,repository=ShardedStatsRepository)
+    else:
+        await init_click_aggregator(get_session_local())
+        await init_short_code_filter(get_session_local(),redis_client=redis_client)
+        await init_cache_warmup(get_session_local(),cache)
     yield
 
     # shutdown
+    # finish queued post-response jobs while redis is still up
+    await close_background_executor()
+    # drain buffered clicks before the pool goes away
+    await close_cache_warmup()
+    await close_click_aggregator()
+    await close_unique_visitors()
+    await close_hot_links()
+    await close_ttl_policy()
+    await close_rate_limiter()
+    await close_short_code_filter()
+    await close_shards()
+    await close_replicas()
     await close_redis()
     
 app = FastAPI(title="Url Shortener", lifespan=lifespan)
@@ -35,10 +98,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(MetricsMiddleware)
+
+# registered ahead of the router so /{short_code} does not swallow it
+@app.get("/metrics",response_class=PlainTextResponse)
+async def metrics():
+    return render_metrics()
+
+@app.get("/ready")
+async def ready():
+    warmup = get_cache_warmup()
+    if warmup is None or not warmup.ready.is_set():
+        return JSONResponse({"status":"warming"},status_code=503)
+    return {"status":"ready","warmed":warmup.warmed}
 
 app.include_router(router)
 
 
 @app.get("/")
 async def health():
-    return {"status":"healthy"}
\ No newline at end of file
+    return {"status":"healthy"}
+
+
+# what the server runs: cached redirects are answered ahead of FastAPI
+# unless REDIRECT_FAST_PATH=false; everything else reaches app as before.
+# rate limits apply in front of both, except to monitoring probes
+application = RateLimitMiddleware(
+    RedirectFastPath(app) if os.getenv("REDIRECT_FAST_PATH","true").lower() == "true" else app,
+    exempt=frozenset({"/metrics","/ready"})
+)
@@ -0,0 +1,197 @@
+"""
+Process-local metrics rendered in the Prometheus text format at /metrics.
+
+Only the three primitives the app needs are implemented (counter, gauge,
+histogram), so there is no client library dependency. Each worker process
+exposes its own numbers; aggregate across workers in Prometheus.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+COUNT_BUCKETS = (0,1,2,3,5,10,20,50)
+
+_registry:list["Metric"] = []
+
+def _escape(value:str)->str:
+    return value.replace("\\","\\\\").replace('"','\\"').replace("\n","\\n")
+
+def _format_labels(labels:tuple[tuple[str,str],...],extra:Optional[tuple[str,str]]=None)->str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k,v in pairs) + "}"
+
+def _format_value(value:float)->str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self,name:str,help:str,labelnames:tuple[str,...]=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def _key(self,labels:dict)->tuple[tuple[str,str],...]:
+        return tuple((name,str(labels.get(name,""))) for name in self.labelnames)
+
+    def samples(self)->list[str]:
+        raise NotImplementedError
+
+    def render(self)->str:
+        lines = [f"# HELP {self.name} {self.help}",f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self,name:str,help:str,labelnames:tuple[str,...]=()):
+        super().__init__(name,help,labelnames)
+        self._values:dict[tuple,float] = {}
+
+    def inc(self,amount:float=1,**labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key,0) + amount
+
+    def value(self,**labels)->float:
+        return self._values.get(self._key(labels),0)
+
+    def samples(self)->list[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k,v in self._values.items()]
+
+
+class Gauge(Metric):
+    """
+    A settable gauge, or a callback evaluated at scrape time when fn is given.
+    With labelnames, fn returns {label_values_tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self,name:str,help:str,labelnames:tuple[str,...]=(),fn:Optional[Callable]=None):
+        super().__init__(name,help,labelnames)
+        self.fn = fn
+        self._values:dict[tuple,float] = {}
+
+    def set(self,value:float,**labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self,amount:float=1,**labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key,0) + amount
+
+    def dec(self,amount:float=1,**labels):
+        self.inc(-amount,**labels)
+
+    def _collect(self)->dict[tuple,float]:
+        if self.fn is None:
+            return self._values
+        if not self.labelnames:
+            return {():self.fn()}
+        return {tuple(zip(self.labelnames,key)):value for key,value in self.fn().items()}
+
+    def value(self,**labels)->float:
+        return self._collect().get(self._key(labels),0)
+
+    def samples(self)->list[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k,v in self._collect().items()]
+
+
+class CounterFunc(Gauge):
+    """
+    A counter whose value is read from elsewhere at scrape time.
+    """
+    kind = "counter"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self,name:str,help:str,labelnames:tuple[str,...]=(),buckets:tuple[float,...]=DEFAULT_BUCKETS):
+        super().__init__(name,help,labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series:dict[tuple,list] = {}
+
+    def observe(self,value:float,**labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # per-bucket counts (+Inf last), sum, count
+            series = self._series[key] = [[0] * (len(self.buckets) + 1),0.0,0]
+        series[0][bisect.bisect_left(self.buckets,value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self,**labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started,**labels)
+
+    def count(self,**labels)->int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self)->list[str]:
+        lines = []
+        for key,(counts,total,count) in self._series.items():
+            cumulative = 0
+            for bound,bucket_count in zip(self.buckets + (float("inf"),),counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key,('le',_format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def render_metrics()->str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+class RequestStats:
+    """
+    Per-request DB accounting, carried in a context variable so engine event
+    hooks can attribute queries to the request that issued them.
+    """
+    __slots__ = ("db_queries","db_seconds","pool_checkouts")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.pool_checkouts = 0
+
+current_request:ContextVar[Optional[RequestStats]] = ContextVar("current_request",default=None)
+
+
+# http
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds","Request latency by route",("method","route","status")
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight","Requests currently being handled")
+
+# database
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds","Time spent in each SQL statement")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request","SQL statements issued per request",("route",),buckets=COUNT_BUCKETS
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds","Total SQL time per request",("route",)
+)
+DB_CHECKOUTS_PER_REQUEST = Histogram(
+    "db_pool_checkouts_per_request","Pooled connections checked out per request",("route",),buckets=COUNT_BUCKETS
+)
+POOL_WAIT_SECONDS = Histogram("db_pool_checkout_wait_seconds","Time spent waiting for a pooled connection")
+
+# redis
+REDIS_LATENCY = Histogram("redis_command_duration_seconds","Redis round-trip latency",("op",))
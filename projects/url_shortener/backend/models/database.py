@@ -1,6 +1,6 @@
-from sqlalchemy import Column,BigInteger,Text,String,ForeignKey,DateTime
+from sqlalchemy import Column,BigInteger,Integer,SmallInteger,Boolean,Text,String,ForeignKey,DateTime,Table,DDL,event
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func,false
 
 Base = declarative_base()
 
@@ -8,9 +8,15 @@ class UrlMapping(Base):
     __tablename__ = "url_mappings"
     id = Column(BigInteger,primary_key=True,autoincrement=True)
     long_url=Column(Text,nullable=False)
-    short_code=Column(String(10),unique=True,nullable=True,index=True)
+    # sha256 of the normalized long_url; indexed stand-in for the unindexable Text column
+    long_url_hash=Column(String(64),unique=True,index=True,nullable=True)
+    short_code=Column(String(10),unique=True,nullable=False,index=True)
     user_id=Column(BigInteger,index=True,nullable=True)
     created_at=Column(DateTime(timezone=True),server_default=func.now(),nullable=False)
+    # redirect policy: status code, browser/CDN cache lifetime, never-changes flag
+    redirect_status=Column(SmallInteger,nullable=False,default=302,server_default="302")
+    cache_max_age=Column(Integer,nullable=True)
+    immutable=Column(Boolean,nullable=False,default=False,server_default=false())
 
 class UrlStats(Base):
     __tablename__ = "url_stats"
@@ -20,4 +26,79 @@ class UrlStats(Base):
         primary_key=True
         )
     click_count = Column(BigInteger,nullable=False,default="0")
-    last_clicked_at = Column(DateTime(timezone=True),nullable=True)
\ No newline at end of file
+    last_clicked_at = Column(DateTime(timezone=True),nullable=True)
+
+class UrlStatsShard(Base):
+    """
+    Extra counter rows for hot codes; the true click count is
+    url_stats.click_count plus the sum of these.
+    """
+    __tablename__ = "url_stats_shards"
+    short_code=Column(
+        String(10),
+        ForeignKey("url_mappings.short_code",ondelete="CASCADE"),
+        primary_key=True
+        )
+    shard=Column(Integer,primary_key=True)
+    click_count = Column(BigInteger,nullable=False,default=0)
+    last_clicked_at = Column(DateTime(timezone=True),nullable=True)
+
+class ClickRollup(Base):
+    """
+    Clicks per short code per minute, hour and day bucket, maintained
+    incrementally by the click aggregator.
+    """
+    __tablename__ = "click_rollups"
+    short_code=Column(
+        String(10),
+        ForeignKey("url_mappings.short_code",ondelete="CASCADE"),
+        primary_key=True
+        )
+    granularity=Column(String(6),primary_key=True)
+    bucket_start=Column(DateTime(timezone=True),primary_key=True)
+    click_count=Column(BigInteger,nullable=False,default=0)
+
+# append-only click log; no key and a single index so batched COPY stays cheap.
+# On Postgres it is range-partitioned by month (see StatsRepository.ensure_event_partitions)
+click_events = Table(
+    "click_events",
+    Base.metadata,
+    Column("short_code",String(10),nullable=False,index=True),
+    Column("clicked_at",DateTime(timezone=True),nullable=False),
+    postgresql_partition_by="RANGE (clicked_at)"
+)
+event.listen(
+    click_events,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS click_events_default PARTITION OF click_events DEFAULT").execute_if(dialect="postgresql")
+)
+
+class IdBlock(Base):
+    """
+    Counter rows that workers lease id ranges from (see services/id_allocator.py).
+    """
+    __tablename__ = "id_blocks"
+    name=Column(String(64),primary_key=True)
+    next_id=Column(BigInteger,nullable=False)
+
+
+class UrlDigest(Base):
+    """
+    Sharded deployments only: long URL digest -> short code, kept on the
+    directory database so dedup does not have to ask every shard.
+    """
+    __tablename__ = "url_digests"
+    long_url_hash=Column(String(64),primary_key=True)
+    short_code=Column(String(10),nullable=False)
+    created_at=Column(DateTime(timezone=True),server_default=func.now(),nullable=False)
+
+class ShardSlot(Base):
+    """
+    Sharded deployments only: which shard owns each hash slot of short codes.
+    moved_from is set while a slot's rows are still being drained from its
+    previous shard.
+    """
+    __tablename__ = "shard_slots"
+    slot=Column(Integer,primary_key=True,autoincrement=False)
+    shard=Column(Integer,nullable=False)
+    moved_from=Column(Integer,nullable=True)
@@ -1,14 +1,20 @@
 import redis.asyncio as redis
 import os 
+from utils.pool_budget import per_worker_pool_size
 
 redis_client = None
 async def init_redis():
     global redis_client
-    redis_client = await redis.from_url(
-        os.getenv("REDIS_URL", "redis://localhost:6379"),
-        encoding="utf-8",
-        decode_responses=True
-    )
+    url = os.getenv("REDIS_URL", "redis://localhost:6379")
+    options = {"encoding":"utf-8","decode_responses":True}
+    # REDIS_POOL_SIZE per worker, or a share of REDIS_POOL_BUDGET; unbounded by default
+    max_connections = per_worker_pool_size("REDIS_POOL_SIZE","REDIS_POOL_BUDGET",None)
+    if max_connections is None:
+        redis_client = await redis.from_url(url,**options)
+    else:
+        # a bounded pool that waits for a free connection instead of raising
+        pool = redis.BlockingConnectionPool.from_url(url,max_connections=max_connections,**options)
+        redis_client = await redis.Redis.from_pool(pool)
     return redis_client
 
 async def close_redis():
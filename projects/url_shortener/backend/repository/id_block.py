@@ -0,0 +1,36 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select,insert,update,func
+from sqlalchemy.exc import IntegrityError
+
+from models.database import IdBlock,UrlMapping
+
+class IdBlockRepository:
+    def __init__(self,db:AsyncSession):
+        self.db = db
+
+    async def lease(self,name:str,size:int)->int:
+        """
+        Atomically advances the named counter by size and returns the first id
+        of the leased block [start, start + size).
+        """
+        table = IdBlock.__table__
+        stmt = update(table).where(
+            table.c.name == name
+        ).values(next_id=table.c.next_id + size).returning(table.c.next_id)
+        result = await self.db.execute(stmt)
+        end = result.scalar_one_or_none()
+        if end is None:
+            await self._seed(name)
+            result = await self.db.execute(stmt)
+            end = result.scalar_one()
+        return end - size
+
+    async def _seed(self,name:str):
+        # start above any id handed out by the old autoincrement path
+        start = select(func.coalesce(func.max(UrlMapping.id),0) + 1).scalar_subquery()
+        try:
+            async with self.db.begin_nested():
+                await self.db.execute(insert(IdBlock.__table__).values(name=name,next_id=start))
+        except IntegrityError:
+            # another worker seeded it first
+            pass
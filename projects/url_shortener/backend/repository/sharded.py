@@ -0,0 +1,256 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models.database import UrlDigest, UrlMapping, UrlStats
+from models import model
+from repository.stats import StatsRepository
+from repository.url import BATCH_SIZE, UrlRepository
+from sharding import ShardCommitError, ShardSessions
+from utils.redirect_policy import DEFAULT_POLICY,RedirectPolicy,policy_of
+from utils.url_digest import url_digest
+
+
+def _group(router,short_codes)->dict[int,list[str]]:
+    groups:dict[int,list[str]] = {}
+    for short_code in short_codes:
+        groups.setdefault(router.shard_for(short_code),[]).append(short_code)
+    return groups
+
+
+class ShardedUrlRepository:
+    """
+    UrlRepository over hash-slot shards.
+
+    Mappings live on the shard owning their short code; long URL dedup goes
+    through url_digests on the directory. commit() writes the shard rows
+    first and then claims the digests, so a crash in between leaves at worst
+    an unreferenced mapping. If a claim loses to a concurrent writer, the
+    new shard rows are deleted again and the IntegrityError is re-raised so
+    the service retries exactly as it does unsharded.
+    """
+    def __init__(self,shards:ShardSessions):
+        self.shards = shards
+        self.router = shards.router
+        # (digest, short_code) claims and the new codes per shard, pending commit
+        self._claims:list[tuple[str,str]] = []
+        self._created:dict[int,list[str]] = {}
+
+    def _repo(self,shard:int)->UrlRepository:
+        return UrlRepository(self.shards.session(shard))
+
+    async def get_by_long_url(self,long_url:str)->Optional[UrlMapping]:
+        stmt = select(UrlDigest.short_code).where(UrlDigest.long_url_hash == url_digest(long_url))
+        short_code = (await self.shards.directory.execute(stmt)).scalar_one_or_none()
+        if short_code is None:
+            return None
+        return await self.get_by_short_code(short_code)
+
+    async def get_by_short_code(self,short_code:str)->Optional[UrlMapping]:
+        for shard in self.router.read_shards(short_code):
+            url_mapping = await self._repo(shard).get_by_short_code(short_code)
+            if url_mapping is not None:
+                return url_mapping
+        return None
+
+    async def get_many_by_short_code(self,short_codes:list[str])->dict[str,str]:
+        redirects = await self.get_many_redirects(short_codes)
+        return {short_code:long_url for short_code,(long_url,_) in redirects.items()}
+
+    async def get_many_redirects(self,short_codes:list[str])->dict[str,tuple[str,RedirectPolicy]]:
+        groups = _group(self.router,short_codes)
+        results = await asyncio.gather(*(
+            self._repo(shard).get_many_redirects(codes) for shard,codes in groups.items()
+        ))
+        found = {}
+        for result in results:
+            found.update(result)
+        # codes in slots still being drained may only exist on the previous owner
+        for short_code in short_codes:
+            if short_code not in found:
+                for shard in self.router.read_shards(short_code)[1:]:
+                    url_mapping = await self._repo(shard).get_by_short_code(short_code)
+                    if url_mapping is not None:
+                        found[short_code] = (url_mapping.long_url,policy_of(url_mapping))
+        return found
+
+    async def create(
+        self,
+        long_url:str,
+        short_code:str,
+        id:Optional[int]=None,
+        policy:RedirectPolicy=DEFAULT_POLICY
+        )->UrlMapping:
+        shard = self.router.shard_for(short_code)
+        url_mapping = await self._repo(shard).create(long_url,short_code,id=id,policy=policy)
+        self._claims.append((url_mapping.long_url_hash,short_code))
+        self._created.setdefault(shard,[]).append(short_code)
+        return url_mapping
+
+    async def get_many_by_long_url(self,long_urls:list[str])->dict[str,str]:
+        digests = {url_digest(long_url):long_url for long_url in long_urls}
+        hashes = list(digests)
+        found = {}
+        for i in range(0,len(hashes),BATCH_SIZE):
+            stmt = select(UrlDigest.long_url_hash,UrlDigest.short_code).where(
+                UrlDigest.long_url_hash.in_(hashes[i:i + BATCH_SIZE])
+            )
+            result = await self.shards.directory.execute(stmt)
+            found.update({digests[digest]:short_code for digest,short_code in result})
+        return found
+
+    async def create_many(self,rows:list[tuple[int,str,str]]):
+        by_shard:dict[int,list[tuple[int,str,str]]] = {}
+        for row in rows:
+            by_shard.setdefault(self.router.shard_for(row[2]),[]).append(row)
+        for shard,shard_rows in by_shard.items():
+            await self._repo(shard).create_many(shard_rows)
+            self._created.setdefault(shard,[]).extend(short_code for _,_,short_code in shard_rows)
+        self._claims.extend((url_digest(long_url),short_code) for _,long_url,short_code in rows)
+
+    async def custom_code_exists(self,custom_code:str)->bool:
+        return await self.get_by_short_code(custom_code) is not None
+
+    async def count(self)->int:
+        counts = await asyncio.gather(*(UrlRepository(session).count() for session in self.shards.all_shards()))
+        return sum(counts)
+
+    async def iter_short_codes(
+        self,
+        created_after:Optional[datetime]=None,
+        batch_size:int=10_000
+        )->AsyncIterator[tuple[str,datetime]]:
+        for session in self.shards.all_shards():
+            async for row in UrlRepository(session).iter_short_codes(created_after,batch_size):
+                yield row
+
+    async def export_page(self,after_id:int,limit:int=BATCH_SIZE)->list[tuple]:
+        """
+        Merges each shard's next page by id. A mapping found on two shards
+        mid-rebalance is exported once.
+        """
+        pages = await asyncio.gather(*(
+            UrlRepository(session).export_page(after_id,limit) for session in self.shards.all_shards()
+        ))
+        merged = {}
+        for row in sorted((row for page in pages for row in page),key=lambda row:row[0]):
+            merged.setdefault(row[0],row)
+        return list(merged.values())[:min(limit,BATCH_SIZE)]
+
+    async def commit(self):
+        claims,created = self._claims,self._created
+        self._claims,self._created = [],{}
+        try:
+            committed = await self.shards.commit()
+        except ShardCommitError as exc:
+            await self.shards.rollback()
+            await self._delete_created(created,exc.committed)
+            raise exc.__cause__
+        try:
+            for i in range(0,len(claims),BATCH_SIZE):
+                await self.shards.directory.execute(insert(UrlDigest),[
+                    {"long_url_hash":digest,"short_code":short_code}
+                    for digest,short_code in claims[i:i + BATCH_SIZE]
+                ])
+            await self.shards.directory.commit()
+        except IntegrityError:
+            await self.shards.directory.rollback()
+            await self._delete_created(created,committed)
+            raise
+
+    async def _delete_created(self,created:dict[int,list[str]],shards:list[int]):
+        for shard in shards:
+            codes = created.get(shard)
+            if not codes:
+                continue
+            session = self.shards.session(shard)
+            for i in range(0,len(codes),BATCH_SIZE):
+                chunk = codes[i:i + BATCH_SIZE]
+                await session.execute(delete(UrlStats).where(UrlStats.short_code.in_(chunk)))
+                await session.execute(delete(UrlMapping).where(UrlMapping.short_code.in_(chunk)))
+            await session.commit()
+
+    async def rollback(self):
+        await self.shards.rollback()
+        await self.shards.directory.rollback()
+        self._claims,self._created = [],{}
+
+
+class ShardedStatsRepository:
+    """
+    StatsRepository over hash-slot shards; each code's counters live on the
+    shard that owns it.
+    """
+    def __init__(self,shards:ShardSessions):
+        self.shards = shards
+        self.router = shards.router
+
+    def _repo(self,shard:int)->StatsRepository:
+        return StatsRepository(self.shards.session(shard))
+
+    async def create(self,short_code:str)->UrlStats:
+        return await self._repo(self.router.shard_for(short_code)).create(short_code)
+
+    async def create_many(self,short_codes:list[str]):
+        for shard,codes in _group(self.router,short_codes).items():
+            await self._repo(shard).create_many(codes)
+
+    async def increment_click(self,short_code:str,n:int=1,clicked_at:Optional[datetime]=None):
+        await self.increment_clicks({short_code:(n,clicked_at or datetime.utcnow())})
+        await self.commit()
+
+    async def increment_clicks(self,deltas:dict[str,tuple[int,datetime]]):
+        """
+        Applies click deltas on each owning shard. The caller commits.
+        """
+        for shard,codes in _group(self.router,deltas).items():
+            await self._repo(shard).increment_clicks({code:deltas[code] for code in codes})
+
+    async def increment_rollups(self,minute_counts:dict[tuple[str,datetime],int]):
+        groups:dict[int,dict] = {}
+        for key,count in minute_counts.items():
+            groups.setdefault(self.router.shard_for(key[0]),{})[key] = count
+        for shard,counts in groups.items():
+            await self._repo(shard).increment_rollups(counts)
+
+    async def append_click_events(self,events:list[tuple[str,datetime]]):
+        groups:dict[int,list] = {}
+        for event in events:
+            groups.setdefault(self.router.shard_for(event[0]),[]).append(event)
+        for shard,shard_events in groups.items():
+            await self._repo(shard).append_click_events(shard_events)
+
+    async def ensure_event_partitions(self,now:datetime,months_ahead:int=1):
+        for shard in range(len(self.router.engines)):
+            await self._repo(shard).ensure_event_partitions(now,months_ahead)
+
+    async def get_series(self,short_code:str,granularity:str,start:datetime,end:datetime)->dict[datetime,int]:
+        # a slot being drained has history on both shards
+        series:dict[datetime,int] = {}
+        for shard in self.router.read_shards(short_code):
+            for bucket,count in (await self._repo(shard).get_series(short_code,granularity,start,end)).items():
+                series[bucket] = series.get(bucket,0) + count
+        return series
+
+    async def get_hottest(self,limit:int)->list[tuple[str,str,int,RedirectPolicy]]:
+        results = await asyncio.gather(*(StatsRepository(session).get_hottest(limit) for session in self.shards.all_shards()))
+        merged = {}
+        for rows in results:
+            for row in rows:
+                # a code mid-move can be on two shards; keep its larger count
+                if row[0] not in merged or row[2] > merged[row[0]][2]:
+                    merged[row[0]] = row
+        return sorted(merged.values(),key=lambda row:row[2],reverse=True)[:limit]
+
+    async def get_with_mapping(self,short_code:str)->Optional[tuple[UrlMapping,model.UrlStats]]:
+        for shard in self.router.read_shards(short_code):
+            result = await self._repo(shard).get_with_mapping(short_code)
+            if result is not None:
+                return result
+        return None
+
+    async def commit(self):
+        await self.shards.commit()
@@ -1,12 +1,38 @@
+import logging
+import os
+import random
 from datetime import datetime
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from models.database import UrlStats,UrlMapping
-from sqlalchemy import select
+from sqlalchemy.dialects import postgresql,sqlite
+from sqlalchemy.exc import DBAPIError
+from models.database import UrlStats,UrlStatsShard,UrlMapping,ClickRollup,click_events
+from models import model
+from repository.url import BATCH_SIZE
+from utils.time_buckets import GRANULARITIES,bucket_start,month_start
+from utils.redirect_policy import RedirectPolicy
+from sqlalchemy import select,insert,update,values,column,bindparam,func,text,String,BigInteger,DateTime
+
+logger = logging.getLogger(__name__)
 
 class StatsRepository:
-    def __init__(self,db:AsyncSession):
+    """
+    Click counters for url_stats.
+
+    Increments are single atomic UPDATEs. A code whose increment reaches
+    hot_threshold in one call is instead spread across shard_count rows in
+    url_stats_shards, so concurrent writers stop queueing on one row lock;
+    reads add the shard rows back in.
+    """
+    def __init__(
+        self,
+        db:AsyncSession,
+        shard_count:int=int(os.getenv("STATS_SHARD_COUNT","8")),
+        hot_threshold:int=int(os.getenv("STATS_HOT_THRESHOLD","100"))
+        ):
         self.db=db
+        self.shard_count=shard_count
+        self.hot_threshold=hot_threshold
 
     async def create(self,short_code:str)->UrlStats:
         stats =UrlStats(
@@ -16,21 +42,222 @@ class StatsRepository:
         self.db.add(stats)
         return stats
 
-    async def increment_click(self,short_code:str):
-        stmt = select(UrlStats).where(UrlStats.short_code == short_code)
-        result = await self.db.execute(stmt)
-        stats=result.scalar_one_or_none()
-        if stats:
-            stats.click_count+=1
-            stats.last_clicked_at = datetime.utcnow()
-            await self.db.commit()
-    
-    async def get_with_mapping(self,short_code:str)->Optional[tuple[UrlMapping,UrlStats]]:
+    async def create_many(self,short_codes:list[str]):
+        if short_codes:
+            await self.db.execute(insert(UrlStats),[
+                {"short_code":short_code,"click_count":0} for short_code in short_codes
+            ])
+
+    async def increment_click(self,short_code:str,n:int=1,clicked_at:Optional[datetime]=None):
+        await self.increment_clicks({short_code:(n,clicked_at or datetime.utcnow())})
+        await self.db.commit()
+
+    def _is_hot(self,delta:int)->bool:
+        return self.shard_count > 1 and delta >= self.hot_threshold
+
+    async def increment_clicks(self,deltas:dict[str,tuple[int,datetime]]):
         """
-        Retrieves a UrlMapping and its corresponding UrlStats from the database.
+        Applies accumulated click deltas for many short codes.
+
+        deltas maps short_code -> (clicks, last_clicked_at). Cold codes go to
+        url_stats in one statement: UPDATE ... FROM (VALUES ...) on Postgres,
+        an executemany UPDATE elsewhere. Hot codes go to a random shard row.
+        The caller owns the transaction.
         """
-        stmt = select(UrlMapping,UrlStats).join(
+        cold = {code:entry for code,entry in deltas.items() if not self._is_hot(entry[0])}
+        hot = {code:entry for code,entry in deltas.items() if self._is_hot(entry[0])}
+        await self._increment_rows(cold)
+        await self._increment_shards(hot)
+
+    async def _increment_rows(self,deltas:dict[str,tuple[int,datetime]]):
+        if not deltas:
+            return
+        if self.db.bind.dialect.name == "postgresql":
+            rows = values(
+                column("short_code",String),
+                column("delta",BigInteger),
+                column("clicked_at",DateTime(timezone=True)),
+                name="deltas"
+            ).data([(code,delta,ts) for code,(delta,ts) in deltas.items()])
+            stmt = update(UrlStats).where(
+                UrlStats.short_code == rows.c.short_code
+            ).values(
+                click_count=UrlStats.click_count + rows.c.delta,
+                last_clicked_at=rows.c.clicked_at
+            )
+            await self.db.execute(stmt)
+        else:
+            stmt = update(UrlStats.__table__).where(
+                UrlStats.short_code == bindparam("code")
+            ).values(
+                click_count=UrlStats.click_count + bindparam("delta"),
+                last_clicked_at=bindparam("clicked_at")
+            )
+            await self.db.execute(stmt,[
+                {"code":code,"delta":delta,"clicked_at":ts}
+                for code,(delta,ts) in deltas.items()
+            ])
+
+    def _insert(self,table):
+        dialect = postgresql if self.db.bind.dialect.name == "postgresql" else sqlite
+        return dialect.insert(table)
+
+    async def _increment_shards(self,deltas:dict[str,tuple[int,datetime]]):
+        if not deltas:
+            return
+        stmt = self._insert(UrlStatsShard.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["short_code","shard"],
+            set_={
+                "click_count":UrlStatsShard.__table__.c.click_count + stmt.excluded.click_count,
+                "last_clicked_at":stmt.excluded.last_clicked_at
+            }
+        )
+        await self.db.execute(stmt,[
+            {
+                "short_code":code,
+                "shard":random.randrange(self.shard_count),
+                "click_count":delta,
+                "last_clicked_at":ts
+            }
+            for code,(delta,ts) in deltas.items()
+        ])
+
+    async def get_with_mapping(self,short_code:str)->Optional[tuple[UrlMapping,model.UrlStats]]:
+        """
+        Retrieves a UrlMapping and its UrlStats, with any shard counters summed in.
+        """
+        shards = select(
+            UrlStatsShard.short_code,
+            func.sum(UrlStatsShard.click_count).label("click_count"),
+            func.max(UrlStatsShard.last_clicked_at).label("last_clicked_at")
+        ).where(
+            UrlStatsShard.short_code == short_code
+        ).group_by(UrlStatsShard.short_code).subquery()
+        stmt = select(UrlMapping,UrlStats,shards.c.click_count,shards.c.last_clicked_at).join(
                 UrlStats,UrlMapping.short_code == UrlStats.short_code
+            ).outerjoin(
+                shards,shards.c.short_code == UrlMapping.short_code
             ).where(UrlMapping.short_code == short_code)
         result = await self.db.execute(stmt)
-        return result.first()
\ No newline at end of file
+        row = result.first()
+        if row is None:
+            return None
+        url_mapping,url_stats,shard_clicks,shard_last_clicked = row
+        clicked = [ts for ts in (url_stats.last_clicked_at,shard_last_clicked) if ts is not None]
+        return url_mapping,model.UrlStats(
+            short_code=url_stats.short_code,
+            click_count=url_stats.click_count + (shard_clicks or 0),
+            last_clicked_at=max(clicked) if clicked else None
+        )
+
+    async def get_hottest(self,limit:int)->list[tuple[str,str,int,RedirectPolicy]]:
+        """
+        The limit most clicked mappings as (short_code, long_url, clicks, policy),
+        most clicked first and ties broken by the latest click. Codes with
+        shard counters are fetched separately, since their url_stats row
+        alone undercounts them.
+        """
+        shards = select(
+            UrlStatsShard.short_code,
+            func.sum(UrlStatsShard.click_count).label("click_count")
+        ).group_by(UrlStatsShard.short_code).subquery()
+        mapping = (UrlMapping.short_code,UrlMapping.long_url,UrlMapping.redirect_status,UrlMapping.cache_max_age,UrlMapping.immutable)
+        stmt = select(*mapping,UrlStats.click_count + shards.c.click_count).join(
+                UrlStats,UrlStats.short_code == UrlMapping.short_code
+            ).join(
+                shards,shards.c.short_code == UrlMapping.short_code
+            ).order_by(shards.c.click_count.desc()).limit(limit)
+        rows = list(await self.db.execute(stmt))
+        stmt = select(*mapping,UrlStats.click_count).join(
+                UrlStats,UrlStats.short_code == UrlMapping.short_code
+            ).where(UrlStats.click_count > 0).order_by(
+                UrlStats.click_count.desc(),UrlStats.last_clicked_at.desc().nulls_last()
+            ).limit(limit)
+        rows.extend(await self.db.execute(stmt))
+        hottest = {}
+        for code,long_url,status,max_age,immutable,clicks in rows:
+            hottest.setdefault(code,(code,long_url,clicks,RedirectPolicy(status,max_age,immutable)))
+        return sorted(hottest.values(),key=lambda row:row[2],reverse=True)[:limit]
+
+    async def increment_rollups(self,minute_counts:dict[tuple[str,datetime],int]):
+        """
+        Adds clicks counted per (short_code, minute) to the minute, hour and
+        day rollups with one upsert per batch. The caller owns the transaction.
+        """
+        rows:dict[tuple[str,str,datetime],int] = {}
+        for (short_code,minute),count in minute_counts.items():
+            for granularity in GRANULARITIES:
+                key = (short_code,granularity,bucket_start(minute,granularity))
+                rows[key] = rows.get(key,0) + count
+        if not rows:
+            return
+        stmt = self._insert(ClickRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["short_code","granularity","bucket_start"],
+            set_={"click_count":ClickRollup.__table__.c.click_count + stmt.excluded.click_count}
+        )
+        items = list(rows.items())
+        for i in range(0,len(items),BATCH_SIZE):
+            await self.db.execute(stmt,[
+                {"short_code":code,"granularity":granularity,"bucket_start":start,"click_count":count}
+                for (code,granularity,start),count in items[i:i + BATCH_SIZE]
+            ])
+
+    async def append_click_events(self,events:list[tuple[str,datetime]]):
+        """
+        Appends raw (short_code, clicked_at) events: a binary COPY on asyncpg,
+        multi-row INSERTs elsewhere. Runs in the caller's transaction.
+        """
+        if not events:
+            return
+        conn = await self.db.connection()
+        if conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                "click_events",records=events,columns=["short_code","clicked_at"]
+            )
+            return
+        for i in range(0,len(events),BATCH_SIZE):
+            await self.db.execute(insert(click_events),[
+                {"short_code":code,"clicked_at":ts} for code,ts in events[i:i + BATCH_SIZE]
+            ])
+
+    async def ensure_event_partitions(self,now:datetime,months_ahead:int=1):
+        """
+        Creates the monthly click_events partitions for now's month and the
+        next months_ahead months on Postgres, so rows rarely land in the
+        default partition. No-op on other databases.
+        """
+        if self.db.bind.dialect.name != "postgresql":
+            return
+        for offset in range(months_ahead + 1):
+            start,end = month_start(now,offset),month_start(now,offset + 1)
+            try:
+                async with self.db.begin_nested():
+                    await self.db.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS click_events_{start:%Y_%m} PARTITION OF click_events "
+                        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                    ))
+            except DBAPIError:
+                # the default partition already holds rows for this month
+                logger.warning("could not create click_events partition for %s",f"{start:%Y-%m}")
+
+    async def get_series(
+        self,
+        short_code:str,
+        granularity:str,
+        start:datetime,
+        end:datetime
+        )->dict[datetime,int]:
+        """
+        Returns bucket_start -> clicks for the non-empty buckets in [start, end).
+        """
+        stmt = select(ClickRollup.bucket_start,ClickRollup.click_count).where(
+            ClickRollup.short_code == short_code,
+            ClickRollup.granularity == granularity,
+            ClickRollup.bucket_start >= start,
+            ClickRollup.bucket_start < end
+        )
+        result = await self.db.execute(stmt)
+        return {bucket.replace(tzinfo=None):count for bucket,count in result}
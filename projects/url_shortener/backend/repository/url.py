@@ -1,16 +1,21 @@
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select,func,insert
 
-from models.database import UrlMapping
+from models.database import UrlMapping,UrlStats,UrlStatsShard
+from utils.redirect_policy import DEFAULT_POLICY,RedirectPolicy
+from utils.url_digest import url_digest
+
+# keeps IN lists and multi-row inserts well under driver parameter limits
+BATCH_SIZE = 1000
 
 class UrlRepository:
     def __init__(self,db:AsyncSession):
         self.db = db
     
     async def get_by_long_url(self, long_url:str)->Optional[UrlMapping]:
-        stmt = select(UrlMapping).where(UrlMapping.long_url == long_url)
+        stmt = select(UrlMapping).where(UrlMapping.long_url_hash == url_digest(long_url))
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none()
 
@@ -18,20 +23,150 @@ class UrlRepository:
         stmt = select(UrlMapping).where(UrlMapping.short_code == short_code)
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none()
-    async def create(self,long_url:str,short_code:Optional[str]=None)->UrlMapping:
+    async def get_many_by_short_code(self,short_codes:list[str])->dict[str,str]:
+        """
+        Returns short_code -> long_url for the codes that exist.
+        """
+        redirects = await self.get_many_redirects(short_codes)
+        return {short_code:long_url for short_code,(long_url,_) in redirects.items()}
+
+    async def get_many_redirects(self,short_codes:list[str])->dict[str,tuple[str,RedirectPolicy]]:
+        """
+        Returns short_code -> (long_url, redirect policy) for the codes that exist.
+        """
+        found = {}
+        for i in range(0,len(short_codes),BATCH_SIZE):
+            stmt = select(
+                UrlMapping.short_code,
+                UrlMapping.long_url,
+                UrlMapping.redirect_status,
+                UrlMapping.cache_max_age,
+                UrlMapping.immutable
+            ).where(
+                UrlMapping.short_code.in_(short_codes[i:i + BATCH_SIZE])
+            )
+            result = await self.db.execute(stmt)
+            found.update({
+                short_code:(long_url,RedirectPolicy(status,max_age,immutable))
+                for short_code,long_url,status,max_age,immutable in result
+            })
+        return found
+
+    async def create(
+        self,
+        long_url:str,
+        short_code:str,
+        id:Optional[int]=None,
+        policy:RedirectPolicy=DEFAULT_POLICY
+        )->UrlMapping:
+        """
+        Stages a new mapping; the INSERT is sent with the next commit.
+        """
         url_mapping = UrlMapping(
+            id=id,
             long_url=long_url,
+            long_url_hash=url_digest(long_url),
             short_code=short_code,
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
+            redirect_status=policy.status,
+            cache_max_age=policy.max_age,
+            immutable=policy.immutable
         )
         self.db.add(url_mapping)
-        await self.db.flush()
         return url_mapping
 
+    async def get_many_by_long_url(self,long_urls:list[str])->dict[str,str]:
+        """
+        Returns long_url -> short_code for the URLs that are already shortened.
+        """
+        digests = {url_digest(long_url):long_url for long_url in long_urls}
+        hashes = list(digests)
+        found = {}
+        for i in range(0,len(hashes),BATCH_SIZE):
+            stmt = select(UrlMapping.long_url_hash,UrlMapping.short_code).where(
+                UrlMapping.long_url_hash.in_(hashes[i:i + BATCH_SIZE])
+            )
+            result = await self.db.execute(stmt)
+            found.update({digests[digest]:short_code for digest,short_code in result})
+        return found
+
+    async def create_many(self,rows:list[tuple[int,str,str]]):
+        """
+        Inserts (id, long_url, short_code) rows with multi-row INSERT statements.
+        """
+        created_at = datetime.utcnow()
+        for i in range(0,len(rows),BATCH_SIZE):
+            await self.db.execute(insert(UrlMapping),[
+                {
+                    "id":id,
+                    "long_url":long_url,
+                    "long_url_hash":url_digest(long_url),
+                    "short_code":short_code,
+                    "created_at":created_at
+                }
+                for id,long_url,short_code in rows[i:i + BATCH_SIZE]
+            ])
+
     async def custom_code_exists(self,custom_code:str)-> bool:
         stmt = select(UrlMapping).where(UrlMapping.short_code == custom_code)
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none() is not None
 
+    async def count(self)->int:
+        result = await self.db.execute(select(func.count()).select_from(UrlMapping))
+        return result.scalar_one()
+
+    async def iter_short_codes(
+        self,
+        created_after:Optional[datetime]=None,
+        batch_size:int=10_000
+        )->AsyncIterator[tuple[str,datetime]]:
+        """
+        Streams (short_code, created_at) pairs with a server-side cursor.
+        """
+        stmt = select(UrlMapping.short_code,UrlMapping.created_at).where(
+            UrlMapping.short_code.is_not(None)
+        ).execution_options(yield_per=batch_size)
+        if created_after is not None:
+            stmt = stmt.where(UrlMapping.created_at >= created_after)
+        result = await self.db.stream(stmt)
+        async for short_code,created_at in result:
+            yield short_code,created_at
+
+    async def export_page(self,after_id:int,limit:int=BATCH_SIZE)->list[tuple]:
+        """
+        The next limit mappings after after_id in id order, as EXPORT_COLUMNS
+        tuples with their clicks (shard counters included). Keyset paging on
+        the primary key, so every page is an index range scan however deep
+        the export is.
+        """
+        stmt = select(
+            UrlMapping.id,UrlMapping.short_code,UrlMapping.long_url,UrlMapping.created_at,
+            UrlMapping.redirect_status,UrlMapping.cache_max_age,UrlMapping.immutable,
+            UrlStats.click_count,UrlStats.last_clicked_at
+        ).outerjoin(
+            UrlStats,UrlStats.short_code == UrlMapping.short_code
+        ).where(UrlMapping.id > after_id).order_by(UrlMapping.id).limit(min(limit,BATCH_SIZE))
+        rows = (await self.db.execute(stmt)).all()
+        if not rows:
+            return []
+        stmt = select(
+            UrlStatsShard.short_code,
+            func.sum(UrlStatsShard.click_count),
+            func.max(UrlStatsShard.last_clicked_at)
+        ).where(
+            UrlStatsShard.short_code.in_([row.short_code for row in rows])
+        ).group_by(UrlStatsShard.short_code)
+        shards = {code:(clicks,last) for code,clicks,last in await self.db.execute(stmt)}
+        page = []
+        for *mapping,clicks,last_clicked_at in rows:
+            shard_clicks,shard_last = shards.get(mapping[1],(0,None))
+            clicked = [ts for ts in (last_clicked_at,shard_last) if ts is not None]
+            page.append((*mapping,(clicks or 0) + shard_clicks,max(clicked) if clicked else None))
+        return page
+
     async def commit(self):
-        await self.db.commit()   
\ No newline at end of file
+        await self.db.commit()
+
+    async def rollback(self):
+        await self.db.rollback()   
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Production launcher: uvicorn with one worker process per core.
+
+Workers share nothing. Each runs its own lifespan, so the engine, Redis
+client, L1 cache, id block, click buffer and bloom filter are built inside
+the worker after it starts, never inherited. Pools are sized per worker
+from DB_POOL_BUDGET / REDIS_POOL_BUDGET (see utils/pool_budget.py), so the
+total stays within what Postgres and Redis allow however many workers run.
+The schema is created and the shard map seeded here, once, before any
+worker starts, so the workers never race each other's DDL.
+
+    WEB_CONCURRENCY=4 DB_POOL_BUDGET=80 python serve.py
+
+uvloop and httptools are used when installed (uvicorn[standard]).
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from database import create_schema, get_engine, get_session_local
+from sharding import close_shards, init_shards
+
+logger = logging.getLogger(__name__)
+
+def installed(module:str)->bool:
+    return importlib.util.find_spec(module) is not None
+
+async def prepare():
+    """
+    Creates the tables and seeds the shard map before the workers start.
+    """
+    try:
+        await create_schema(get_engine())
+        await init_shards(get_session_local())
+    finally:
+        await close_shards()
+        await get_engine().dispose()
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    # workers are spawned with this environment and size their pools from it
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(prepare())
+    logger.info("starting %d workers (loop=%s, http=%s)",workers,loop,http)
+    uvicorn.run(
+        os.getenv("SERVE_APP","main:application"),
+        host=os.getenv("HOST","0.0.0.0"),
+        port=int(os.getenv("PORT","8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        log_level=os.getenv("LOG_LEVEL","info"),
+        access_log=os.getenv("ACCESS_LOG","false").lower() == "true",
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS","127.0.0.1"),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_TIMEOUT","5"))
+    )
+
+if __name__ == "__main__":
+    main()
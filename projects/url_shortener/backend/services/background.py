@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+SHED_POLICIES = ("drop_new","drop_oldest")
+
+class BackgroundExecutor:
+    """
+    Runs fire-and-forget coroutines after the response, on a fixed number of
+    worker tasks fed by a bounded queue.
+
+    Every job is referenced by the queue until a worker has finished it, and
+    at most workers jobs run at once, so a burst cannot pile up tasks or
+    connections. When the queue is full the shed policy decides what is
+    lost: drop_new rejects the submitted job, drop_oldest discards the job
+    that has waited longest. Jobs must therefore be optional work such as
+    cache fills, never the only copy of data. They must not use request
+    scoped resources like the request's DB session, which is closed by then.
+    """
+    def __init__(
+        self,
+        workers:int=4,
+        max_queue:int=10_000,
+        policy:str="drop_new",
+        drain_timeout:float=10.0
+        ):
+        if policy not in SHED_POLICIES:
+            raise ValueError(f"shed policy must be one of {SHED_POLICIES}")
+        self.workers = workers
+        self.policy = policy
+        self.drain_timeout = drain_timeout
+        self._queue:asyncio.Queue = asyncio.Queue(max_queue)
+        self._tasks:list[asyncio.Task] = []
+
+    @property
+    def depth(self)->int:
+        return self._queue.qsize()
+
+    def submit(self,name:str,fn:Callable[...,Awaitable],*args)->bool:
+        """
+        Queues fn(*args) under name (used as the metrics label). Returns
+        False if the job was shed.
+        """
+        if self._queue.full():
+            if self.policy == "drop_new":
+                BACKGROUND_DROPPED.inc(job=name,reason="queue_full")
+                return False
+            dropped,*_ = self._queue.get_nowait()
+            self._queue.task_done()
+            BACKGROUND_DROPPED.inc(job=dropped,reason="queue_full")
+        self._queue.put_nowait((name,fn,args))
+        return True
+
+    async def _worker(self):
+        while True:
+            name,fn,args = await self._queue.get()
+            try:
+                with BACKGROUND_JOB_SECONDS.time(job=name):
+                    await fn(*args)
+            except Exception:
+                BACKGROUND_FAILED.inc(job=name)
+                logger.exception("background job %s failed",name)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Waits up to drain_timeout for queued jobs to finish, then cancels
+        the workers; jobs still queued at that point are dropped.
+        """
+        try:
+            await asyncio.wait_for(self._queue.join(),self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("background queue not drained in %ss, dropping %d jobs",self.drain_timeout,self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks,return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            name,*_ = self._queue.get_nowait()
+            BACKGROUND_DROPPED.inc(job=name,reason="shutdown")
+
+
+background_executor:Optional[BackgroundExecutor] = None
+
+BACKGROUND_QUEUE_DEPTH = Gauge(
+    "background_queue_depth","Jobs waiting for a background worker",
+    fn=lambda:background_executor.depth if background_executor is not None else 0
+)
+BACKGROUND_DROPPED = Counter("background_jobs_dropped_total","Background jobs shed by job and reason",("job","reason"))
+BACKGROUND_FAILED = Counter("background_jobs_failed_total","Background jobs that raised",("job",))
+BACKGROUND_JOB_SECONDS = Histogram("background_job_duration_seconds","Background job run time",("job",))
+
+async def init_background_executor()->BackgroundExecutor:
+    global background_executor
+    background_executor = BackgroundExecutor(
+        workers=int(os.getenv("BACKGROUND_WORKERS","4")),
+        max_queue=int(os.getenv("BACKGROUND_QUEUE_SIZE","10000")),
+        policy=os.getenv("BACKGROUND_SHED_POLICY","drop_new"),
+        drain_timeout=float(os.getenv("BACKGROUND_DRAIN_TIMEOUT","10"))
+    )
+    background_executor.start()
+    return background_executor
+
+async def close_background_executor():
+    global background_executor
+    if background_executor:
+        await background_executor.stop()
+        background_executor = None
+
+def get_background_executor()->Optional[BackgroundExecutor]:
+    return background_executor
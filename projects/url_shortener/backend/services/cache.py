@@ -1,19 +1,208 @@
 
 from redis.asyncio import Redis
+from datetime import datetime
 from typing import Optional
+from services.local_cache import CacheStats,LocalCache,get_local_cache
+from services.ttl_policy import AdaptiveTtl
+from metrics import REDIS_LATENCY,CounterFunc,Gauge
+
+# stored in place of a long URL to remember that a code does not exist
+MISSING = "!"
+
+# process-wide counters for the Redis tier; the L1 keeps its own on LocalCache.stats
+redis_stats = CacheStats()
+
+def _cache_lookups()->dict[tuple[str,str],int]:
+    l1 = get_local_cache().stats
+    return {
+        ("l1","hit"):l1.hits,("l1","miss"):l1.misses,
+        ("redis","hit"):redis_stats.hits,("redis","miss"):redis_stats.misses,
+    }
+
+CACHE_LOOKUPS = CounterFunc("cache_lookups_total","Cache lookups by tier and result",("tier","result"),fn=_cache_lookups)
+L1_ENTRIES = Gauge("cache_l1_entries","Entries held in the in-process cache",fn=lambda:len(get_local_cache()))
+
+# GET that also resets the expiry of a real mapping, leaving negative entries alone
+_GET_AND_SLIDE = """
+local value = redis.call('GET', KEYS[1])
+if value and value ~= ARGV[2] then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return value
+"""
+
 class CacheService:
-    def __init__(self,redis_client:Redis):
+    def __init__(
+        self,
+        redis_client:Redis,
+        local_cache:Optional[LocalCache]=None,
+        ttl_policy:Optional[AdaptiveTtl]=None
+        ):
         self.redis = redis_client
-        self.ttl = 300 #5 minutes
+        self.local = local_cache
+        self.ttl_policy = ttl_policy
+        self.ttl = 300 #5 minutes, without a ttl policy
+        self.negative_ttl = 30
+        self._slide = None
 
     def _make_key(self,short_code:str)->str:
         return f"url:{short_code}"
-    
+
+    def _ttl(self,short_code:str,created_at:Optional[datetime]=None)->int:
+        if self.ttl_policy is None:
+            return self.ttl
+        return self.ttl_policy.ttl(short_code,created_at)
+
     async def get_url(self,short_code:str)->Optional[str]:
-        cached = await self.redis.get(self._make_key(short_code))
-        return cached.decode() if cached else None
-    async def set_url(self,short_code:str,long_url:str):
-        await self.redis.setex(self._make_key(short_code),self.ttl,long_url)
-    
+        # L1: in-process, no network hop
+        if self.local is not None:
+            cached = self.local.get(short_code)
+            if cached is not None:
+                return cached
+
+        # L2: redis, sliding the expiry of a hit when the ttl policy asks for it
+        key = self._make_key(short_code)
+        if self.ttl_policy is not None and self.ttl_policy.sliding:
+            if self._slide is None:
+                self._slide = self.redis.register_script(_GET_AND_SLIDE)
+            with REDIS_LATENCY.time(op="get_slide"):
+                cached = await self._slide(keys=[key],args=[self._ttl(short_code),MISSING])
+        else:
+            with REDIS_LATENCY.time(op="get"):
+                cached = await self.redis.get(key)
+        return self._from_redis(short_code,cached)
+
+    async def get_url_with_ttl(self,short_code:str)->tuple[Optional[str],Optional[float]]:
+        """
+        Like get_url, but also returns the seconds left on the Redis entry
+        (fetched in the same round trip). The TTL is None for L1 hits and misses.
+        """
+        if self.local is not None:
+            cached = self.local.get(short_code)
+            if cached is not None:
+                return cached,None
+
+        key = self._make_key(short_code)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            with REDIS_LATENCY.time(op="get_ttl"):
+                cached,pttl = await pipe.execute()
+        long_url = self._from_redis(short_code,cached)
+        if long_url is None or pttl is None or pttl < 0:
+            return long_url,None
+        return long_url,pttl / 1000
+
+    async def get_many(self,short_codes:list[str])->dict[str,str]:
+        """
+        Looks up many codes: L1 first, then a single MGET for the rest.
+        Returns only the codes that were cached (values may be MISSING).
+        """
+        found = {}
+        remaining = []
+        for short_code in short_codes:
+            cached = self.local.get(short_code) if self.local is not None else None
+            if cached is not None:
+                found[short_code] = cached
+            else:
+                remaining.append(short_code)
+        if remaining:
+            with REDIS_LATENCY.time(op="mget"):
+                values = await self.redis.mget([self._make_key(code) for code in remaining])
+            for short_code,cached in zip(remaining,values):
+                long_url = self._from_redis(short_code,cached)
+                if long_url is not None:
+                    found[short_code] = long_url
+        return found
+
+    def _from_redis(self,short_code:str,cached)->Optional[str]:
+        if not cached:
+            redis_stats.miss()
+            return None
+        redis_stats.hit()
+        long_url = cached.decode() if isinstance(cached,bytes) else cached
+        if self.local is not None:
+            self.local.set(short_code,long_url)
+        return long_url
+
+    async def set_url(self,short_code:str,long_url:str,created_at:Optional[datetime]=None):
+        with REDIS_LATENCY.time(op="set"):
+            await self.redis.setex(self._make_key(short_code),self._ttl(short_code,created_at),long_url)
+        if self.local is not None:
+            self.local.set(short_code,long_url)
+
+    async def set_many(self,mappings:dict[str,str]):
+        """
+        Caches many short_code -> long_url mappings in one pipelined round trip.
+        """
+        if not mappings:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for short_code,long_url in mappings.items():
+                pipe.setex(self._make_key(short_code),self._ttl(short_code),long_url)
+            with REDIS_LATENCY.time(op="set_many"):
+                await pipe.execute()
+        if self.local is not None:
+            for short_code,long_url in mappings.items():
+                self.local.set(short_code,long_url)
+
+    async def pin_hot(self,short_codes:list[str])->int:
+        """
+        Keeps hot codes cached: one GETEX pipeline re-reads them and resets
+        their Redis TTL, and the values found are refreshed and pinned in
+        the L1. Returns how many were found.
+        """
+        if not short_codes:
+            if self.local is not None:
+                self.local.pin([])
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for short_code in short_codes:
+                pipe.getex(self._make_key(short_code),ex=self._ttl(short_code))
+            with REDIS_LATENCY.time(op="getex"):
+                values = await pipe.execute()
+        found = {}
+        for short_code,cached in zip(short_codes,values):
+            if cached and cached != MISSING:
+                found[short_code] = cached.decode() if isinstance(cached,bytes) else cached
+        if self.local is not None:
+            for short_code,long_url in found.items():
+                self.local.set(short_code,long_url)
+            self.local.pin(list(found))
+        return len(found)
+
+    async def set_missing(self,short_code:str):
+        """
+        Negative-caches a code that does not exist. A later set_url overwrites it.
+        """
+        with REDIS_LATENCY.time(op="set"):
+            await self.redis.setex(self._make_key(short_code),self.negative_ttl,MISSING)
+        if self.local is not None:
+            self.local.set(short_code,MISSING,ttl=min(self.negative_ttl,self.local.ttl))
+
+    async def set_missing_many(self,short_codes:list[str]):
+        if not short_codes:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for short_code in short_codes:
+                pipe.setex(self._make_key(short_code),self.negative_ttl,MISSING)
+            with REDIS_LATENCY.time(op="set_many"):
+                await pipe.execute()
+        if self.local is not None:
+            for short_code in short_codes:
+                self.local.set(short_code,MISSING,ttl=min(self.negative_ttl,self.local.ttl))
+
     async def delete_url(self,short_code:str):
-        await self.redis.delete(self._make_key(short_code))
\ No newline at end of file
+        with REDIS_LATENCY.time(op="delete"):
+            await self.redis.delete(self._make_key(short_code))
+        if self.local is not None:
+            self.local.delete(short_code)
+
+    async def delete_many(self,short_codes:list[str]):
+        if not short_codes:
+            return
+        with REDIS_LATENCY.time(op="delete"):
+            await self.redis.delete(*[self._make_key(code) for code in short_codes])
+        if self.local is not None:
+            for short_code in short_codes:
+                self.local.delete(short_code)
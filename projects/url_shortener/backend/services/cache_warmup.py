@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repository.stats import StatsRepository
+from services.cache import CacheService
+from metrics import Gauge
+from utils.redirect_policy import encode_entry
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmup:
+    """
+    Preloads the most clicked mappings into Redis and the L1 after a deploy,
+    so the first minutes of traffic do not all miss through to the database.
+
+    Runs in the background: the app serves as soon as it starts, but /ready
+    answers 503 until warm-up has finished, failed or run out of its time
+    budget. Mappings are written hottest first in set_many batches, so a cut
+    short warm-up still covers the hottest codes.
+    """
+    def __init__(
+        self,
+        session_factory:Callable[[],AsyncSession],
+        cache:CacheService,
+        max_keys:int=10_000,
+        batch_size:int=1000,
+        timeout:float=10.0,
+        repository:Callable=StatsRepository
+        ):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.max_keys = max_keys
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.repository = repository
+        self.warmed = 0
+        self.ready = asyncio.Event()
+        self._task:Optional[asyncio.Task] = None
+
+    async def _warm(self):
+        async with self.session_factory() as session:
+            hottest = await self.repository(session).get_hottest(self.max_keys)
+        for i in range(0,len(hottest),self.batch_size):
+            batch = hottest[i:i + self.batch_size]
+            await self.cache.set_many({code:encode_entry(long_url,policy) for code,long_url,_,policy in batch})
+            self.warmed += len(batch)
+
+    async def run(self)->int:
+        """
+        Warms the cache within the time budget and marks the app ready,
+        whatever the outcome. Returns how many mappings were cached.
+        """
+        started = time.perf_counter()
+        try:
+            if self.max_keys > 0:
+                async with asyncio.timeout(self.timeout):
+                    await self._warm()
+        except TimeoutError:
+            logger.warning("cache warm-up hit its %ss budget after %d mappings",self.timeout,self.warmed)
+        except Exception:
+            logger.exception("cache warm-up failed after %d mappings",self.warmed)
+        else:
+            logger.info("cache warm-up loaded %d mappings in %.2fs",self.warmed,time.perf_counter() - started)
+        finally:
+            self.ready.set()
+        return self.warmed
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+cache_warmup:Optional[CacheWarmup] = None
+
+WARMED_KEYS = Gauge("cache_warmup_keys","Mappings preloaded into the cache at startup",fn=lambda:cache_warmup.warmed if cache_warmup else 0)
+
+async def init_cache_warmup(
+    session_factory:Callable[[],AsyncSession],
+    cache:CacheService,
+    repository:Callable=StatsRepository
+    )->CacheWarmup:
+    global cache_warmup
+    cache_warmup = CacheWarmup(
+        session_factory,
+        cache,
+        max_keys=int(os.getenv("CACHE_WARMUP_KEYS","10000")),
+        batch_size=int(os.getenv("CACHE_WARMUP_BATCH","1000")),
+        timeout=float(os.getenv("CACHE_WARMUP_TIMEOUT","10")),
+        repository=repository
+    )
+    cache_warmup.start()
+    return cache_warmup
+
+async def close_cache_warmup():
+    global cache_warmup
+    if cache_warmup:
+        await cache_warmup.stop()
+        cache_warmup = None
+
+def get_cache_warmup()->Optional[CacheWarmup]:
+    return cache_warmup
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repository.stats import StatsRepository
+from utils.time_buckets import bucket_start,month_start
+from sharding import ShardCommitError
+from metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+class ClickAggregator:
+    """
+    Write-behind click counter.
+
+    Redirects call record(), which only bumps an in-memory counter. A background
+    loop flushes the accumulated deltas every flush_interval seconds (or sooner
+    once max_pending distinct codes are buffered) with one bulk UPDATE, so a
+    viral link costs one statement per interval instead of one transaction per
+    click. The same flush upserts the per-minute counts into the minute/hour/day
+    rollups and, with record_events, appends the raw clicks to click_events.
+    """
+    def __init__(
+        self,
+        session_factory:Callable[[],AsyncSession],
+        flush_interval:float=1.0,
+        max_pending:int=10_000,
+        repository:Callable=StatsRepository,
+        record_events:bool=True,
+        max_events:int=100_000
+        ):
+        self.session_factory = session_factory
+        self.repository = repository
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.record_events = record_events
+        self.max_events = max_events
+        self._pending:dict[str,tuple[int,datetime]] = {}
+        self._minutes:dict[tuple[str,datetime],int] = {}
+        self._events:list[tuple[str,datetime]] = []
+        self._partitions_month:Optional[datetime] = None
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task:Optional[asyncio.Task] = None
+
+    @property
+    def pending(self)->int:
+        return sum(delta for delta,_ in self._pending.values())
+
+    def record(self,short_code:str,count:int=1):
+        now = datetime.utcnow()
+        delta,_ = self._pending.get(short_code,(0,None))
+        self._pending[short_code] = (delta + count,now)
+        key = (short_code,bucket_start(now,"minute"))
+        self._minutes[key] = self._minutes.get(key,0) + count
+        if self.record_events:
+            self._events.extend([(short_code,now)] * count)
+        if len(self._pending) >= self.max_pending or len(self._events) >= self.max_events:
+            self._flush_requested.set()
+
+    async def _ensure_partitions(self,now:datetime):
+        if self._partitions_month == month_start(now):
+            return
+        try:
+            async with self.session_factory() as session:
+                await self.repository(session).ensure_event_partitions(now)
+                await session.commit()
+            self._partitions_month = month_start(now)
+        except Exception:
+            logger.exception("could not create click_events partitions")
+
+    def _requeue(self,batch,minutes,events):
+        for code,(delta,ts) in batch.items():
+            pending,latest = self._pending.get(code,(0,ts))
+            self._pending[code] = (pending + delta,max(ts,latest))
+        for key,count in minutes.items():
+            self._minutes[key] = self._minutes.get(key,0) + count
+        # raw events are best effort; keep the newest within the cap
+        room = max(self.max_events - len(self._events),0)
+        if len(events) > room:
+            logger.warning("dropping %d click events after a failed flush",len(events) - room)
+            events = events[len(events) - room:] if room else []
+        self._events = events + self._events
+
+    async def flush(self)->int:
+        """
+        Writes buffered deltas to the database and returns the number of clicks flushed.
+        On failure the deltas are merged back so the next flush retries them.
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            minutes, self._minutes = self._minutes, {}
+            events, self._events = self._events, []
+            if not batch:
+                return 0
+            if self.record_events:
+                await self._ensure_partitions(datetime.utcnow())
+            repo = None
+            try:
+                async with self.session_factory() as session:
+                    repo = self.repository(session)
+                    await repo.increment_clicks(batch)
+                    await repo.increment_rollups(minutes)
+                    await repo.append_click_events(events)
+                    await session.commit()
+            except Exception as exc:
+                if isinstance(exc,ShardCommitError):
+                    # shards that did commit must not be counted twice
+                    failed = lambda code:repo.router.shard_for(code) not in exc.committed
+                    batch = {code:entry for code,entry in batch.items() if failed(code)}
+                    minutes = {key:count for key,count in minutes.items() if failed(key[0])}
+                    events = [event for event in events if failed(event[0])]
+                logger.exception("click flush failed, requeueing %d codes",len(batch))
+                self._requeue(batch,minutes,events)
+                return 0
+            return sum(delta for delta,_ in batch.values())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(),self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the flush loop and drains whatever is still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+click_aggregator:Optional[ClickAggregator] = None
+
+CLICK_BACKLOG = Gauge(
+    "click_backlog","Clicks buffered but not yet flushed to the database",
+    fn=lambda:click_aggregator.pending if click_aggregator is not None else 0
+)
+
+async def init_click_aggregator(
+    session_factory:Callable[[],AsyncSession],
+    repository:Callable=StatsRepository
+    )->ClickAggregator:
+    global click_aggregator
+    click_aggregator = ClickAggregator(
+        session_factory,
+        flush_interval=float(os.getenv("CLICK_FLUSH_INTERVAL","1.0")),
+        max_pending=int(os.getenv("CLICK_FLUSH_MAX_PENDING","10000")),
+        repository=repository,
+        record_events=os.getenv("CLICK_EVENTS","true").lower() == "true",
+        max_events=int(os.getenv("CLICK_EVENTS_MAX_BUFFER","100000"))
+    )
+    click_aggregator.start()
+    return click_aggregator
+
+async def close_click_aggregator():
+    global click_aggregator
+    if click_aggregator:
+        await click_aggregator.stop()
+        click_aggregator = None
+
+def get_click_aggregator()->Optional[ClickAggregator]:
+    return click_aggregator
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from repository.url import BATCH_SIZE, UrlRepository
+
+EXPORT_COLUMNS = (
+    "id","short_code","long_url","created_at","redirect_status",
+    "cache_max_age","immutable","click_count","last_clicked_at"
+)
+EXPORT_MEDIA_TYPES = {"csv":"text/csv","ndjson":"application/x-ndjson"}
+
+async def export_pages(
+    url_repo:UrlRepository,
+    after_id:int=0,
+    batch_size:int=BATCH_SIZE
+    )->AsyncIterator[list[tuple]]:
+    """
+    Every mapping with an id above after_id, one keyset page at a time.
+    The read transaction ends after each page, so a slow reader holds no
+    connection or snapshot while it catches up.
+    """
+    while True:
+        page = await url_repo.export_page(after_id,batch_size)
+        await url_repo.rollback()
+        if not page:
+            return
+        yield page
+        after_id = page[-1][0]
+
+
+class ExportEncoder:
+    """
+    Turns pages of EXPORT_COLUMNS rows into CSV (with a header line) or
+    NDJSON bytes, optionally as one gzip stream. Nothing is kept between
+    pages but the compressor's window, and each page is flushed, so the
+    client receives it as soon as it is encoded.
+    """
+    def __init__(self,fmt:str="csv",compress:bool=False):
+        if fmt not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"format must be one of {tuple(EXPORT_MEDIA_TYPES)}")
+        self.fmt = fmt
+        # wbits=31: gzip header and trailer, not a bare zlib stream
+        self._gzip = zlib.compressobj(6,zlib.DEFLATED,31) if compress else None
+        self._started = False
+
+    def _text(self,page:list[tuple])->str:
+        if self.fmt == "ndjson":
+            return "".join(
+                json.dumps(dict(zip(EXPORT_COLUMNS,row)),default=datetime.isoformat) + "\n" for row in page
+            )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer,lineterminator="\n")
+        if not self._started:
+            writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(
+            [value.isoformat() if isinstance(value,datetime) else value for value in row] for row in page
+        )
+        return buffer.getvalue()
+
+    def encode(self,page:list[tuple])->bytes:
+        data = self._text(page).encode()
+        self._started = True
+        if self._gzip is None:
+            return data
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self)->bytes:
+        """
+        The bytes that end the stream: the CSV header if there were no
+        rows, and the gzip trailer.
+        """
+        data = b"" if self._started else self._text([]).encode()
+        self._started = True
+        if self._gzip is None:
+            return data
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+async def encode_export(pages:AsyncIterator[list[tuple]],encoder:ExportEncoder)->AsyncIterator[bytes]:
+    async for page in pages:
+        yield encoder.encode(page)
+    yield encoder.finish()
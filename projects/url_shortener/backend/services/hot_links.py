@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+
+from services.cache import CacheService
+from utils.heavy_hitters import HeavyHitters
+
+logger = logging.getLogger(__name__)
+
+_WINDOW = re.compile(r"^(\d+)([smh])$")
+_UNIT_SECONDS = {"s":1,"m":60,"h":3600}
+
+def parse_window(window:str,max_seconds:int)->int:
+    """
+    Parses a window such as "30s", "5m" or "1h" into seconds.
+
+    Raises:
+        HTTPException: 400 if it is malformed or longer than max_seconds.
+    """
+    match = _WINDOW.match(window)
+    if not match:
+        raise HTTPException(400,"window must look like 30s, 5m or 1h")
+    seconds = int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    if not 0 < seconds <= max_seconds:
+        raise HTTPException(400,f"window must be between 1s and {max_seconds}s")
+    return seconds
+
+
+class HotLinks:
+    """
+    Tracks which short codes this process is redirecting most right now.
+
+    Each minute gets its own HeavyHitters (a Count-Min sketch plus a top-k
+    heap), and minutes older than retention_minutes are dropped, so memory
+    is fixed and old traffic decays out. A window is answered from the
+    minutes it covers: candidates are the union of their top-k and each
+    estimate is the sum of the per-minute estimates.
+
+    With redis, every pin_interval seconds each minute's top-k counts since
+    the last flush are added (ZINCRBY) to a sorted set per minute shared by
+    all workers, and cluster_top answers from their union. With a cache, the
+    top pin_count codes over pin_window seconds then get their Redis TTL
+    extended and are pinned in the L1. rate stays per worker.
+    """
+    def __init__(
+        self,
+        cache:Optional[CacheService]=None,
+        k:int=100,
+        width:int=2048,
+        depth:int=4,
+        retention_minutes:int=60,
+        pin_count:int=50,
+        pin_window:int=300,
+        pin_interval:float=10.0,
+        redis:Optional[Redis]=None,
+        clock:Callable[[],float]=time.time
+        ):
+        self.cache = cache
+        self.redis = redis
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.retention_minutes = retention_minutes
+        self.pin_count = pin_count
+        self.pin_window = pin_window
+        self.pin_interval = pin_interval
+        self.clock = clock
+        self._minutes:deque[tuple[int,HeavyHitters]] = deque()
+        # minute -> code -> count already added to that minute's sorted set
+        self._flushed:dict[int,dict[str,int]] = {}
+        self._task:Optional[asyncio.Task] = None
+
+    def _current(self)->HeavyHitters:
+        minute = int(self.clock() // 60)
+        if not self._minutes or self._minutes[-1][0] != minute:
+            self._minutes.append((minute,HeavyHitters(self.k,self.width,self.depth)))
+            while self._minutes[0][0] <= minute - self.retention_minutes:
+                self._minutes.popleft()
+        return self._minutes[-1][1]
+
+    def record(self,short_code:str):
+        self._current().add(short_code)
+
+    def top(self,window_seconds:int,n:Optional[int]=None)->list[tuple[str,int]]:
+        """
+        The most redirected codes over the last window_seconds (rounded up
+        to whole minutes, the current one included), highest first, with
+        their estimated redirect counts.
+        """
+        oldest = int(self.clock() // 60) - math.ceil(window_seconds / 60)
+        minutes = [hitters for minute,hitters in self._minutes if minute > oldest]
+        candidates = {code for hitters in minutes for code in hitters.top}
+        ranked = sorted(
+            ((code,sum(hitters.estimate(code) for hitters in minutes)) for code in candidates),
+            key=lambda entry:entry[1],
+            reverse=True
+        )
+        return ranked[:n or self.k]
+
+    def _window(self,window_seconds:int)->range:
+        now = int(self.clock() // 60)
+        return range(now - math.ceil(window_seconds / 60) + 1,now + 1)
+
+    async def flush(self)->int:
+        """
+        Adds what each minute's top-k gained since the last flush to the
+        shared per-minute sorted sets. Minutes before the previous one are
+        complete, so they are not looked at again. Returns how many counts
+        were sent; if redis fails they are retried by the next flush.
+        """
+        if self.redis is None:
+            return 0
+        current = int(self.clock() // 60)
+        deltas = []
+        for minute,hitters in self._minutes:
+            if minute < current - 1:
+                continue
+            flushed = self._flushed.get(minute,{})
+            deltas += [
+                (minute,code,count - flushed.get(code,0))
+                for code,count in hitters.top.items() if count > flushed.get(code,0)
+            ]
+        if deltas:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for minute,code,delta in deltas:
+                    pipe.zincrby(f"hot:{minute}",delta,code)
+                for minute in {minute for minute,_,_ in deltas}:
+                    pipe.expire(f"hot:{minute}",(self.retention_minutes + 1) * 60)
+                await pipe.execute()
+            for minute,code,delta in deltas:
+                flushed = self._flushed.setdefault(minute,{})
+                flushed[code] = flushed.get(code,0) + delta
+        self._flushed = {minute:codes for minute,codes in self._flushed.items() if minute >= current - 1}
+        return len(deltas)
+
+    async def cluster_top(self,window_seconds:int,n:Optional[int]=None)->Optional[list[tuple[str,int]]]:
+        """
+        Like top, but over the redirects of every worker as of their last
+        flush. None without redis or if it fails.
+        """
+        if self.redis is None:
+            return None
+        try:
+            ranked = await self.redis.zunion([f"hot:{minute}" for minute in self._window(window_seconds)],withscores=True)
+        except Exception:
+            logger.exception("reading shared hot links failed")
+            return None
+        ranked = sorted(((code,int(score)) for code,score in ranked),key=lambda entry:entry[1],reverse=True)
+        return ranked[:n or self.k]
+
+    def rate(self,short_code:str,window_seconds:int=300)->float:
+        """
+        Estimated redirects per minute for short_code over the last
+        window_seconds. Overestimates by at most the sketch error.
+        """
+        minutes = math.ceil(window_seconds / 60)
+        oldest = int(self.clock() // 60) - minutes
+        total = sum(hitters.estimate(short_code) for minute,hitters in self._minutes if minute > oldest)
+        return total / minutes
+
+    async def refresh_pins(self)->int:
+        """
+        Extends the Redis TTL of the current top codes and pins them in the L1.
+        Returns how many were pinned.
+        """
+        if self.cache is None:
+            return 0
+        ranked = await self.cluster_top(self.pin_window,self.pin_count)
+        hot = [code for code,_ in ranked or self.top(self.pin_window,self.pin_count)]
+        return await self.cache.pin_hot(hot)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.pin_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("flushing hot links failed")
+            try:
+                await self.refresh_pins()
+            except Exception:
+                logger.exception("refreshing hot link pins failed")
+
+    def start(self):
+        if self._task is None and (self.cache is not None or self.redis is not None):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+hot_links:Optional[HotLinks] = None
+
+async def init_hot_links(cache:Optional[CacheService]=None)->Optional[HotLinks]:
+    global hot_links
+    if os.getenv("HOT_LINKS","true").lower() != "true":
+        return None
+    hot_links = HotLinks(
+        cache,
+        k=int(os.getenv("HOT_LINKS_K","100")),
+        retention_minutes=int(os.getenv("HOT_LINKS_RETENTION_MINUTES","60")),
+        pin_count=int(os.getenv("HOT_LINKS_PIN_COUNT","50")),
+        pin_window=int(os.getenv("HOT_LINKS_PIN_WINDOW","300")),
+        pin_interval=float(os.getenv("HOT_LINKS_PIN_INTERVAL","10")),
+        # counts shared across workers through redis
+        redis=cache.redis if cache and os.getenv("HOT_LINKS_SHARED","true").lower() == "true" else None
+    )
+    hot_links.start()
+    return hot_links
+
+async def close_hot_links():
+    global hot_links
+    if hot_links:
+        await hot_links.stop()
+        hot_links = None
+
+def get_hot_links()->Optional[HotLinks]:
+    return hot_links
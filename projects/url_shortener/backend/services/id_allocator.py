@@ -0,0 +1,59 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_session_local
+from repository.id_block import IdBlockRepository
+
+class IdBlockAllocator:
+    """
+    Hands out url_mappings ids from blocks leased in bulk.
+
+    Each process leases block_size ids at a time from the id_blocks counter
+    (one UPDATE ... RETURNING in its own short transaction) and serves them
+    from memory, so a short code can be computed before the row is inserted.
+    Ids left in a block when the process exits are skipped, not reused.
+    """
+    def __init__(
+        self,
+        session_factory:Callable[[],AsyncSession],
+        block_size:int=1000,
+        name:str="url_mappings"
+        ):
+        self.session_factory = session_factory
+        self.block_size = block_size
+        self.name = name
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self,count:int=1)->list[int]:
+        ids = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    await self._lease(max(self.block_size,count - len(ids)))
+                take = min(count - len(ids),self._end - self._next)
+                ids.extend(range(self._next,self._next + take))
+                self._next += take
+        return ids
+
+    async def _lease(self,size:int):
+        async with self.session_factory() as session:
+            start = await IdBlockRepository(session).lease(self.name,size)
+            await session.commit()
+        self._next,self._end = start,start + size
+
+
+_id_allocator:Optional[IdBlockAllocator] = None
+
+def get_id_allocator()->IdBlockAllocator:
+    global _id_allocator
+    if _id_allocator is None:
+        _id_allocator = IdBlockAllocator(
+            get_session_local(),
+            block_size=int(os.getenv("ID_BLOCK_SIZE","1000"))
+        )
+    return _id_allocator
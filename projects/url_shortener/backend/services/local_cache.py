@@ -0,0 +1,98 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+class CacheStats:
+    """
+    Hit/miss counters for one cache tier.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    @property
+    def hit_ratio(self)->float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LocalCache:
+    """
+    Size-bounded, in-process LRU cache with a per-entry TTL.
+
+    Sits in front of Redis (the L2) so hot short codes resolve without a
+    network round trip. The TTL is kept well below the Redis TTL because
+    invalidations only reach the L1 of the process that performed them.
+    Pinned keys are skipped by LRU eviction but still expire.
+    """
+    def __init__(
+        self,
+        max_size:int=10_000,
+        ttl:float=30.0,
+        clock:Callable[[],float]=time.monotonic
+        ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries:OrderedDict[str,tuple[float,str]] = OrderedDict()
+        self._pinned:set[str] = set()
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def get(self,key:str)->Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.miss()
+            return None
+        expires_at,value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self.stats.miss()
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hit()
+        return value
+
+    def set(self,key:str,value:str,ttl:Optional[float]=None):
+        self._entries[key] = (self.clock() + (ttl or self.ttl),value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            victim = next((k for k in self._entries if k not in self._pinned),None)
+            if victim is None:
+                self._entries.popitem(last=False)
+            else:
+                del self._entries[victim]
+
+    def pin(self,keys:list[str]):
+        """
+        Replaces the set of keys protected from LRU eviction.
+        """
+        self._pinned = set(keys[:self.max_size // 2])
+
+    def delete(self,key:str):
+        self._entries.pop(key,None)
+
+    def clear(self):
+        self._entries.clear()
+        self._pinned.clear()
+
+
+_local_cache:Optional[LocalCache] = None
+
+def get_local_cache()->LocalCache:
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LocalCache(
+            max_size=int(os.getenv("L1_CACHE_SIZE","10000")),
+            ttl=float(os.getenv("L1_CACHE_TTL","30"))
+        )
+    return _local_cache
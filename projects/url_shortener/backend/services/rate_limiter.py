@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Callable, NamedTuple, Optional
+
+from redis.asyncio import Redis
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the time since it was last touched, then grants up
+# to ARGV[3] tokens at once. Redis' own clock is used so every worker agrees.
+# Returns {granted, 0} or, when empty, {0, milliseconds until a token}.
+_TAKE_TOKENS = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+if granted > 0 then
+    return {granted, 0}
+end
+return {0, math.ceil((1 - tokens) / rate * 1000)}
+"""
+
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total","Rate limit checks by rule, decision and where it was made",("rule","decision","source")
+)
+
+class RateLimitRule(NamedTuple):
+    """
+    A token bucket per client for the requests matching method and path.
+
+    Attributes:
+        name (str): Metrics label and part of the Redis key.
+        method (str): HTTP method the rule applies to.
+        path (re.Pattern): Matched against the whole request path.
+        capacity (int): Burst size; also the tokens refilled per period.
+        period (float): Seconds to refill an empty bucket.
+    """
+    name:str
+    method:str
+    path:re.Pattern
+    capacity:int
+    period:float
+
+    @property
+    def rate(self)->float:
+        return self.capacity / self.period
+
+
+# name, method, path and default "capacity/period seconds"
+DEFAULT_RULES = (
+    ("shorten","POST",r"/shorten","20/60"),
+    # one bucket for both bulk endpoints, or streaming would bypass the limit
+    ("shorten_bulk","POST",r"/shorten/bulk(/stream)?","5/60"),
+    # ahead of redirect, whose pattern also matches /export
+    ("export","GET",r"/export","5/3600"),
+    ("redirect","GET",r"/[0-9A-Za-z]+","600/60"),
+    ("beacon","POST",r"/beacon/[0-9A-Za-z]+","600/60"),
+)
+
+def load_rules(defaults=DEFAULT_RULES)->list[RateLimitRule]:
+    """
+    The rules with their limits from RATE_LIMIT_<NAME> (e.g.
+    RATE_LIMIT_SHORTEN=20/60); "off" drops a rule.
+    """
+    rules = []
+    for name,method,path,default in defaults:
+        spec = os.getenv(f"RATE_LIMIT_{name.upper()}",default)
+        if spec.lower() == "off":
+            continue
+        capacity,period = spec.split("/")
+        rules.append(RateLimitRule(name,method,re.compile(path),int(capacity),float(period)))
+    return rules
+
+
+class RateLimiter:
+    """
+    Per-client token buckets kept in Redis, so the limits hold across workers.
+
+    Most checks never reach Redis. A worker takes up to lease tokens from a
+    bucket in one script call and hands them out locally until they run out
+    or lease_seconds pass (unused ones are forfeited, so a worker can only
+    ever under-admit). An empty bucket is remembered locally until it has a
+    token again, so a client being throttled costs no round trip either.
+
+    If Redis fails, requests are let through.
+    """
+    def __init__(
+        self,
+        redis_client:Redis,
+        rules:list[RateLimitRule],
+        lease:int=5,
+        lease_seconds:float=1.0,
+        api_keys:frozenset[str]=frozenset(),
+        max_clients:int=100_000,
+        clock:Callable[[],float]=time.monotonic
+        ):
+        self.redis = redis_client
+        self.rules = rules
+        self.lease = lease
+        self.lease_seconds = lease_seconds
+        self.api_keys = api_keys
+        self.max_clients = max_clients
+        self.clock = clock
+        # bucket key -> (leased tokens left, lease expiry), or (-1, when it refills)
+        self._local:dict[str,tuple[int,float]] = {}
+        self._script = None
+
+    def match(self,method:str,path:str)->Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.method == method and rule.path.fullmatch(path):
+                return rule
+        return None
+
+    def client(self,scope)->str:
+        """
+        Who a request is limited as: its API key if it sends a known one in
+        X-API-Key (hashed, so keys never reach Redis), otherwise its IP.
+        Unknown keys are ignored, or rotating made-up keys would dodge limits.
+        """
+        for name,value in scope["headers"]:
+            if name == b"x-api-key" and value.decode("latin-1") in self.api_keys:
+                return "key:" + hashlib.blake2b(value,digest_size=12).hexdigest()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def _lease_size(self,rule:RateLimitRule)->int:
+        # small buckets are not split into leases, or one worker could hold them all
+        return max(1,min(self.lease,rule.capacity // 10))
+
+    async def check(self,rule:RateLimitRule,client:str)->float:
+        """
+        Takes a token for client under rule. Returns 0 if the request may
+        proceed, otherwise the seconds until it may retry.
+        """
+        key = f"ratelimit:{rule.name}:{client}"
+        now = self.clock()
+        tokens,until = self._local.get(key,(0,0.0))
+        if until > now and tokens < 0:
+            RATE_LIMIT_DECISIONS.inc(rule=rule.name,decision="denied",source="local")
+            return until - now
+        if until > now and tokens > 0:
+            self._local[key] = (tokens - 1,until)
+            RATE_LIMIT_DECISIONS.inc(rule=rule.name,decision="allowed",source="local")
+            return 0.0
+
+        if self._script is None:
+            self._script = self.redis.register_script(_TAKE_TOKENS)
+        try:
+            granted,retry_ms = await self._script(keys=[key],args=[rule.capacity,rule.rate,self._lease_size(rule)])
+        except Exception:
+            logger.exception("rate limit check failed, allowing request")
+            RATE_LIMIT_DECISIONS.inc(rule=rule.name,decision="allowed",source="error")
+            return 0.0
+
+        if len(self._local) >= self.max_clients:
+            self._local = {k:v for k,v in self._local.items() if v[1] > now}
+        if granted:
+            self._local[key] = (int(granted) - 1,now + self.lease_seconds)
+            RATE_LIMIT_DECISIONS.inc(rule=rule.name,decision="allowed",source="redis")
+            return 0.0
+        retry_after = int(retry_ms) / 1000
+        self._local[key] = (-1,now + retry_after)
+        RATE_LIMIT_DECISIONS.inc(rule=rule.name,decision="denied",source="redis")
+        return retry_after
+
+
+rate_limiter:Optional[RateLimiter] = None
+
+async def init_rate_limiter(redis_client:Redis)->Optional[RateLimiter]:
+    global rate_limiter
+    if os.getenv("RATE_LIMIT","true").lower() != "true":
+        return None
+    rate_limiter = RateLimiter(
+        redis_client,
+        load_rules(),
+        lease=int(os.getenv("RATE_LIMIT_LEASE","5")),
+        lease_seconds=float(os.getenv("RATE_LIMIT_LEASE_SECONDS","1")),
+        api_keys=frozenset(key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS","").split(",") if key.strip())
+    )
+    return rate_limiter
+
+async def close_rate_limiter():
+    global rate_limiter
+    rate_limiter = None
+
+def get_rate_limiter()->Optional[RateLimiter]:
+    return rate_limiter
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repository.url import UrlRepository
+from utils.bloom_filter import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# codes issued in the last few sync intervals, scored by when, shared by all workers
+RECENT_KEY = "short_codes:recent"
+
+class ShortCodeFilter:
+    """
+    In-memory Bloom filter of every issued short code.
+
+    Lets resolve_short_code reject unknown codes without touching Redis or
+    Postgres. The filter is rebuilt from url_mappings at startup and then
+    synced incrementally every refresh_interval seconds. Codes issued by
+    other workers since the last sync are covered by a Redis sorted set that
+    every worker publishes new codes to: a code the local filter has not
+    seen is looked up there before it is rejected, so a new link resolves on
+    every worker at once. Until the first rebuild finishes, or if syncing or
+    Redis fails, every code is treated as possibly present.
+    """
+    def __init__(
+        self,
+        session_factory:Callable[[],AsyncSession],
+        capacity:int=1_000_000,
+        error_rate:float=0.001,
+        refresh_interval:float=5.0,
+        repository:Callable=UrlRepository,
+        redis:Optional[Redis]=None,
+        clock:Callable[[],float]=time.time
+        ):
+        self.session_factory = session_factory
+        self.redis = redis
+        self.clock = clock
+        # how long codes stay in RECENT_KEY; syncs older than this can no longer be trusted
+        self.recent_seconds = max(60.0,refresh_interval * 10)
+        self._synced_at = 0.0
+        self.repository = repository
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.ready = False
+        self._bloom = BloomFilter(capacity,error_rate)
+        self._watermark:Optional[datetime] = None
+        self._task:Optional[asyncio.Task] = None
+
+    def add(self,short_code:str):
+        self._bloom.add(short_code)
+
+    def might_exist(self,short_code:str)->bool:
+        if not self.ready:
+            return True
+        return short_code in self._bloom
+
+    async def publish(self,short_codes:list[str]):
+        """
+        Adds newly issued codes here and to RECENT_KEY for the other workers.
+        """
+        for short_code in short_codes:
+            self._bloom.add(short_code)
+        if self.redis is None or not short_codes:
+            return
+        try:
+            await self.redis.zadd(RECENT_KEY,dict.fromkeys(short_codes,self.clock()))
+        except Exception:
+            logger.exception("publishing %d new short codes failed",len(short_codes))
+
+    async def may_exist(self,short_codes:list[str])->list[str]:
+        """
+        The codes that may have been issued, in order: those in the local
+        filter plus those another worker published since this one last synced.
+        """
+        if not self.ready or self.clock() - self._synced_at > self.recent_seconds:
+            return list(short_codes)
+        unseen = [code for code in short_codes if code not in self._bloom]
+        if not unseen:
+            return list(short_codes)
+        published = set()
+        if self.redis is not None:
+            try:
+                scores = await self.redis.zmscore(RECENT_KEY,unseen)
+            except Exception:
+                logger.exception("checking recent short codes failed")
+                return list(short_codes)
+            published = {code for code,score in zip(unseen,scores) if score is not None}
+            for code in published:
+                self._bloom.add(code)
+        return [code for code in short_codes if code not in unseen or code in published]
+
+    async def rebuild(self):
+        started = self.clock()
+        async with self.session_factory() as session:
+            repo = self.repository(session)
+            total = await repo.count()
+            # keep headroom so the false-positive rate holds as new codes arrive
+            bloom = BloomFilter(max(self.capacity,total * 2),self.error_rate)
+            watermark = None
+            async for short_code,created_at in repo.iter_short_codes():
+                bloom.add(short_code)
+                watermark = created_at if watermark is None else max(watermark,created_at)
+        self._bloom = bloom
+        self._watermark = watermark
+        self._synced_at = started
+        self.ready = True
+
+    async def sync(self):
+        """
+        Adds codes created since the last sync. Re-reads an overlap window
+        because created_at is stamped before commit and rows can land late.
+        """
+        started = self.clock()
+        since = self._watermark - timedelta(seconds=self.refresh_interval * 2) if self._watermark else None
+        async with self.session_factory() as session:
+            async for short_code,created_at in self.repository(session).iter_short_codes(created_after=since):
+                self._bloom.add(short_code)
+                self._watermark = created_at if self._watermark is None else max(self._watermark,created_at)
+        self._synced_at = started
+        if self.redis is not None:
+            # every worker has synced past these by now, or trusts no negatives
+            await self.redis.zremrangebyscore(RECENT_KEY,"-inf",started - self.recent_seconds)
+
+    async def _run(self):
+        while not self.ready:
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("short code filter rebuild failed")
+                await asyncio.sleep(self.refresh_interval)
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("short code filter sync failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+short_code_filter:Optional[ShortCodeFilter] = None
+
+async def init_short_code_filter(
+    session_factory:Callable[[],AsyncSession],
+    repository:Callable=UrlRepository,
+    redis_client:Optional[Redis]=None
+    )->Optional[ShortCodeFilter]:
+    global short_code_filter
+    if os.getenv("SHORT_CODE_FILTER","true").lower() != "true":
+        return None
+    short_code_filter = ShortCodeFilter(
+        session_factory,
+        capacity=int(os.getenv("SHORT_CODE_FILTER_CAPACITY","1000000")),
+        error_rate=float(os.getenv("SHORT_CODE_FILTER_ERROR_RATE","0.001")),
+        refresh_interval=float(os.getenv("SHORT_CODE_FILTER_REFRESH","5")),
+        repository=repository,
+        redis=redis_client
+    )
+    short_code_filter.start()
+    return short_code_filter
+
+async def close_short_code_filter():
+    global short_code_filter
+    if short_code_filter:
+        await short_code_filter.stop()
+        short_code_filter = None
+
+def get_short_code_filter()->Optional[ShortCodeFilter]:
+    return short_code_filter
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import math
+import os
+import random
+from datetime import datetime
+from typing import Callable, Optional
+
+from redis.asyncio import Redis
+
+from metrics import Gauge,Histogram
+from utils.time_buckets import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+TTL_BUCKETS = (30,60,120,300,600,900,1800,3600,7200,21600,86400)
+
+CACHE_TTL = Histogram("cache_ttl_seconds","TTLs assigned to Redis entries by reason",("reason",),buckets=TTL_BUCKETS)
+REDIS_USED_MEMORY = Gauge("redis_used_memory_bytes","Redis used_memory, sampled periodically")
+REDIS_KEYS = Gauge("redis_keys","Keys in the Redis database, sampled periodically")
+
+class AdaptiveTtl:
+    """
+    Per-key Redis TTLs from how often a code is redirected and how old it is.
+
+    rate_fn gives a code's recent redirects per minute. At hot_rate or more
+    the TTL grows with log2 of the rate from base up to max_ttl; below it,
+    it shrinks linearly towards min_ttl, and links younger than new_age
+    seconds that are not hot yet get min_ttl outright. Every TTL is then
+    jittered by +/- jitter so keys written together do not expire together.
+
+    With sliding, a Redis hit pushes the key's expiry out to a freshly
+    computed TTL, so a code that keeps being requested never expires.
+    """
+    def __init__(
+        self,
+        rate_fn:Optional[Callable[[str],float]]=None,
+        base:int=300,
+        min_ttl:int=60,
+        max_ttl:int=3600,
+        hot_rate:float=1.0,
+        new_age:float=3600,
+        jitter:float=0.1,
+        sliding:bool=True,
+        rng:Callable[[],float]=random.random
+        ):
+        self.rate_fn = rate_fn
+        self.base = base
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.hot_rate = hot_rate
+        self.new_age = new_age
+        self.jitter = jitter
+        self.sliding = sliding
+        self.rng = rng
+
+    def _pick(self,short_code:str,created_at:Optional[datetime])->tuple[float,str]:
+        if self.rate_fn is None:
+            return self.base,"default"
+        rate = self.rate_fn(short_code)
+        if rate >= self.hot_rate:
+            return min(self.max_ttl,self.base * (1 + math.log2(rate / self.hot_rate))),"hot"
+        if created_at is not None and (datetime.utcnow() - to_naive_utc(created_at)).total_seconds() < self.new_age:
+            return self.min_ttl,"new"
+        return self.min_ttl + (self.base - self.min_ttl) * rate / self.hot_rate,"rare"
+
+    def ttl(self,short_code:str,created_at:Optional[datetime]=None)->int:
+        """
+        The TTL in seconds for caching short_code now.
+        """
+        ttl,reason = self._pick(short_code,created_at)
+        ttl = max(1,round(ttl * (1 + self.jitter * (2 * self.rng() - 1))))
+        CACHE_TTL.observe(ttl,reason=reason)
+        return ttl
+
+
+class RedisMemorySampler:
+    """
+    Samples Redis used_memory and key count into gauges, to set against the
+    cache hit ratio when tuning TTLs.
+    """
+    def __init__(self,redis_client:Redis,interval:float=30.0):
+        self.redis = redis_client
+        self.interval = interval
+        self._task:Optional[asyncio.Task] = None
+
+    async def sample(self):
+        info = await self.redis.info("memory")
+        REDIS_USED_MEMORY.set(int(info["used_memory"]))
+        REDIS_KEYS.set(await self.redis.dbsize())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception:
+                logger.exception("sampling redis memory failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+ttl_policy:Optional[AdaptiveTtl] = None
+memory_sampler:Optional[RedisMemorySampler] = None
+
+async def init_ttl_policy(
+    redis_client:Redis,
+    rate_fn:Optional[Callable[[str],float]]=None
+    )->Optional[AdaptiveTtl]:
+    """
+    Starts the memory sampler and, unless CACHE_TTL_ADAPTIVE=false, the
+    adaptive TTL policy fed by rate_fn.
+    """
+    global ttl_policy,memory_sampler
+    memory_sampler = RedisMemorySampler(
+        redis_client,
+        interval=float(os.getenv("REDIS_MEMORY_SAMPLE_INTERVAL","30"))
+    )
+    memory_sampler.start()
+    if os.getenv("CACHE_TTL_ADAPTIVE","true").lower() != "true":
+        return None
+    ttl_policy = AdaptiveTtl(
+        rate_fn,
+        base=int(os.getenv("CACHE_TTL","300")),
+        min_ttl=int(os.getenv("CACHE_TTL_MIN","60")),
+        max_ttl=int(os.getenv("CACHE_TTL_MAX","3600")),
+        hot_rate=float(os.getenv("CACHE_TTL_HOT_RATE","1")),
+        new_age=float(os.getenv("CACHE_TTL_NEW_AGE","3600")),
+        jitter=float(os.getenv("CACHE_TTL_JITTER","0.1")),
+        sliding=os.getenv("CACHE_TTL_SLIDING","true").lower() == "true"
+    )
+    return ttl_policy
+
+async def close_ttl_policy():
+    global ttl_policy,memory_sampler
+    if memory_sampler:
+        await memory_sampler.stop()
+        memory_sampler = None
+    ttl_policy = None
+
+def get_ttl_policy()->Optional[AdaptiveTtl]:
+    return ttl_policy
@@ -0,0 +1,171 @@
+import asyncio
+import itertools
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from metrics import REDIS_LATENCY,Counter
+
+logger = logging.getLogger(__name__)
+
+class UniqueVisitors:
+    """
+    Approximate unique visitors per short code with Redis HyperLogLogs.
+
+    Redirects call record() with a hashed visitor fingerprint; the buffered
+    fingerprints are PFADDed every flush_interval seconds into one sketch per
+    code per UTC day (kept retention_days) and one all-time sketch. A range
+    of days is answered by PFCOUNT over the daily keys, which Redis merges
+    on the fly, so weeks and months never rescan clicks.
+
+    The buffer is bounded for when Redis is down: at most max_pending
+    sketches of at most max_fingerprints each. Fingerprints beyond that are
+    dropped and counted in unique_visitors_dropped_total, so the estimates
+    undercount rather than the worker running out of memory.
+    """
+    def __init__(
+        self,
+        redis_client:Redis,
+        flush_interval:float=1.0,
+        max_pending:int=10_000,
+        max_fingerprints:int=10_000,
+        retention_days:int=400
+        ):
+        self.redis = redis_client
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_fingerprints = max_fingerprints
+        self.retention_days = retention_days
+        self._pending:dict[tuple[str,str],set[str]] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task:Optional[asyncio.Task] = None
+
+    def _day_key(self,short_code:str,day:str)->str:
+        return f"hll:{short_code}:{day}"
+
+    def _total_key(self,short_code:str)->str:
+        return f"hll:{short_code}:all"
+
+    def _buffer(self,key:tuple[str,str],fingerprints:set[str]):
+        pending = self._pending.get(key)
+        if pending is None:
+            if len(self._pending) >= self.max_pending:
+                UNIQUE_VISITORS_DROPPED.inc(len(fingerprints),reason="too_many_sketches")
+                return
+            pending = self._pending[key] = set()
+        new = fingerprints - pending
+        room = self.max_fingerprints - len(pending)
+        if len(new) > room:
+            UNIQUE_VISITORS_DROPPED.inc(len(new) - room,reason="sketch_full")
+            new = set(itertools.islice(new,room))
+        pending.update(new)
+
+    def record(self,short_code:str,fingerprint:str):
+        day = datetime.utcnow().strftime("%Y%m%d")
+        self._buffer((short_code,day),{fingerprint})
+        # flush well before the buffer is full, so only an outage drops anything
+        if len(self._pending) >= self.max_pending // 2:
+            self._flush_requested.set()
+
+    async def flush(self)->int:
+        """
+        Sends buffered fingerprints in one pipeline and returns how many
+        (code, day) sketches were updated. On failure they are kept for the
+        next flush, within the buffer bounds.
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            totals:dict[str,set[str]] = {}
+            for (short_code,_),fingerprints in batch.items():
+                totals.setdefault(short_code,set()).update(fingerprints)
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for (short_code,day),fingerprints in batch.items():
+                        key = self._day_key(short_code,day)
+                        pipe.pfadd(key,*fingerprints)
+                        pipe.expire(key,timedelta(days=self.retention_days))
+                    for short_code,fingerprints in totals.items():
+                        pipe.pfadd(self._total_key(short_code),*fingerprints)
+                    with REDIS_LATENCY.time(op="pfadd"):
+                        await pipe.execute()
+            except Exception:
+                logger.exception("unique visitor flush failed, requeueing %d sketches",len(batch))
+                for key,fingerprints in batch.items():
+                    self._buffer(key,fingerprints)
+                return 0
+            return len(batch)
+
+    async def count(self,short_code:str,days:Optional[int]=None)->int:
+        """
+        Estimated unique visitors, all time or over the last days UTC days
+        (today included).
+        """
+        if days is None:
+            keys = [self._total_key(short_code)]
+        else:
+            today = datetime.utcnow()
+            keys = [
+                self._day_key(short_code,(today - timedelta(days=offset)).strftime("%Y%m%d"))
+                for offset in range(days)
+            ]
+        with REDIS_LATENCY.time(op="pfcount"):
+            return await self.redis.pfcount(*keys)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(),self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+UNIQUE_VISITORS_DROPPED = Counter(
+    "unique_visitors_dropped_total","Visitor fingerprints dropped from a full buffer, by reason",("reason",)
+)
+
+unique_visitors:Optional[UniqueVisitors] = None
+
+async def init_unique_visitors(redis_client:Redis)->Optional[UniqueVisitors]:
+    global unique_visitors
+    if os.getenv("UNIQUE_VISITORS","true").lower() != "true":
+        return None
+    unique_visitors = UniqueVisitors(
+        redis_client,
+        flush_interval=float(os.getenv("UNIQUE_VISITORS_FLUSH_INTERVAL","1.0")),
+        max_pending=int(os.getenv("UNIQUE_VISITORS_MAX_PENDING","10000")),
+        max_fingerprints=int(os.getenv("UNIQUE_VISITORS_MAX_FINGERPRINTS","10000")),
+        retention_days=int(os.getenv("UNIQUE_VISITORS_RETENTION_DAYS","400"))
+    )
+    unique_visitors.start()
+    return unique_visitors
+
+async def close_unique_visitors():
+    global unique_visitors
+    if unique_visitors:
+        await unique_visitors.stop()
+        unique_visitors = None
+
+def get_unique_visitors()->Optional[UniqueVisitors]:
+    return unique_visitors
@@ -1,95 +1,386 @@
+import math
+import os
+import random
+import time
+from datetime import datetime
 from fastapi import HTTPException
-from repository.url import UrlRepository
+from sqlalchemy.exc import IntegrityError
+from repository.url import BATCH_SIZE, UrlRepository
 from repository.stats import StatsRepository
-from services.cache import CacheService
-from typing import Optional
+from services.cache import MISSING, CacheService
+from services.short_code_filter import ShortCodeFilter
+from services.id_allocator import IdBlockAllocator
+from services.background import BackgroundExecutor
+from services.export import export_pages
+from typing import AsyncIterator, Optional
 from utils.id_to_base import BASE62, id_to_base
+from utils.single_flight import SingleFlight
+from utils.url_digest import url_digest
+from utils.redirect_policy import DEFAULT_POLICY,RedirectPolicy,decode_entry,encode_entry,policy_of
+from utils.tracing import traced
+from utils.time_buckets import GRANULARITIES,bucket_start,to_naive_utc
 from models.model import UrlMapping
 
+# one DB load per short code per process; concurrent misses await the same result
+_resolve_flight = SingleFlight()
+
+# XFetch beta for probabilistic early refresh; 0 disables refresh-ahead
+REFRESH_AHEAD_BETA = float(os.getenv("CACHE_REFRESH_AHEAD_BETA","0"))
+
+class _LoadTime:
+    """
+    Moving average of how long a DB load takes, used to scale early refreshes.
+    """
+    def __init__(self,initial:float=0.05,alpha:float=0.1):
+        self.average = initial
+        self.alpha = alpha
+
+    def observe(self,seconds:float):
+        self.average += self.alpha * (seconds - self.average)
+
+_load_time = _LoadTime()
+
+class _RecentWrites:
+    """
+    Short codes this process created in the last window seconds. Reads of
+    these go to the primary so a new code resolves before replicas catch up.
+    """
+    def __init__(self,window:float,clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._expires:dict[str,float] = {}
+
+    def add(self,short_code:str):
+        if self.window <= 0:
+            return
+        now = self.clock()
+        if len(self._expires) > 10_000:
+            self._expires = {code:at for code,at in self._expires.items() if at > now}
+        self._expires[short_code] = now + self.window
+
+    def __contains__(self,short_code:str)->bool:
+        expires = self._expires.get(short_code)
+        if expires is None:
+            return False
+        if expires <= self.clock():
+            del self._expires[short_code]
+            return False
+        return True
+
+_recent_writes = _RecentWrites(float(os.getenv("READ_YOUR_WRITES_WINDOW","5")))
+
+# time series limits for /stats/{short_code}?granularity=
+DEFAULT_SERIES_POINTS = {"minute":60,"hour":48,"day":30}
+MAX_SERIES_POINTS = 1440
+
+# top-level paths served by the app itself, which a custom code would shadow
+RESERVED_CODES = {"metrics","ready","export"}
+
 class UrlShortenerService:
     def __init__(
         self,
         url_repo:UrlRepository,
         stats_repo:StatsRepository,
-        cache:CacheService
+        cache:CacheService,
+        code_filter:Optional[ShortCodeFilter]=None,
+        refresh_beta:float=REFRESH_AHEAD_BETA,
+        id_allocator:Optional[IdBlockAllocator]=None,
+        read_url_repo:Optional[UrlRepository]=None,
+        read_stats_repo:Optional[StatsRepository]=None,
+        executor:Optional[BackgroundExecutor]=None
         ):
         self.url_repo=url_repo
         self.stats_repo=stats_repo
         self.cache=cache
+        self.code_filter=code_filter
+        self.refresh_beta=refresh_beta
+        self.id_allocator=id_allocator
+        # lookups for resolve and stats; same as the write repos without replicas
+        self.read_url_repo=read_url_repo or url_repo
+        self.read_stats_repo=read_stats_repo or stats_repo
+        # runs cache fills after the response; inline without one
+        self.executor=executor
+
+    async def _after_response(self,name:str,fn,*args):
+        if self.executor is None:
+            await fn(*args)
+        else:
+            # a shed cache fill only costs a later miss
+            self.executor.submit(name,fn,*args)
     
-    async def shorten_url(self,long_url:str,custom_code:Optional[str]=None)->str:
+    @traced("url.shorten")
+    async def shorten_url(
+        self,
+        long_url:str,
+        custom_code:Optional[str]=None,
+        policy:Optional[RedirectPolicy]=None
+        )->str:
+        """
+        The short code for long_url, creating it if needed. A long url has
+        one code, so an existing one is reused only when policy is None (no
+        preference) or matches the policy it was created with; otherwise 409.
+        """
         # check if url is already shortened
         existing:UrlMapping = await self.url_repo.get_by_long_url(long_url)
         if existing:
-            return existing.short_code
+            return self._reuse(existing,policy)
+        policy = policy or DEFAULT_POLICY
         
         # handle custom vs auto-generated code
         if custom_code:
-            short_code = await self._create_custom_short_url(long_url,custom_code)
+            short_code = await self._create_custom_short_url(long_url,custom_code,policy)
         else:
-            short_code = await self._create_auto_short_url(long_url)
+            short_code = await self._create_auto_short_url(long_url,policy)
         
         # initialize stats and commit
         await self.stats_repo.create(short_code)
-        await self.url_repo.commit()
+        try:
+            await self.url_repo.commit()
+        except IntegrityError:
+            # lost a race: the same long url or custom code was committed concurrently
+            await self.url_repo.rollback()
+            existing = await self.url_repo.get_by_long_url(long_url)
+            if existing:
+                return self._reuse(existing,policy)
+            if custom_code:
+                raise HTTPException(409,"Custom code already taken")
+            raise
+
+        if self.code_filter is not None:
+            await self.code_filter.publish([short_code])
+        _recent_writes.add(short_code)
 
-        # cache the mapping
-        await self.cache.set_url(short_code,long_url)
+        # cache the mapping; a brand new link gets a short ttl until it is clicked
+        await self._after_response("cache_new_url",self.cache.set_url,short_code,encode_entry(long_url,policy),datetime.utcnow())
 
         return short_code
     
-    async def _create_custom_short_url(self,long_url:str,custom_code:str)-> str:
+    def _reuse(self,existing:UrlMapping,policy:Optional[RedirectPolicy])->str:
+        if policy is not None and policy_of(existing) != policy:
+            raise HTTPException(409,"URL already shortened with a different redirect policy")
+        return existing.short_code
+
+    async def shorten_many(self,long_urls:list[str])->dict[str,str]:
+        """
+        Shortens a batch of URLs with a fixed number of round trips.
+
+        Duplicates within the batch are collapsed, already-shortened URLs are
+        found with one IN query, and the rest get ids reserved up front so
+        url_mappings and url_stats can be written with multi-row inserts.
+        Returns long_url -> short_code for every distinct input URL.
+        """
+        # collapse duplicates by digest so equivalent spellings share one row
+        digests = {url:url_digest(url) for url in long_urls}
+        first_by_digest = {}
+        for url,digest in digests.items():
+            first_by_digest.setdefault(digest,url)
+        unique_urls = list(first_by_digest.values())
+
+        try:
+            short_codes = await self._shorten_new(unique_urls)
+        except IntegrityError:
+            # a concurrent request inserted some of these urls; they are found as existing now
+            await self.url_repo.rollback()
+            short_codes = await self._shorten_new(unique_urls)
+
+        return {url:short_codes[first_by_digest[digest]] for url,digest in digests.items()}
+
+    async def _shorten_new(self,unique_urls:list[str])->dict[str,str]:
+        existing = await self.url_repo.get_many_by_long_url(unique_urls)
+        new_urls = [url for url in unique_urls if url not in existing]
+        if not new_urls:
+            return existing
+
+        ids = await self.id_allocator.allocate(len(new_urls))
+        created = {url:id_to_base(id) for url,id in zip(new_urls,ids)}
+        await self.url_repo.create_many([
+            (id,url,created[url]) for url,id in zip(new_urls,ids)
+        ])
+        await self.stats_repo.create_many(list(created.values()))
+        await self.url_repo.commit()
+
+        if self.code_filter is not None:
+            await self.code_filter.publish(list(created.values()))
+        for short_code in created.values():
+            _recent_writes.add(short_code)
+
+        await self._after_response("cache_new_urls",self.cache.set_many,{short_code:url for url,short_code in created.items()})
+
+        return {**existing,**created}
+
+    async def _create_custom_short_url(self,long_url:str,custom_code:str,policy:RedirectPolicy)-> str:
         # validate custom code
         if not all(c in BASE62 for c in custom_code):
             raise HTTPException(400,"Custom code must be Alphanumeric")
+        if custom_code in RESERVED_CODES:
+            raise HTTPException(409,"Custom code is reserved")
         
         # check availability
         if await self.url_repo.custom_code_exists(custom_code):
             raise HTTPException(409,"Custom code already taken")
         
-        # create with custom code
-        await self.url_repo.create(long_url,short_code=custom_code)
+        # create with custom code; the id still comes from the allocator so it
+        # cannot collide with ids leased by other workers
+        [id] = await self.id_allocator.allocate(1)
+        await self.url_repo.create(long_url,short_code=custom_code,id=id,policy=policy)
         return custom_code
     
-    async def _create_auto_short_url(self,long_url:str)-> str:
-        # create mapping to get auto-increment ID
-        url_mapping:UrlMapping = await self.url_repo.create(long_url)
+    async def _create_auto_short_url(self,long_url:str,policy:RedirectPolicy)-> str:
+        # take an id from the locally leased block - no round trip
+        [id] = await self.id_allocator.allocate(1)
 
-        # generate short_code from ID
-        short_code = id_to_base(url_mapping.id)
-        url_mapping.short_code = short_code
+        # generate short_code from ID and insert the row complete
+        short_code = id_to_base(id)
+        await self.url_repo.create(long_url,short_code=short_code,id=id,policy=policy)
         return short_code
-    
+
     async def resolve_short_code(self,short_code:str)->str:
+        long_url,_ = decode_entry(await self._resolve_entry(short_code))
+        return long_url
+
+    async def resolve_redirect(self,short_code:str)->tuple[str,RedirectPolicy]:
+        """
+        The long URL and the redirect policy for short_code.
+        """
+        return decode_entry(await self._resolve_entry(short_code))
+
+    @traced("url.resolve")
+    async def _resolve_entry(self,short_code:str)->str:
+        """
+        The cache entry for short_code: the long URL, prefixed with its
+        redirect policy unless that is the default.
+        """
+        # never issued, by this worker or any other - reject without touching the cache or the db
+        if self.code_filter is not None and not await self.code_filter.may_exist([short_code]):
+            raise HTTPException(404, "Short URL not found")
+
         # check cache first
-        cached_url = await self.cache.get_url(short_code)
-        if cached_url:
-            return cached_url
+        if self.refresh_beta:
+            cached_entry,ttl_left = await self.cache.get_url_with_ttl(short_code)
+        else:
+            cached_entry,ttl_left = await self.cache.get_url(short_code),None
+        if cached_entry == MISSING:
+            raise HTTPException(404, "Short URL not found")
+        if cached_entry:
+            if not self._should_refresh_early(ttl_left) or _resolve_flight.in_flight(short_code):
+                return cached_entry
+            # refresh ahead of expiry; the cached value is still good if that fails
+            try:
+                return await _resolve_flight.do(short_code,lambda:self._load(short_code)) or cached_entry
+            except Exception:
+                return cached_entry
 
-        # cache miss - fetch from db
-        url_mapping:UrlMapping = await self.url_repo.get_by_short_code(short_code)
-        if not url_mapping:
+        # cache miss - fetch from db, coalesced with concurrent misses for the same code
+        entry = await _resolve_flight.do(short_code,lambda:self._load(short_code))
+        if not entry:
             raise HTTPException(404, "Short URL not found")
-        
-        # cache for next time
-        await self.cache.set_url(short_code,url_mapping.long_url)
+        return entry
+
+    def _should_refresh_early(self,ttl_left:Optional[float])->bool:
+        """
+        XFetch: refresh with a probability that rises as the entry nears expiry,
+        scaled by how long a reload takes.
+        """
+        if ttl_left is None or not self.refresh_beta:
+            return False
+        return -_load_time.average * self.refresh_beta * math.log(1.0 - random.random()) >= ttl_left
 
-        return url_mapping.long_url
+    async def _load(self,short_code:str)->Optional[str]:
+        """
+        Loads short_code's cache entry from the database and caches it.
+        """
+        started = time.perf_counter()
+        repo = self._read_url_repo(short_code)
+        url_mapping:UrlMapping = await repo.get_by_short_code(short_code)
+        if not url_mapping and repo is not self.url_repo:
+            # confirm on the primary before negative-caching a replica miss
+            url_mapping = await self.url_repo.get_by_short_code(short_code)
+        _load_time.observe(time.perf_counter() - started)
+        if not url_mapping:
+            await self.cache.set_missing(short_code)
+            return None
+
+        # cache for next time
+        entry = encode_entry(url_mapping.long_url,policy_of(url_mapping))
+        await self.cache.set_url(short_code,entry,created_at=url_mapping.created_at)
+        return entry
     
+    def export_pages(self,after_id:int=0,batch_size:int=BATCH_SIZE)->AsyncIterator[list[tuple]]:
+        """
+        Every mapping after after_id with its clicks, a keyset page at a
+        time, read from a replica when there is one.
+        """
+        return export_pages(self.read_url_repo,after_id,batch_size)
+
+    async def resolve_many(self,short_codes:list[str])->dict[str,Optional[str]]:
+        """
+        Resolves a batch of codes with one MGET and at most one IN query.
+        Unknown codes map to None.
+        """
+        unique_codes = list(dict.fromkeys(short_codes))
+        results:dict[str,Optional[str]] = {code:None for code in unique_codes}
+        if self.code_filter is not None:
+            unique_codes = await self.code_filter.may_exist(unique_codes)
+
+        cached = await self.cache.get_many(unique_codes)
+        for short_code,entry in cached.items():
+            results[short_code] = None if entry == MISSING else decode_entry(entry)[0]
+
+        misses = [code for code in unique_codes if code not in cached]
+        if misses:
+            loaded = await self.read_url_repo.get_many_redirects(misses)
+            unconfirmed = [code for code in misses if code not in loaded]
+            if unconfirmed and self.read_url_repo is not self.url_repo:
+                loaded.update(await self.url_repo.get_many_redirects(unconfirmed))
+            results.update({code:long_url for code,(long_url,_) in loaded.items()})
+            await self.cache.set_many({code:encode_entry(*redirect) for code,redirect in loaded.items()})
+            await self.cache.set_missing_many([code for code in misses if code not in loaded])
+
+        return results
+
+    def _read_url_repo(self,short_code:str)->UrlRepository:
+        return self.url_repo if short_code in _recent_writes else self.read_url_repo
+
+    def _read_stats_repo(self,short_code:str)->StatsRepository:
+        return self.stats_repo if short_code in _recent_writes else self.read_stats_repo
+
     async def track_click(self,short_code:str):
         await self.stats_repo.increment_click(short_code)
     
     async def get_stats(self, short_code:str):
-        result = await self.stats_repo.get_with_mapping(short_code) 
+        repo = self._read_stats_repo(short_code)
+        result = await repo.get_with_mapping(short_code)
+        if not result and repo is not self.stats_repo:
+            result = await self.stats_repo.get_with_mapping(short_code)
         if not result:
             raise HTTPException(404, "Short URL not found")
         return result
 
+    async def get_click_series(
+        self,
+        short_code:str,
+        granularity:str,
+        start:Optional[datetime]=None,
+        end:Optional[datetime]=None
+        )->list[tuple[datetime,int]]:
+        """
+        Clicks per bucket from the rollups, oldest first, with empty buckets
+        filled in. Defaults to the most recent DEFAULT_SERIES_POINTS buckets.
+        """
+        if granularity not in GRANULARITIES:
+            raise HTTPException(400,f"granularity must be one of {', '.join(GRANULARITIES)}")
+        step = GRANULARITIES[granularity]
+        end = bucket_start(to_naive_utc(end) if end else datetime.utcnow(),granularity) + step
+        start = bucket_start(to_naive_utc(start),granularity) if start else end - step * DEFAULT_SERIES_POINTS[granularity]
+        if start >= end:
+            raise HTTPException(400,"start must be before end")
+        if (end - start) / step > MAX_SERIES_POINTS:
+            raise HTTPException(400,f"at most {MAX_SERIES_POINTS} buckets per request")
 
-    
-
-
-
-
-
-        
\ No newline at end of file
+        counts = await self._read_stats_repo(short_code).get_series(short_code,granularity,start,end)
+        series = []
+        bucket = start
+        while bucket < end:
+            series.append((bucket,counts.get(bucket,0)))
+            bucket += step
+        return series
@@ -0,0 +1,216 @@
+"""
+Hash-slot sharding of url_mappings, url_stats and url_stats_shards.
+
+A short code maps to one of SLOT_COUNT slots by crc32, and the directory
+database (DATABASE_URL) records which shard owns each slot in shard_slots.
+The directory also holds id_blocks, so ids - and the codes derived from
+them - stay unique across shards, and url_digests for long URL dedup.
+Moving a slot between shards only rewrites its shard_slots row; see
+tools/rebalance_shards.py.
+"""
+import asyncio
+import logging
+import os
+import zlib
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import build_engine, create_schema
+from models.database import ShardSlot, UrlMapping
+
+logger = logging.getLogger(__name__)
+
+SLOT_COUNT = 1024
+
+def slot_for(short_code:str)->int:
+    return zlib.crc32(short_code.encode()) % SLOT_COUNT
+
+
+class ShardRouter:
+    """
+    Maps short codes to shard engines using the slot table, which is
+    reloaded every refresh_interval seconds so slot moves made by the
+    rebalance tool reach every worker.
+    """
+    def __init__(
+        self,
+        engines:list,
+        directory_factory:Callable[[],AsyncSession],
+        refresh_interval:float=5.0
+        ):
+        self.engines = engines
+        self.session_factories = [
+            sessionmaker(engine,class_=AsyncSession,expire_on_commit=False) for engine in engines
+        ]
+        self.directory_factory = directory_factory
+        self.refresh_interval = refresh_interval
+        self.owners:list[int] = [0] * SLOT_COUNT
+        self.moved_from:dict[int,int] = {}
+        self._task:Optional[asyncio.Task] = None
+
+    def shard_for(self,short_code:str)->int:
+        """
+        The shard new rows and click increments for short_code go to.
+        """
+        return self.owners[slot_for(short_code)]
+
+    def read_shards(self,short_code:str)->list[int]:
+        """
+        Shards to look in, in order: the owner, then the previous owner while
+        the slot is still being drained.
+        """
+        slot = slot_for(short_code)
+        previous = self.moved_from.get(slot)
+        return [self.owners[slot]] if previous is None else [self.owners[slot],previous]
+
+    async def seed(self):
+        """
+        Fills shard_slots on first start. An empty shard 0 gets its slots
+        spread over all shards; existing data stays on shard 0 until rebalanced.
+        Slots another process seeded first are left as they are.
+        """
+        async with self.directory_factory() as session:
+            if (await session.execute(select(func.count()).select_from(ShardSlot))).scalar_one():
+                return
+            async with self.session_factories[0]() as shard:
+                has_rows = (await shard.execute(select(UrlMapping.id).limit(1))).first() is not None
+            dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+            await session.execute(dialect.insert(ShardSlot).on_conflict_do_nothing(index_elements=["slot"]),[
+                {"slot":slot,"shard":0 if has_rows else slot % len(self.engines)}
+                for slot in range(SLOT_COUNT)
+            ])
+            await session.commit()
+
+    async def load(self):
+        async with self.directory_factory() as session:
+            rows = (await session.execute(select(ShardSlot.slot,ShardSlot.shard,ShardSlot.moved_from))).all()
+        owners = [0] * SLOT_COUNT
+        moved_from = {}
+        for slot,shard,previous in rows:
+            if shard >= len(self.engines) or (previous is not None and previous >= len(self.engines)):
+                raise RuntimeError(f"shard_slots refers to shard {max(shard,previous or 0)}, only {len(self.engines)} configured")
+            owners[slot] = shard
+            if previous is not None:
+                moved_from[slot] = previous
+        self.owners = owners
+        self.moved_from = moved_from
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("shard slot map refresh failed, keeping the previous map")
+
+    async def start(self):
+        for engine in self.engines:
+            await create_schema(engine)
+        await self.seed()
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class ShardCommitError(Exception):
+    def __init__(self,committed:list[int]):
+        super().__init__(f"shard commit failed after committing shards {committed}")
+        self.committed = committed
+
+
+class ShardSessions:
+    """
+    A unit of work spanning the directory session and lazily opened shard
+    sessions. Usable as an async context manager like an AsyncSession.
+    """
+    def __init__(self,router:ShardRouter,directory:AsyncSession):
+        self.router = router
+        self.directory = directory
+        self._sessions:dict[int,AsyncSession] = {}
+
+    def session(self,shard:int)->AsyncSession:
+        if shard not in self._sessions:
+            self._sessions[shard] = self.router.session_factories[shard]()
+        return self._sessions[shard]
+
+    def all_shards(self)->list[AsyncSession]:
+        return [self.session(shard) for shard in range(len(self.router.engines))]
+
+    async def commit(self)->list[int]:
+        """
+        Commits every open shard session and returns the shards committed.
+        If one fails, ShardCommitError carries the ones that already succeeded.
+        """
+        committed = []
+        for shard,session in self._sessions.items():
+            try:
+                await session.commit()
+            except Exception as exc:
+                raise ShardCommitError(committed) from exc
+            committed.append(shard)
+        return committed
+
+    async def rollback(self):
+        for session in self._sessions.values():
+            await session.rollback()
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc_info):
+        await self.close()
+        await self.directory.close()
+
+
+_router:Optional[ShardRouter] = None
+
+async def init_shards(directory_factory:Callable[[],AsyncSession])->Optional[ShardRouter]:
+    """
+    Starts shard routing when DATABASE_SHARD_URLS (comma-separated) is set.
+    """
+    global _router
+    urls = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS","").split(",") if url.strip()]
+    if not urls:
+        return None
+    _router = ShardRouter(
+        [build_engine(url) for url in urls],
+        directory_factory,
+        refresh_interval=float(os.getenv("SHARD_MAP_REFRESH","5"))
+    )
+    await _router.start()
+    return _router
+
+async def close_shards():
+    global _router
+    if _router is not None:
+        await _router.stop()
+        _router = None
+
+def get_shard_router()->Optional[ShardRouter]:
+    return _router
+
+def shard_sessions_factory(router:ShardRouter,directory_factory:Callable[[],AsyncSession]):
+    """
+    Session factory for background jobs (click flush, bloom filter sync)
+    that yields ShardSessions instead of a single AsyncSession.
+    """
+    return lambda:ShardSessions(router,directory_factory())
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from backend.services import background
+from backend.services.background import BackgroundExecutor
+from backend.services.url import UrlShortenerService
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_on_fixed_workers():
+    executor = BackgroundExecutor(workers=2)
+    running = 0
+    peak = 0
+    async def job():
+        nonlocal running,peak
+        running += 1
+        peak = max(peak,running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    executor.start()
+    for _ in range(10):
+        assert executor.submit("job",job)
+    await executor.stop()
+
+    assert peak == 2
+    assert executor.depth == 0
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_by_policy():
+    done = []
+    async def job(n):
+        done.append(n)
+
+    newest = BackgroundExecutor(max_queue=2,policy="drop_new")
+    assert [newest.submit("shed_new",job,n) for n in range(3)] == [True,True,False]
+    oldest = BackgroundExecutor(max_queue=2,policy="drop_oldest")
+    assert all(oldest.submit("shed_old",job,n) for n in range(3))
+
+    for executor in (newest,oldest):
+        executor.start()
+        await executor.stop()
+    assert done == [0,1,1,2]
+    assert background.BACKGROUND_DROPPED.value(job="shed_new",reason="queue_full") == 1
+    assert background.BACKGROUND_DROPPED.value(job="shed_old",reason="queue_full") == 1
+
+@pytest.mark.asyncio
+async def test_failing_job_does_not_stop_worker():
+    done = []
+    async def boom():
+        raise RuntimeError("boom")
+    async def job():
+        done.append(True)
+
+    executor = BackgroundExecutor(workers=1)
+    executor.start()
+    executor.submit("boom",boom)
+    executor.submit("after_boom",job)
+    await executor.stop()
+
+    assert done == [True]
+    assert background.BACKGROUND_FAILED.value(job="boom") == 1
+
+@pytest.mark.asyncio
+async def test_stop_drops_jobs_left_after_timeout():
+    executor = BackgroundExecutor(workers=1,drain_timeout=0.05)
+    executor.start()
+    for _ in range(3):
+        executor.submit("slow",asyncio.sleep,1)
+    await executor.stop()
+
+    assert background.BACKGROUND_DROPPED.value(job="slow",reason="shutdown") == 2
+
+@pytest.mark.asyncio
+async def test_shorten_fills_cache_after_response():
+    url_repo,stats_repo,cache = AsyncMock(),AsyncMock(),AsyncMock()
+    url_repo.get_by_long_url.return_value = None
+    allocator = AsyncMock()
+    allocator.allocate.return_value = [123]
+    executor = BackgroundExecutor()
+    service = UrlShortenerService(url_repo,stats_repo,cache,id_allocator=allocator,executor=executor)
+
+    assert await service.shorten_url("https://example.com") == "1z"
+    cache.set_url.assert_not_called()
+    assert executor.depth == 1
+
+    executor.start()
+    await executor.stop()
+    cache.set_url.assert_called_once()
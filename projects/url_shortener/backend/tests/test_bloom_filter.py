@@ -0,0 +1,18 @@
+from backend.utils.bloom_filter import BloomFilter
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(capacity=1000,error_rate=0.01)
+    codes = [f"code{i}" for i in range(1000)]
+    for code in codes:
+        bloom.add(code)
+
+    assert all(code in bloom for code in codes)
+
+def test_false_positive_rate_near_target():
+    bloom = BloomFilter(capacity=1000,error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"code{i}")
+
+    false_positives = sum(f"other{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
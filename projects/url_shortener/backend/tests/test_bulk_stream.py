@@ -0,0 +1,42 @@
+import httpx
+import json
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from backend.api import endpoints
+
+
+def app_with(service)->FastAPI:
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[endpoints.get_url_service] = lambda:service
+    return app
+
+@pytest.mark.asyncio
+async def test_stream_answers_each_line_in_order(monkeypatch):
+    # several chunks, so ordering holds across shorten_many calls
+    monkeypatch.setenv("BULK_CHUNK_SIZE","2")
+    monkeypatch.setenv("BASE_URL","https://sho.rt")
+    service = AsyncMock()
+    service.shorten_many.side_effect = lambda urls:{url:f"c{url[-1]}" for url in urls}
+    body = b"\n".join([
+        b'{"long_url":"https://example.com/1"}',
+        b'{"long_url":"not a url"}',
+        b"",
+        b'{"long_url":"https://example.com/2"}',
+        b'{"long_url":"https://example.com/3"}',
+    ])
+
+    transport = httpx.ASGITransport(app=app_with(service))
+    async with httpx.AsyncClient(transport=transport,base_url="http://test") as client:
+        response = await client.post("/shorten/bulk/stream",content=body)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [result.get("short_code") or result["line"] for result in results] == ["c1",2,"c2","c3"]
+    assert results[0] == {"long_url":"https://example.com/1","short_code":"c1","short_url":"https://sho.rt/c1"}
+    assert results[1]["error"][0]["loc"] == ["long_url"]
+    assert [call.args[0] for call in service.shorten_many.await_args_list] == [
+        ["https://example.com/1"],["https://example.com/2","https://example.com/3"]
+    ]
@@ -0,0 +1,121 @@
+import pytest
+from datetime import datetime,timedelta
+from unittest.mock import AsyncMock,MagicMock
+from backend.services.cache import MISSING,CacheService
+from backend.services.local_cache import LocalCache
+from backend.services.ttl_policy import AdaptiveTtl
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self)->float:
+        return self.now
+
+def test_local_cache_expires_entries():
+    clock = FakeClock()
+    cache = LocalCache(ttl=10,clock=clock)
+    cache.set("abc123","https://example.com")
+
+    assert cache.get("abc123") == "https://example.com"
+    clock.now = 11
+    assert cache.get("abc123") is None
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_size=2)
+    cache.set("a","https://a.com")
+    cache.set("b","https://b.com")
+    cache.get("a")
+    cache.set("c","https://c.com")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "https://a.com"
+    assert len(cache) == 2
+
+@pytest.mark.asyncio
+async def test_l1_hit_skips_redis():
+    redis = AsyncMock()
+    local = LocalCache()
+    cache = CacheService(redis,local)
+    local.set("abc123","https://example.com")
+
+    assert await cache.get_url("abc123") == "https://example.com"
+    redis.get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_redis_hit_populates_l1():
+    redis = AsyncMock()
+    redis.get.return_value = "https://example.com"
+    local = LocalCache()
+    cache = CacheService(redis,local)
+
+    assert await cache.get_url("abc123") == "https://example.com"
+    assert await cache.get_url("abc123") == "https://example.com"
+    redis.get.assert_called_once_with("url:abc123")
+
+@pytest.mark.asyncio
+async def test_delete_invalidates_l1():
+    redis = AsyncMock()
+    redis.get.return_value = None
+    local = LocalCache()
+    cache = CacheService(redis,local)
+    await cache.set_url("abc123","https://example.com")
+
+    await cache.delete_url("abc123")
+
+    assert await cache.get_url("abc123") is None
+
+@pytest.mark.asyncio
+async def test_get_many_uses_l1_then_single_mget():
+    redis = AsyncMock()
+    redis.mget.return_value = ["https://b.com",None]
+    local = LocalCache()
+    cache = CacheService(redis,local)
+    local.set("a","https://a.com")
+
+    found = await cache.get_many(["a","b","c"])
+
+    assert found == {"a":"https://a.com","b":"https://b.com"}
+    redis.mget.assert_called_once_with(["url:b","url:c"])
+    assert local.get("b") == "https://b.com"
+
+def test_adaptive_ttl_by_rate_and_age():
+    rates = {"viral":64.0,"steady":1.0,"rare":0.5,"fresh":0.0,"dead":0.0}
+    policy = AdaptiveTtl(rates.get,base=300,min_ttl=60,max_ttl=1800,jitter=0)
+    old = datetime.utcnow() - timedelta(days=30)
+
+    assert policy.ttl("viral") == 1800
+    assert policy.ttl("steady",old) == 300
+    assert policy.ttl("rare",old) == 180
+    assert policy.ttl("fresh",datetime.utcnow()) == 60
+    assert policy.ttl("dead",old) == 60
+
+def test_adaptive_ttl_jitter_stays_in_bounds():
+    low = AdaptiveTtl(base=300,jitter=0.1,rng=lambda:0.0)
+    high = AdaptiveTtl(base=300,jitter=0.1,rng=lambda:0.999999)
+
+    assert low.ttl("abc123") == 270
+    assert high.ttl("abc123") == 330
+
+@pytest.mark.asyncio
+async def test_redis_hit_slides_expiry_with_ttl_policy():
+    script = AsyncMock(return_value="https://example.com")
+    redis = MagicMock()
+    redis.register_script.return_value = script
+    cache = CacheService(redis,LocalCache(),AdaptiveTtl(lambda code:8.0,base=300,max_ttl=3600,jitter=0))
+
+    assert await cache.get_url("abc123") == "https://example.com"
+    script.assert_awaited_once_with(keys=["url:abc123"],args=[1200,MISSING])
+    redis.get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_set_url_uses_policy_ttl():
+    redis = AsyncMock()
+    cache = CacheService(redis,None,AdaptiveTtl(lambda code:0.0,min_ttl=60,jitter=0))
+
+    await cache.set_url("abc123","https://example.com",created_at=datetime.utcnow())
+
+    redis.setex.assert_called_once_with("url:abc123",60,"https://example.com")
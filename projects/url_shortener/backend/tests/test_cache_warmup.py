@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from backend.services.cache_warmup import CacheWarmup
+from backend.utils.redirect_policy import DEFAULT_POLICY
+
+
+class FakeStatsRepository:
+    rows = [(f"c{i}",f"https://example.com/{i}",100 - i,DEFAULT_POLICY) for i in range(25)]
+
+    def __init__(self,session):
+        pass
+
+    async def get_hottest(self,limit):
+        return self.rows[:limit]
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc_info):
+        pass
+
+@pytest.mark.asyncio
+async def test_warmup_loads_hottest_in_batches():
+    cache = AsyncMock()
+    warmup = CacheWarmup(FakeSession,cache,max_keys=20,batch_size=8,repository=FakeStatsRepository)
+
+    assert not warmup.ready.is_set()
+    assert await warmup.run() == 20
+    assert warmup.ready.is_set()
+    batches = [call.args[0] for call in cache.set_many.await_args_list]
+    assert [len(batch) for batch in batches] == [8,8,4]
+    assert list(batches[0])[0] == "c0"
+
+@pytest.mark.asyncio
+async def test_warmup_becomes_ready_when_budget_runs_out():
+    async def slow_set_many(mappings):
+        await asyncio.sleep(0.05)
+    cache = AsyncMock()
+    cache.set_many.side_effect = slow_set_many
+    warmup = CacheWarmup(FakeSession,cache,max_keys=25,batch_size=5,timeout=0.12,repository=FakeStatsRepository)
+
+    warmed = await warmup.run()
+    assert 0 < warmed < 25
+    assert warmup.ready.is_set()
+
+@pytest.mark.asyncio
+async def test_warmup_failure_still_marks_ready():
+    cache = AsyncMock()
+    cache.set_many.side_effect = ConnectionError("redis down")
+    warmup = CacheWarmup(FakeSession,cache,repository=FakeStatsRepository)
+
+    assert await warmup.run() == 0
+    assert warmup.ready.is_set()
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine,AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select,func
+from datetime import datetime
+from backend.models.database import Base,UrlStats,click_events
+from backend.repository.stats import StatsRepository
+from backend.services.click_aggregator import ClickAggregator
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:",echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine,class_=AsyncSession,expire_on_commit=False)
+    async with async_session() as session:
+        await StatsRepository(session).create("abc123")
+        await session.commit()
+    yield async_session
+    await engine.dispose()
+
+async def click_count(session_factory,short_code:str)->int:
+    async with session_factory() as session:
+        result = await session.execute(
+            select(UrlStats.click_count).where(UrlStats.short_code == short_code)
+        )
+        return result.scalar()
+
+@pytest.mark.asyncio
+async def test_record_buffers_until_flush(session_factory):
+    aggregator = ClickAggregator(session_factory)
+    for _ in range(5):
+        aggregator.record("abc123")
+
+    assert aggregator.pending == 5
+    assert await click_count(session_factory,"abc123") == 0
+
+    assert await aggregator.flush() == 5
+    assert aggregator.pending == 0
+    assert await click_count(session_factory,"abc123") == 5
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending_clicks(session_factory):
+    aggregator = ClickAggregator(session_factory,flush_interval=60)
+    aggregator.start()
+    aggregator.record("abc123")
+    aggregator.record("abc123")
+
+    await aggregator.stop()
+
+    assert await click_count(session_factory,"abc123") == 2
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_clicks():
+    def broken_session():
+        raise RuntimeError("database unavailable")
+
+    aggregator = ClickAggregator(broken_session)
+    aggregator.record("abc123",count=3)
+
+    assert await aggregator.flush() == 0
+    assert aggregator.pending == 3
+
+@pytest.mark.asyncio
+async def test_flush_writes_rollups_and_events(session_factory):
+    aggregator = ClickAggregator(session_factory)
+    for _ in range(4):
+        aggregator.record("abc123")
+    await aggregator.flush()
+
+    now = datetime.utcnow()
+    async with session_factory() as session:
+        repo = StatsRepository(session)
+        for granularity in ("minute","hour","day"):
+            series = await repo.get_series("abc123",granularity,datetime(2000,1,1),datetime(now.year + 1,1,1))
+            assert sum(series.values()) == 4
+        events = await session.execute(select(func.count()).select_from(click_events))
+        assert events.scalar() == 4
+
+@pytest.mark.asyncio
+async def test_events_can_be_disabled(session_factory):
+    aggregator = ClickAggregator(session_factory,record_events=False)
+    aggregator.record("abc123")
+    await aggregator.flush()
+
+    async with session_factory() as session:
+        events = await session.execute(select(func.count()).select_from(click_events))
+        assert events.scalar() == 0
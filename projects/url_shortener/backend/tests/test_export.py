@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock
+from backend.services.export import EXPORT_COLUMNS, ExportEncoder, encode_export, export_pages
+
+ROWS = [
+    (1,"a","https://example.com/a",datetime(2026,10,17,9),302,None,False,2,datetime(2026,10,17,10)),
+    (2,"b","https://example.com/b,c",datetime(2026,10,17,9),301,3600,True,0,None),
+]
+
+async def pages_of(*pages):
+    for page in pages:
+        yield page
+
+async def collect(encoder,*pages)->bytes:
+    return b"".join([chunk async for chunk in encode_export(pages_of(*pages),encoder)])
+
+@pytest.mark.asyncio
+async def test_export_pages_follows_the_last_id():
+    repo = AsyncMock()
+    repo.export_page.side_effect = [ROWS,[(7,)],[]]
+
+    pages = [page async for page in export_pages(repo,after_id=0,batch_size=2)]
+
+    assert pages == [ROWS,[(7,)]]
+    assert [call.args for call in repo.export_page.await_args_list] == [(0,2),(2,2),(7,2)]
+    assert repo.rollback.await_count == 3
+
+@pytest.mark.asyncio
+async def test_csv_has_one_header_across_pages():
+    data = await collect(ExportEncoder("csv"),ROWS[:1],ROWS[1:])
+
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert rows[0] == list(EXPORT_COLUMNS)
+    assert rows[1][:4] == ["1","a","https://example.com/a","2026-10-17T09:00:00"]
+    assert rows[2][2] == "https://example.com/b,c"
+    assert len(rows) == 3
+
+@pytest.mark.asyncio
+async def test_gzipped_ndjson_round_trips():
+    data = await collect(ExportEncoder("ndjson",compress=True),ROWS)
+
+    lines = gzip.decompress(data).decode().splitlines()
+    assert [json.loads(line)["short_code"] for line in lines] == ["a","b"]
+    assert json.loads(lines[1])["last_clicked_at"] is None
+
+@pytest.mark.asyncio
+async def test_empty_csv_export_is_just_the_header():
+    data = await collect(ExportEncoder("csv",compress=True))
+
+    assert gzip.decompress(data).decode() == ",".join(EXPORT_COLUMNS) + "\n"
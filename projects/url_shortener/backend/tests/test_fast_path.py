@@ -0,0 +1,55 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from backend.api import fast_path
+from backend.utils.redirect_policy import RedirectPolicy, encode_entry
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+
+    @app.get("/metrics")
+    async def metrics():
+        return "metrics"
+
+    @app.get("/{short_code}")
+    async def fallback(short_code:str):
+        return {"fallback":short_code}
+
+    return app
+
+@pytest.fixture
+def entries(monkeypatch):
+    entries = {}
+    lookup = AsyncMock(side_effect=lambda code:entries.get(code))
+    monkeypatch.setattr(fast_path.RedirectFastPath,"_lookup",lambda self,code:lookup(code))
+    for name in ("get_click_aggregator","get_unique_visitors","get_hot_links"):
+        monkeypatch.setattr(fast_path,name,lambda:None)
+    return entries
+
+def client(app)->httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=fast_path.RedirectFastPath(app)),base_url="http://test")
+
+@pytest.mark.asyncio
+async def test_cached_code_is_redirected_without_the_app(app,entries):
+    entries["abc"] = encode_entry("https://example.com/a b",RedirectPolicy(301))
+    async with client(app) as c:
+        response = await c.get("/abc")
+
+    assert response.status_code == 301
+    assert response.headers["location"] == "https://example.com/a%20b"
+    assert response.headers["cache-control"] == "public, max-age=86400"
+    assert response.headers["vary"] == "Origin"
+    assert fast_path.FAST_PATH_REQUESTS.value(outcome="served") >= 1
+
+@pytest.mark.asyncio
+async def test_misses_and_other_requests_fall_through(app,entries):
+    entries["metrics"] = "https://example.com"
+    entries["cors"] = "https://example.com"
+    async with client(app) as c:
+        assert (await c.get("/missing")).json() == {"fallback":"missing"}
+        assert (await c.get("/metrics")).json() == "metrics"
+        assert (await c.get("/bad-code")).json() == {"fallback":"bad-code"}
+        assert (await c.get("/cors",headers={"Origin":"https://a.example"})).json() == {"fallback":"cors"}
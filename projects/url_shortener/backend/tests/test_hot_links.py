@@ -0,0 +1,151 @@
+import random
+import pytest
+from unittest.mock import AsyncMock,MagicMock
+from fastapi import HTTPException
+from backend.services.cache import MISSING,CacheService
+from backend.services.hot_links import HotLinks,parse_window
+from backend.services.local_cache import LocalCache
+from backend.utils.heavy_hitters import CountMinSketch,HeavyHitters
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self)->float:
+        return self.now
+
+def test_count_min_never_undercounts():
+    sketch = CountMinSketch(width=64,depth=4)
+    truth = {}
+    for i in range(2000):
+        code = f"c{i % 300}"
+        truth[code] = truth.get(code,0) + 1
+        sketch.add(code)
+
+    assert all(sketch.estimate(code) >= count for code,count in truth.items())
+    assert sketch.total == 2000
+
+def test_heavy_hitters_finds_skewed_codes():
+    rng = random.Random(7)
+    hitters = HeavyHitters(k=5,width=256,depth=4)
+    stream = ["hot1"] * 500 + ["hot2"] * 300 + [f"cold{rng.randrange(5000)}" for _ in range(3000)]
+    rng.shuffle(stream)
+    for code in stream:
+        hitters.add(code)
+
+    top = hitters.most_common(2)
+    assert [code for code,_ in top] == ["hot1","hot2"]
+    assert top[0][1] >= 500
+    assert len(hitters.top) == 5
+
+def test_window_only_counts_recent_minutes():
+    clock = FakeClock()
+    hot = HotLinks(k=10,retention_minutes=10,clock=clock)
+    for _ in range(50):
+        hot.record("old")
+    clock.now += 6 * 60
+    for _ in range(5):
+        hot.record("new")
+
+    assert hot.top(300) == [("new",5)]
+    assert dict(hot.top(600)) == {"old":50,"new":5}
+    clock.now += 10 * 60
+    hot.record("newest")
+    assert [code for code,_ in hot.top(600)] == ["newest"]
+    assert len(hot._minutes) == 1
+
+def test_parse_window():
+    assert parse_window("5m",3600) == 300
+    assert parse_window("1h",3600) == 3600
+    for bad in ["5 m","2h","0s","soon"]:
+        with pytest.raises(HTTPException):
+            parse_window(bad,3600)
+
+@pytest.mark.asyncio
+async def test_refresh_pins_extends_ttl_and_pins_l1():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=["https://a.com",MISSING])
+    redis = MagicMock()
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    local = LocalCache(max_size=2)
+    hot = HotLinks(CacheService(redis,local),clock=FakeClock())
+    for code in ["a"] * 3 + ["b"]:
+        hot.record(code)
+
+    assert await hot.refresh_pins() == 1
+    pipe.getex.assert_any_call("url:a",ex=300)
+    assert local.get("a") == "https://a.com"
+
+    # a pinned key survives LRU pressure
+    local.set("x","https://x.com")
+    local.set("y","https://y.com")
+    assert local.get("a") == "https://a.com"
+    assert local.get("x") is None
+
+class FakeSortedSets:
+    """
+    Per-minute sorted sets for two workers to share, with zincrby through
+    a pipeline and zunion as in Redis.
+    """
+    def __init__(self):
+        self.sets = {}
+        self.fail = False
+
+    def pipeline(self,transaction=True):
+        pipe = MagicMock()
+        ops = []
+        pipe.zincrby.side_effect = lambda key,n,code:ops.append((key,n,code))
+        async def execute():
+            if self.fail:
+                raise ConnectionError("redis down")
+            for key,n,code in ops:
+                self.sets.setdefault(key,{})[code] = self.sets.get(key,{}).get(code,0) + n
+        pipe.execute = execute
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=pipe)
+        context.__aexit__ = AsyncMock(return_value=False)
+        return context
+
+    async def zunion(self,keys,withscores=False):
+        if self.fail:
+            raise ConnectionError("redis down")
+        total = {}
+        for key in keys:
+            for code,n in self.sets.get(key,{}).items():
+                total[code] = total.get(code,0) + n
+        return list(total.items())
+
+@pytest.mark.asyncio
+async def test_cluster_top_merges_workers():
+    clock,redis = FakeClock(),FakeSortedSets()
+    workers = [HotLinks(k=10,redis=redis,clock=clock) for _ in range(2)]
+    for code in ["a"] * 3 + ["b"] * 2:
+        workers[0].record(code)
+    for code in ["b"] * 4 + ["c"]:
+        workers[1].record(code)
+    for worker in workers:
+        await worker.flush()
+    # only what arrived since the last flush is added
+    workers[0].record("a")
+    clock.now += 60
+    workers[0].record("c")
+    assert await workers[0].flush() == 2
+
+    assert await workers[1].cluster_top(300) == [("b",6),("a",4),("c",2)]
+    assert await workers[1].cluster_top(60,n=1) == [("c",1)]
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried():
+    clock,redis = FakeClock(),FakeSortedSets()
+    hot = HotLinks(k=10,redis=redis,clock=clock)
+    hot.record("a")
+    redis.fail = True
+    with pytest.raises(ConnectionError):
+        await hot.flush()
+    assert await hot.cluster_top(300) is None
+
+    redis.fail = False
+    hot.record("a")
+    await hot.flush()
+    assert await hot.cluster_top(300) == [("a",2)]
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine,AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Integer
+from backend.models.database import Base,UrlMapping
+from backend.repository.url import UrlRepository
+from backend.services.id_allocator import IdBlockAllocator
+
+
+@pytest.fixture
+async def session_factory():
+    UrlMapping.__table__.c.id.type = Integer()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:",echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine,class_=AsyncSession,expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_first_block_starts_above_existing_ids(session_factory):
+    async with session_factory() as session:
+        await UrlRepository(session).create("https://example.com","abc",id=41)
+        await session.commit()
+
+    allocator = IdBlockAllocator(session_factory,block_size=10)
+
+    assert await allocator.allocate(3) == [42,43,44]
+    assert await allocator.allocate(1) == [45]
+
+@pytest.mark.asyncio
+async def test_allocators_lease_disjoint_blocks(session_factory):
+    first = IdBlockAllocator(session_factory,block_size=5)
+    second = IdBlockAllocator(session_factory,block_size=5)
+
+    ids = await first.allocate(7) + await second.allocate(7) + await first.allocate(4)
+
+    assert len(ids) == len(set(ids)) == 18
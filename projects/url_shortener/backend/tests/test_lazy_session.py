@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy import Integer
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend import database
+from backend.database import LazySession, instrument_engine
+from backend.metrics import RequestStats
+from backend.models.database import Base, UrlMapping
+from backend.repository.url import UrlRepository
+from backend.services.url import UrlShortenerService
+
+
+@pytest.fixture
+async def session_factory():
+    UrlMapping.__table__.c.id.type = Integer()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:",echo=False)
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine,class_=AsyncSession,expire_on_commit=False)
+    await engine.dispose()
+
+def track_request()->RequestStats:
+    # set in the test body, since fixtures run in a different context, and
+    # through database's import of the context variable, which is the one
+    # its engine hooks read
+    stats = RequestStats()
+    database.current_request.set(stats)
+    return stats
+
+@pytest.mark.asyncio
+async def test_unused_session_is_never_created():
+    factory = Mock()
+    async with LazySession(factory) as session:
+        await session.commit()
+        await session.rollback()
+
+    factory.assert_not_called()
+    assert not session.started
+
+@pytest.mark.asyncio
+async def test_one_checkout_per_transaction(session_factory):
+    request_stats = track_request()
+    async with LazySession(session_factory) as session:
+        repo = UrlRepository(session)
+        await repo.create("https://example.com",short_code="abc")
+        await session.commit()
+        assert (await repo.get_by_short_code("abc")).long_url == "https://example.com"
+
+    # the insert's transaction and the read after commit check out one each
+    assert request_stats.pool_checkouts == 2
+    assert request_stats.db_queries == 2
+
+@pytest.mark.asyncio
+async def test_cache_hit_does_no_db_work(session_factory):
+    request_stats = track_request()
+    cache = AsyncMock()
+    cache.get_url.return_value = "https://example.com"
+    async with LazySession(session_factory) as session:
+        service = UrlShortenerService(UrlRepository(session),AsyncMock(),cache)
+        long_url,_ = await service.resolve_redirect("abc")
+
+    assert long_url == "https://example.com"
+    assert not session.started
+    assert request_stats.pool_checkouts == 0
+    assert request_stats.db_queries == 0
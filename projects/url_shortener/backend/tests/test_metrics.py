@@ -0,0 +1,50 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from backend.api import middleware
+from backend.metrics import Counter, Gauge, Histogram, render_metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds","test",("op",),buckets=(0.1,1.0))
+    histogram.observe(0.05,op="get")
+    histogram.observe(0.5,op="get")
+    histogram.observe(5,op="get")
+
+    output = render_metrics()
+    assert 'test_latency_seconds_bucket{op="get",le="0.1"} 1' in output
+    assert 'test_latency_seconds_bucket{op="get",le="1.0"} 2' in output
+    assert 'test_latency_seconds_bucket{op="get",le="+Inf"} 3' in output
+    assert 'test_latency_seconds_count{op="get"} 3' in output
+
+def test_counter_and_callback_gauge():
+    counter = Counter("test_events_total","test",("kind",))
+    counter.inc(kind="a")
+    counter.inc(2,kind="a")
+    gauge = Gauge("test_backlog","test",fn=lambda:7)
+
+    assert counter.value(kind="a") == 3
+    output = render_metrics()
+    assert 'test_events_total{kind="a"} 3' in output
+    assert "test_backlog 7" in output
+
+@pytest.mark.asyncio
+async def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(middleware.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id:str):
+        # stand-in for the engine hook
+        middleware.current_request.get().db_queries += 2
+        return {"id":item_id}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),base_url="http://test") as client:
+        await client.get("/items/a")
+        await client.get("/items/b")
+        await client.get("/missing")
+
+    assert middleware.REQUEST_LATENCY.count(method="GET",route="/items/{item_id}",status=200) == 2
+    assert middleware.REQUEST_LATENCY.count(method="GET",route="unmatched",status=404) >= 1
+    assert middleware.DB_QUERIES_PER_REQUEST.count(route="/items/{item_id}") == 2
+    assert middleware.current_request.get() is None
@@ -0,0 +1,26 @@
+from backend.utils.pool_budget import per_worker_pool_size
+
+
+def test_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setenv("DB_POOL_BUDGET","80")
+    monkeypatch.setenv("WEB_CONCURRENCY","3")
+
+    assert per_worker_pool_size("DB_POOL_SIZE","DB_POOL_BUDGET",20) == 26
+
+def test_every_worker_gets_a_connection(monkeypatch):
+    monkeypatch.setenv("DB_POOL_BUDGET","4")
+    monkeypatch.setenv("WEB_CONCURRENCY","16")
+
+    assert per_worker_pool_size("DB_POOL_SIZE","DB_POOL_BUDGET",20) == 1
+
+def test_explicit_size_wins_over_budget(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE","5")
+    monkeypatch.setenv("DB_POOL_BUDGET","80")
+
+    assert per_worker_pool_size("DB_POOL_SIZE","DB_POOL_BUDGET",20) == 5
+
+def test_default_without_settings(monkeypatch):
+    for name in ("REDIS_POOL_SIZE","REDIS_POOL_BUDGET","WEB_CONCURRENCY"):
+        monkeypatch.delenv(name,raising=False)
+
+    assert per_worker_pool_size("REDIS_POOL_SIZE","REDIS_POOL_BUDGET",None) is None
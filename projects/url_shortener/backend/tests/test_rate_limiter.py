@@ -0,0 +1,126 @@
+import httpx
+import pytest
+import re
+from unittest.mock import AsyncMock, Mock
+from fastapi import FastAPI
+from backend.api import rate_limit
+from backend.services.rate_limiter import RateLimiter, RateLimitRule, load_rules
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+RULE = RateLimitRule("shorten","POST",re.compile("/shorten"),100,60)
+
+def limiter_with(*results,**kwargs):
+    script = AsyncMock(side_effect=list(results))
+    redis = Mock()
+    redis.register_script.return_value = script
+    clock = FakeClock()
+    return RateLimiter(redis,[RULE],clock=clock,**kwargs),script,clock
+
+@pytest.mark.asyncio
+async def test_leased_tokens_are_spent_locally():
+    limiter,script,_ = limiter_with([5,0],[5,0])
+
+    for _ in range(6):
+        assert await limiter.check(RULE,"ip:1") == 0
+
+    assert script.await_count == 2
+    assert script.await_args.kwargs["args"] == [100,100 / 60,5]
+
+@pytest.mark.asyncio
+async def test_lease_expires():
+    limiter,script,clock = limiter_with([5,0],[5,0])
+
+    await limiter.check(RULE,"ip:1")
+    clock.now += 1.5
+    await limiter.check(RULE,"ip:1")
+
+    assert script.await_count == 2
+
+@pytest.mark.asyncio
+async def test_denial_is_cached_until_a_token_refills():
+    limiter,script,clock = limiter_with([0,1500],[1,0])
+
+    assert await limiter.check(RULE,"ip:1") == 1.5
+    clock.now += 1
+    assert await limiter.check(RULE,"ip:1") == 0.5
+    clock.now += 1
+    assert await limiter.check(RULE,"ip:1") == 0
+
+    assert script.await_count == 2
+
+@pytest.mark.asyncio
+async def test_redis_failure_lets_requests_through():
+    limiter,_,_ = limiter_with(ConnectionError("down"))
+
+    assert await limiter.check(RULE,"ip:1") == 0
+
+def test_only_known_api_keys_get_their_own_bucket():
+    limiter,_,_ = limiter_with(api_keys=frozenset({"secret"}))
+    scope = lambda key:{"headers":[(b"x-api-key",key)],"client":("10.0.0.1",1234)}
+
+    assert limiter.client(scope(b"made-up")) == "ip:10.0.0.1"
+    assert limiter.client(scope(b"secret")).startswith("key:")
+    assert b"secret" not in limiter.client(scope(b"secret")).encode()
+
+def test_rules_can_be_tuned_or_turned_off(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_SHORTEN","3/10")
+    monkeypatch.setenv("RATE_LIMIT_REDIRECT","off")
+
+    rules = {rule.name:rule for rule in load_rules()}
+
+    assert (rules["shorten"].capacity,rules["shorten"].period) == (3,10)
+    assert "redirect" not in rules
+
+@pytest.mark.asyncio
+async def test_middleware_answers_429_with_retry_after(monkeypatch):
+    limiter,_,_ = limiter_with([0,1200])
+    monkeypatch.setattr(rate_limit,"get_rate_limiter",lambda:limiter)
+    app = FastAPI()
+
+    @app.post("/shorten")
+    async def shorten():
+        return {"ok":True}
+
+    @app.get("/")
+    async def health():
+        return {"ok":True}
+
+    transport = httpx.ASGITransport(app=rate_limit.RateLimitMiddleware(app))
+    async with httpx.AsyncClient(transport=transport,base_url="http://test") as client:
+        response = await client.post("/shorten",headers={"Origin":"https://app.example"})
+        unlimited = await client.get("/")
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+    assert response.headers["access-control-allow-origin"] == "https://app.example"
+    assert unlimited.status_code == 200
+
+@pytest.mark.asyncio
+async def test_bulk_stream_shares_the_bulk_bucket(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_SHORTEN_BULK",raising=False)
+    script = AsyncMock(side_effect=[[1,0]] * 5 + [[0,12000]])
+    redis = Mock()
+    redis.register_script.return_value = script
+    monkeypatch.setattr(rate_limit,"get_rate_limiter",lambda:RateLimiter(redis,load_rules(),clock=FakeClock()))
+    app = FastAPI()
+
+    @app.post("/shorten/bulk")
+    async def bulk():
+        return {"ok":True}
+
+    @app.post("/shorten/bulk/stream")
+    async def stream():
+        return {"ok":True}
+
+    transport = httpx.ASGITransport(app=rate_limit.RateLimitMiddleware(app))
+    async with httpx.AsyncClient(transport=transport,base_url="http://test") as client:
+        statuses = [(await client.post(path)).status_code for path in ["/shorten/bulk"] * 3 + ["/shorten/bulk/stream"] * 3]
+
+    assert statuses == [200] * 5 + [429]
+    assert {call.kwargs["keys"][0] for call in script.await_args_list} == {"ratelimit:shorten_bulk:ip:127.0.0.1"}
@@ -0,0 +1,24 @@
+from backend.utils.redirect_policy import (
+    DEFAULT_POLICY,
+    IMMUTABLE_MAX_AGE,
+    PERMANENT_MAX_AGE,
+    RedirectPolicy,
+    decode_entry,
+    encode_entry
+)
+
+def test_default_policy_is_cached_as_bare_url():
+    assert encode_entry("https://example.com") == "https://example.com"
+    assert decode_entry("https://example.com") == ("https://example.com",DEFAULT_POLICY)
+
+def test_entry_round_trip():
+    for policy in [RedirectPolicy(301),RedirectPolicy(308,3600),RedirectPolicy(302,60,True)]:
+        entry = encode_entry("https://example.com/a;b?c=1",policy)
+        assert entry.startswith("@")
+        assert decode_entry(entry) == ("https://example.com/a;b?c=1",policy)
+
+def test_headers():
+    assert DEFAULT_POLICY.headers() == {"Cache-Control":"no-store"}
+    assert RedirectPolicy(302,600).headers() == {"Cache-Control":"public, max-age=600"}
+    assert RedirectPolicy(301).headers()["Cache-Control"] == f"public, max-age={PERMANENT_MAX_AGE}"
+    assert RedirectPolicy(308,immutable=True).headers()["Cache-Control"] == f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import Mock
+from sqlalchemy.ext.asyncio import create_async_engine
+from backend.database import ReplicaRouter
+
+
+def fake_engine(checked_out:int=0):
+    engine = Mock()
+    engine.pool.checkedout.return_value = checked_out
+    return engine
+
+def test_round_robin_over_healthy_replicas():
+    primary,a,b,c = fake_engine(),fake_engine(),fake_engine(),fake_engine()
+    router = ReplicaRouter(primary,[a,b,c])
+    router.healthy = [a,c]
+
+    assert [router.pick() for _ in range(4)] == [a,c,a,c]
+
+def test_least_connections_picks_idlest_replica():
+    busy,idle = fake_engine(checked_out=5),fake_engine(checked_out=1)
+    router = ReplicaRouter(fake_engine(),[busy,idle],strategy="least_connections")
+
+    assert router.pick() is idle
+
+def test_falls_back_to_primary_without_healthy_replicas():
+    primary = fake_engine()
+    router = ReplicaRouter(primary,[fake_engine()])
+    router.healthy = []
+
+    assert router.pick() is primary
+
+@pytest.mark.asyncio
+async def test_health_check_drops_unreachable_replica(tmp_path):
+    good = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    bad = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    router = ReplicaRouter(fake_engine(),[good,bad])
+
+    await router.check()
+
+    assert router.healthy == [good]
+    await good.dispose()
+    await bad.dispose()
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from backend.database import create_schema
+from backend.models.database import Base
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# what each worker does on startup, minus serving
+LIFESPAN = """
+import asyncio
+import main
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(run())
+"""
+
+async def test_concurrent_create_schema_on_one_database(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path}/schema.db"
+    engines = [create_async_engine(url),create_async_engine(url)]
+    try:
+        await asyncio.gather(*(create_schema(engine) for engine in engines))
+
+        async with engines[0].connect() as conn:
+            tables = await conn.run_sync(lambda sync_conn:inspect(sync_conn).get_table_names())
+        assert set(Base.metadata.tables) <= set(tables)
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+def test_two_workers_start_against_a_fresh_database(tmp_path):
+    env = {
+        **os.environ,
+        "DATABASE_URL":f"sqlite+aiosqlite:///{tmp_path}/workers.db",
+        # nothing listens here; the app runs degraded without Redis
+        "REDIS_URL":"redis://127.0.0.1:1",
+    }
+    workers = [
+        subprocess.Popen([sys.executable,"-c",LIFESPAN],cwd=BACKEND,env=env,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        for _ in range(2)
+    ]
+    outputs = [worker.communicate(timeout=60)[0].decode() for worker in workers]
+
+    assert [worker.returncode for worker in workers] == [0,0],"\n".join(outputs)
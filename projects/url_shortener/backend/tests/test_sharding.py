@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine,AsyncSession
+from sqlalchemy.orm import sessionmaker
+from backend.models.database import Base,ShardSlot,UrlDigest,UrlMapping
+from backend.repository.sharded import ShardedStatsRepository,ShardedUrlRepository
+from backend.services.url import UrlShortenerService
+from backend.sharding import SLOT_COUNT,ShardRouter,ShardSessions,slot_for
+from backend.tools.rebalance_shards import balance_plan,copy_slots,drain_slots,set_slots
+from backend.utils.redirect_policy import RedirectPolicy,policy_of
+from backend.utils.url_digest import url_digest
+
+
+@pytest.fixture
+async def router(tmp_path):
+    directory = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/directory.db")
+    async with directory.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/shard{i}.db") for i in range(2)]
+    router = ShardRouter(engines,sessionmaker(directory,class_=AsyncSession,expire_on_commit=False))
+    await router.start()
+    yield router
+    await router.stop()
+    await directory.dispose()
+
+def service_for(shards:ShardSessions,ids)->UrlShortenerService:
+    allocator = AsyncMock()
+    allocator.allocate.side_effect = lambda n=1:[next(ids) for _ in range(n)]
+    cache = AsyncMock()
+    cache.get_many.return_value = {}
+    return UrlShortenerService(
+        ShardedUrlRepository(shards),
+        ShardedStatsRepository(shards),
+        cache,
+        id_allocator=allocator
+    )
+
+async def codes_on(router:ShardRouter,shard:int)->set[str]:
+    async with router.session_factories[shard]() as session:
+        return set((await session.execute(select(UrlMapping.short_code))).scalars())
+
+@pytest.mark.asyncio
+async def test_fresh_slots_are_spread_over_shards(router):
+    assert router.owners[:4] == [0,1,0,1]
+    assert router.shard_for("abc") == slot_for("abc") % 2
+
+@pytest.mark.asyncio
+async def test_concurrent_seed_fills_slots_once(router,tmp_path):
+    # two processes starting on a fresh directory, each with its own engine
+    directories = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/fresh.db") for _ in range(2)]
+    async with directories[0].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    routers = [
+        ShardRouter(router.engines,sessionmaker(directory,class_=AsyncSession,expire_on_commit=False))
+        for directory in directories
+    ]
+    try:
+        await asyncio.gather(*(r.seed() for r in routers))
+
+        async with routers[0].directory_factory() as session:
+            slots = (await session.execute(select(ShardSlot.slot))).scalars().all()
+        assert sorted(slots) == list(range(SLOT_COUNT))
+    finally:
+        for directory in directories:
+            await directory.dispose()
+
+@pytest.mark.asyncio
+async def test_shorten_writes_to_owning_shard_and_dedups(router):
+    ids = itertools.count(1000)
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        service = service_for(shards,ids)
+        created = await service.shorten_many([f"https://example.com/{i}" for i in range(20)])
+        code = await service.shorten_url("https://example.com/single")
+        assert await service.shorten_url("https://example.com/single") == code
+        assert await service.resolve_many(list(created.values())) == {v:k for k,v in created.items()}
+
+    codes = set(created.values()) | {code}
+    for shard in range(2):
+        on_shard = await codes_on(router,shard)
+        assert on_shard == {c for c in codes if router.shard_for(c) == shard}
+
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        again = await service_for(shards,ids).shorten_many(list(created))
+    assert again == created
+
+@pytest.mark.asyncio
+async def test_lost_digest_claim_removes_shard_rows(router):
+    async with router.directory_factory() as session:
+        session.add(UrlDigest(long_url_hash=url_digest("https://taken.com"),short_code="winner"))
+        await session.commit()
+
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        url_repo = ShardedUrlRepository(shards)
+        await url_repo.create("https://taken.com","loser",id=1)
+        await ShardedStatsRepository(shards).create("loser")
+        with pytest.raises(IntegrityError):
+            await url_repo.commit()
+
+    assert "loser" not in await codes_on(router,router.shard_for("loser"))
+
+@pytest.mark.asyncio
+async def test_move_slots_keeps_mappings_and_clicks(router):
+    ids = itertools.count(5000)
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        created = await service_for(shards,ids).shorten_many([f"https://move.com/{i}" for i in range(30)])
+    on_zero = [code for code in created.values() if router.shard_for(code) == 0]
+    slots = {slot_for(code) for code in on_zero}
+    code = on_zero[0]
+
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        await ShardedStatsRepository(shards).increment_click(code,n=3)
+    snapshot = await copy_slots(router,0,1,slots,batch_size=7)
+    # clicks that land on the old shard between copy and flip
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        await ShardedStatsRepository(shards).increment_click(code,n=2)
+    await set_slots(router,list(slots),shard=1,moved_from=0)
+    assert router.read_shards(code) == [1,0]
+
+    await drain_slots(router,0,1,slots,snapshot,batch_size=7)
+    await set_slots(router,list(slots),moved_from=None)
+
+    assert await codes_on(router,0) == set()
+    assert set(on_zero) <= await codes_on(router,1)
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        _,stats = await ShardedStatsRepository(shards).get_with_mapping(code)
+        assert stats.click_count == 5
+
+@pytest.mark.asyncio
+async def test_move_slots_keeps_redirect_policy(router):
+    ids = itertools.count(7000)
+    policy = RedirectPolicy(308,86400,True)
+    async with ShardSessions(router,router.directory_factory()) as shards:
+        service = service_for(shards,ids)
+        codes = [await service.shorten_url(f"https://policy.com/{i}",policy=policy) for i in range(10)]
+    on_zero = [code for code in codes if router.shard_for(code) == 0]
+    slots = {slot_for(code) for code in on_zero}
+
+    snapshot = await copy_slots(router,0,1,slots,batch_size=50)
+    await set_slots(router,list(slots),shard=1,moved_from=0)
+    await drain_slots(router,0,1,slots,snapshot,batch_size=50)
+    await set_slots(router,list(slots),moved_from=None)
+
+    async with router.session_factories[1]() as session:
+        moved = (await session.execute(select(UrlMapping).where(UrlMapping.short_code.in_(on_zero)))).scalars().all()
+    assert on_zero and len(moved) == len(on_zero)
+    assert {policy_of(mapping) for mapping in moved} == {policy}
+
+def test_balance_plan_moves_only_surplus_slots():
+    owners = [0] * SLOT_COUNT
+    plan = balance_plan(owners,4)
+
+    assert sorted(plan) == [1,2,3]
+    assert all(len(slots) == SLOT_COUNT // 4 for slots in plan.values())
+    moved = [slot for slots in plan.values() for slot in slots]
+    assert len(set(moved)) == len(moved)
@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend.models.database import Base
+from backend.repository.url import UrlRepository
+from backend.services.short_code_filter import ShortCodeFilter
+from backend.services.url import UrlShortenerService
+
+
+class FakeRedis:
+    """
+    The sorted set commands the filter uses, over a dict per key.
+    """
+    def __init__(self):
+        self.sets = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    async def zadd(self,key,mapping):
+        self._check()
+        self.sets.setdefault(key,{}).update(mapping)
+
+    async def zmscore(self,key,members):
+        self._check()
+        return [self.sets.get(key,{}).get(member) for member in members]
+
+    async def zremrangebyscore(self,key,low,high):
+        self._check()
+        self.sets[key] = {member:score for member,score in self.sets.get(key,{}).items() if score > high}
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/filter.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine,class_=AsyncSession,expire_on_commit=False)
+    await engine.dispose()
+
+async def worker(session_factory,redis)->ShortCodeFilter:
+    code_filter = ShortCodeFilter(session_factory,capacity=1000,redis=redis)
+    await code_filter.rebuild()
+    return code_filter
+
+def service_for(session,code_filter,cache=None)->UrlShortenerService:
+    allocator = AsyncMock()
+    allocator.allocate.return_value = [123]
+    if cache is None:
+        cache = AsyncMock()
+        cache.get_url.return_value = None
+        cache.get_many.return_value = {}
+    return UrlShortenerService(UrlRepository(session),AsyncMock(),cache,code_filter,id_allocator=allocator)
+
+@pytest.mark.asyncio
+async def test_code_from_one_worker_resolves_on_another(session_factory):
+    redis = FakeRedis()
+    first,second = await worker(session_factory,redis),await worker(session_factory,redis)
+    async with session_factory() as session:
+        code = await service_for(session,first).shorten_url("https://example.com/new")
+    assert not second.might_exist(code)
+
+    async with session_factory() as session:
+        service = service_for(session,second)
+        assert await service.resolve_short_code(code) == "https://example.com/new"
+        assert await service.resolve_many([code]) == {code:"https://example.com/new"}
+    assert second.might_exist(code)
+
+@pytest.mark.asyncio
+async def test_unpublished_code_is_rejected_without_lookups(session_factory):
+    code_filter = await worker(session_factory,FakeRedis())
+    cache = AsyncMock()
+    async with session_factory() as session:
+        with pytest.raises(HTTPException) as exc:
+            await service_for(session,code_filter,cache).resolve_short_code("unknown")
+    assert exc.value.status_code == 404
+    cache.get_url.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_redis_failure_lets_codes_through(session_factory):
+    redis = FakeRedis()
+    code_filter = await worker(session_factory,redis)
+    redis.fail = True
+
+    assert await code_filter.may_exist(["unknown"]) == ["unknown"]
+
+@pytest.mark.asyncio
+async def test_stale_filter_lets_codes_through(session_factory):
+    now = [1000.0]
+    code_filter = ShortCodeFilter(session_factory,redis=FakeRedis(),clock=lambda:now[0])
+    await code_filter.rebuild()
+    assert await code_filter.may_exist(["unknown"]) == []
+
+    # syncs have failed for longer than published codes are kept
+    now[0] += code_filter.recent_seconds + 1
+    assert await code_filter.may_exist(["unknown"]) == ["unknown"]
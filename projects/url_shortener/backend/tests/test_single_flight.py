@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from backend.utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_load():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "https://example.com"
+
+    results = await asyncio.gather(*(flight.do("abc123",load) for _ in range(10)))
+
+    assert calls == 1
+    assert results == ["https://example.com"] * 10
+    assert not flight.in_flight("abc123")
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_waiters():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(
+        *(flight.do("abc123",load) for _ in range(3)),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result,RuntimeError) for result in results)
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_leader_cancelled():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow_load():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast_load():
+        return "https://example.com"
+
+    leader = asyncio.create_task(flight.do("abc123",slow_load))
+    await started.wait()
+    waiter = asyncio.create_task(flight.do("abc123",fast_load))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await waiter == "https://example.com"
@@ -0,0 +1,137 @@
+import pytest
+from datetime import datetime,timedelta
+from unittest.mock import AsyncMock,Mock,patch
+from backend.api.endpoints import get_stats
+from backend.services import unique_visitors as uv
+from backend.services.unique_visitors import UniqueVisitors
+from backend.utils.fingerprint import visitor_fingerprint
+
+
+class FakePipeline:
+    def __init__(self,redis):
+        self.redis = redis
+        self.ops = []
+
+    def pfadd(self,key,*values):
+        self.ops.append(("pfadd",key,values))
+
+    def expire(self,key,ttl):
+        self.ops.append(("expire",key,ttl))
+
+    async def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        for op,key,arg in self.ops:
+            if op == "pfadd":
+                self.redis.sets.setdefault(key,set()).update(arg)
+            else:
+                self.redis.ttls[key] = arg
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc_info):
+        pass
+
+
+class FakeRedis:
+    """
+    Exact sets stand in for HyperLogLogs; PFCOUNT of several keys is the
+    size of their union, as in Redis.
+    """
+    def __init__(self):
+        self.sets = {}
+        self.ttls = {}
+        self.fail = False
+
+    def pipeline(self,transaction=True):
+        return FakePipeline(self)
+
+    async def pfcount(self,*keys):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return len(set().union(*(self.sets.get(key,set()) for key in keys)))
+
+def at(day:datetime):
+    return patch.object(uv,"datetime",wraps=datetime,**{"utcnow.return_value":day})
+
+@pytest.mark.asyncio
+async def test_repeat_visitors_count_once():
+    redis = FakeRedis()
+    visitors = UniqueVisitors(redis)
+    for ip in ["1.1.1.1","2.2.2.2","1.1.1.1"]:
+        visitors.record("abc123",visitor_fingerprint(ip,"curl/8"))
+    visitors.record("other",visitor_fingerprint("1.1.1.1","curl/8"))
+
+    assert await visitors.count("abc123") == 0
+    assert await visitors.flush() == 2
+    assert await visitors.count("abc123") == 2
+    assert await visitors.count("other") == 1
+
+@pytest.mark.asyncio
+async def test_daily_sketches_merge_over_window():
+    redis = FakeRedis()
+    visitors = UniqueVisitors(redis,retention_days=30)
+    today = datetime(2024,3,10,12)
+    for offset,ips in [(0,["a","b"]),(3,["b","c"]),(10,["d"])]:
+        with at(today - timedelta(days=offset)):
+            for ip in ips:
+                visitors.record("abc123",visitor_fingerprint(ip,""))
+            await visitors.flush()
+
+    with at(today):
+        assert await visitors.count("abc123",days=1) == 2
+        assert await visitors.count("abc123",days=7) == 3
+        assert await visitors.count("abc123",days=30) == 4
+    assert await visitors.count("abc123") == 4
+    assert redis.ttls["hll:abc123:20240310"] == timedelta(days=30)
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_fingerprints():
+    redis = FakeRedis()
+    visitors = UniqueVisitors(redis)
+    visitors.record("abc123","fp1")
+    redis.fail = True
+    assert await visitors.flush() == 0
+
+    redis.fail = False
+    visitors.record("abc123","fp2")
+    await visitors.flush()
+    assert await visitors.count("abc123") == 2
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded_while_redis_is_down():
+    redis = FakeRedis()
+    redis.fail = True
+    visitors = UniqueVisitors(redis,max_pending=2,max_fingerprints=3)
+    dropped = uv.UNIQUE_VISITORS_DROPPED.value(reason="sketch_full"),uv.UNIQUE_VISITORS_DROPPED.value(reason="too_many_sketches")
+    for code in ["a","b","c"]:
+        for i in range(5):
+            visitors.record(code,f"fp{i}")
+    await visitors.flush()
+    visitors.record("a","fp9")
+
+    assert {code:len(fps) for (code,_),fps in visitors._pending.items()} == {"a":3,"b":3}
+    assert uv.UNIQUE_VISITORS_DROPPED.value(reason="sketch_full") - dropped[0] == 5
+    assert uv.UNIQUE_VISITORS_DROPPED.value(reason="too_many_sketches") - dropped[1] == 5
+
+@pytest.mark.asyncio
+async def test_stats_without_redis_leave_visitors_empty():
+    redis = FakeRedis()
+    redis.fail = True
+    service = AsyncMock()
+    service.get_stats.return_value = (
+        Mock(short_code="abc123",long_url="https://example.com",created_at=datetime(2024,1,1)),
+        Mock(click_count=7,last_clicked_at=None)
+    )
+
+    stats = await get_stats("abc123",visitor_days=7,service=service,visitors=UniqueVisitors(redis))
+
+    assert stats.clicks == 7
+    assert stats.unique_visitors is None and stats.recent_unique_visitors is None
+
+def test_fingerprint_is_keyed_and_stable():
+    assert visitor_fingerprint("1.1.1.1","ua") == visitor_fingerprint("1.1.1.1","ua")
+    assert visitor_fingerprint("1.1.1.1","ua") != visitor_fingerprint("1.1.1.2","ua")
+    assert visitor_fingerprint("1.1.1.1","ua",key=b"other") != visitor_fingerprint("1.1.1.1","ua")
+    assert "1.1.1.1" not in visitor_fingerprint("1.1.1.1","ua")
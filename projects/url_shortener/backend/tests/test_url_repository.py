@@ -1,10 +1,12 @@
 import pytest
+from datetime import datetime
 from sqlalchemy.ext.asyncio import create_async_engine,AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import Integer,select
-from backend.models.database import Base,UrlMapping,UrlStats
+from backend.models.database import Base,UrlMapping,UrlStats,UrlStatsShard
 from backend.repository.url import UrlRepository
 from backend.repository.stats import StatsRepository
+from backend.utils.redirect_policy import RedirectPolicy
 
 
 @pytest.fixture
@@ -120,3 +122,186 @@ async def test_get_with_mapping(db_session):
     url_mapping,url_stats = result
     assert url_mapping.long_url == long_url
     assert url_stats.click_count == 0
+
+@pytest.mark.asyncio
+async def test_increment_clicks_bulk(db_session):
+    stats_repo = StatsRepository(db_session)
+    await stats_repo.create("abc123")
+    await stats_repo.create("def456")
+    await db_session.commit()
+
+    clicked_at = datetime(2025,1,1,12,0,0)
+    await stats_repo.increment_clicks({
+        "abc123":(3,clicked_at),
+        "def456":(1,clicked_at)
+    })
+    await db_session.commit()
+
+    result = await db_session.execute(
+        select(UrlStats.short_code,UrlStats.click_count).order_by(UrlStats.short_code)
+    )
+    assert result.all() == [("abc123",3),("def456",1)]
+
+@pytest.mark.asyncio
+async def test_iter_short_codes(db_session):
+    repo = UrlRepository(db_session)
+    await repo.create("https://a.com","a")
+    await repo.create("https://b.com","b")
+    await db_session.commit()
+
+    codes = [code async for code,_ in repo.iter_short_codes()]
+
+    assert sorted(codes) == ["a","b"]
+    assert await repo.count() == 2
+
+@pytest.mark.asyncio
+async def test_bulk_create_and_lookup(db_session):
+    url_repo = UrlRepository(db_session)
+    stats_repo = StatsRepository(db_session)
+    await url_repo.create("https://existing.com","abc")
+    await db_session.commit()
+
+    await url_repo.create_many([(10,"https://a.com","x1"),(11,"https://b.com","x2")])
+    await stats_repo.create_many(["x1","x2"])
+    await db_session.commit()
+
+    found = await url_repo.get_many_by_long_url(["https://a.com","https://existing.com","https://none.com"])
+    assert found == {"https://a.com":"x1","https://existing.com":"abc"}
+
+@pytest.mark.asyncio
+async def test_get_by_long_url_uses_normalized_digest(db_session):
+    repo = UrlRepository(db_session)
+    await repo.create("https://Example.COM/Path","abc123")
+    await db_session.commit()
+
+    found = await repo.get_by_long_url("HTTPS://example.com/Path")
+    assert found is not None
+    assert found.short_code == "abc123"
+    assert await repo.get_by_long_url("https://example.com/path") is None
+
+@pytest.mark.asyncio
+async def test_get_many_by_short_code(db_session):
+    repo = UrlRepository(db_session)
+    await repo.create("https://a.com","a")
+    await repo.create("https://b.com","b")
+    await db_session.commit()
+
+    found = await repo.get_many_by_short_code(["a","b","missing"])
+
+    assert found == {"a":"https://a.com","b":"https://b.com"}
+
+@pytest.mark.asyncio
+async def test_redirect_policy_is_stored(db_session):
+    repo = UrlRepository(db_session)
+    await repo.create("https://a.com","a")
+    await repo.create("https://b.com","b",policy=RedirectPolicy(301,86400,True))
+    await db_session.commit()
+
+    assert await repo.get_many_redirects(["a","b","c"]) == {
+        "a":("https://a.com",RedirectPolicy()),
+        "b":("https://b.com",RedirectPolicy(301,86400,True))
+    }
+
+@pytest.mark.asyncio
+async def test_increment_click_by_delta(db_session):
+    stats_repo = StatsRepository(db_session)
+    await stats_repo.create("abc123")
+    await db_session.commit()
+
+    await stats_repo.increment_click("abc123",n=5)
+    await stats_repo.increment_click("abc123")
+
+    result = await db_session.execute(
+        select(UrlStats.click_count).where(UrlStats.short_code == "abc123")
+    )
+    assert result.scalar() == 6
+
+@pytest.mark.asyncio
+async def test_hot_codes_use_sharded_counters(db_session):
+    url_repo = UrlRepository(db_session)
+    stats_repo = StatsRepository(db_session,shard_count=4,hot_threshold=10)
+    await url_repo.create("https://example.com","abc123")
+    await stats_repo.create("abc123")
+    await db_session.commit()
+
+    clicked_at = datetime(2025,1,1,12,0,0)
+    await stats_repo.increment_clicks({"abc123":(3,clicked_at)})
+    for _ in range(5):
+        await stats_repo.increment_clicks({"abc123":(20,clicked_at)})
+    await db_session.commit()
+
+    shard_rows = await db_session.execute(select(UrlStatsShard.shard))
+    assert 1 <= len(shard_rows.all()) <= 4
+
+    _,url_stats = await stats_repo.get_with_mapping("abc123")
+    assert url_stats.click_count == 103
+    assert url_stats.last_clicked_at == clicked_at
+
+@pytest.mark.asyncio
+async def test_get_hottest_counts_shard_rows(db_session):
+    url_repo = UrlRepository(db_session)
+    stats_repo = StatsRepository(db_session,shard_count=4,hot_threshold=50)
+    for code in ["cold","warm","viral","never"]:
+        await url_repo.create(f"https://{code}.com",code)
+        await stats_repo.create(code)
+    await db_session.commit()
+
+    clicked_at = datetime(2025,1,1,12,0,0)
+    await stats_repo.increment_clicks({"cold":(1,clicked_at),"warm":(40,clicked_at)})
+    await stats_repo.increment_clicks({"viral":(60,clicked_at)})
+    await stats_repo.increment_clicks({"viral":(60,clicked_at)})
+    await db_session.commit()
+
+    assert await stats_repo.get_hottest(2) == [
+        ("viral","https://viral.com",120,(302,None,False)),
+        ("warm","https://warm.com",40,(302,None,False))
+    ]
+    assert [row[0] for row in await stats_repo.get_hottest(10)] == ["viral","warm","cold"]
+
+@pytest.mark.asyncio
+async def test_rollups_accumulate_per_bucket(db_session):
+    url_repo = UrlRepository(db_session)
+    stats_repo = StatsRepository(db_session)
+    await url_repo.create("https://example.com","abc123",id=1)
+    await stats_repo.create("abc123")
+    await db_session.commit()
+
+    await stats_repo.increment_rollups({
+        ("abc123",datetime(2026,10,17,9,15)):2,
+        ("abc123",datetime(2026,10,17,9,16)):1,
+        ("abc123",datetime(2026,10,17,10,0)):4,
+    })
+    await stats_repo.increment_rollups({("abc123",datetime(2026,10,17,9,15)):1})
+    await db_session.commit()
+
+    day = datetime(2026,10,17)
+    assert await stats_repo.get_series("abc123","minute",day,datetime(2026,10,18)) == {
+        datetime(2026,10,17,9,15):3,
+        datetime(2026,10,17,9,16):1,
+        datetime(2026,10,17,10,0):4,
+    }
+    assert await stats_repo.get_series("abc123","hour",day,datetime(2026,10,18)) == {
+        datetime(2026,10,17,9):4,
+        datetime(2026,10,17,10):4,
+    }
+    assert await stats_repo.get_series("abc123","day",day,datetime(2026,10,18)) == {day:8}
+
+@pytest.mark.asyncio
+async def test_export_page_walks_ids_with_clicks(db_session):
+    url_repo = UrlRepository(db_session)
+    stats_repo = StatsRepository(db_session,shard_count=4,hot_threshold=5)
+    for id,code in [(3,"c"),(1,"a"),(2,"b")]:
+        await url_repo.create(f"https://example.com/{code}",code,id=id)
+    await stats_repo.create("a")
+    await stats_repo.create("b")
+    await db_session.commit()
+    clicked = datetime(2026,10,17,9)
+    await stats_repo.increment_clicks({"a":(2,clicked),"b":(10,clicked)})
+    await db_session.commit()
+
+    first = await url_repo.export_page(0,limit=2)
+    second = await url_repo.export_page(first[-1][0],limit=2)
+
+    assert [(row[0],row[1],row[7]) for row in first] == [(1,"a",2),(2,"b",10)]
+    assert [(row[0],row[1],row[7],row[8]) for row in second] == [(3,"c",0,None)]
+    assert await url_repo.export_page(3) == []
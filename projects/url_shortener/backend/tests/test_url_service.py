@@ -1,7 +1,11 @@
+import asyncio
 import pytest
+from datetime import datetime
 from unittest.mock import Mock, AsyncMock
 from backend.services.url import UrlShortenerService
 from backend.models.model import UrlMapping
+from backend.services.cache import MISSING
+from backend.utils.redirect_policy import DEFAULT_POLICY,RedirectPolicy
 from fastapi import HTTPException
 
 @pytest.fixture
@@ -11,29 +15,33 @@ def mock_repos():
     cache = AsyncMock()
     return url_repo,stats_repo,cache
 
+def mapping_mock()->Mock:
+    return Mock(redirect_status=302,cache_max_age=None,immutable=False)
+
+@pytest.fixture
+def id_allocator():
+    allocator = AsyncMock()
+    allocator.allocate.return_value = [123]
+    return allocator
+
 @pytest.fixture
-def service(mock_repos):
+def service(mock_repos,id_allocator):
     url_repo, stats_repo,cache = mock_repos
-    return UrlShortenerService(url_repo,stats_repo,cache)
+    return UrlShortenerService(url_repo,stats_repo,cache,id_allocator=id_allocator)
 
 @pytest.mark.asyncio
 async def test_shorten_url_new(service,mock_repos):
     url_repo,stats_repo,cache =mock_repos
 
     # setup mocks
-    url_mapping:UrlMapping = Mock()
-    url_mapping.id =123
-    url_mapping.short_code = None
-
     url_repo.get_by_long_url.return_value=None
-    url_repo.create.return_value=url_mapping
 
     # execute
     short_code = await service.shorten_url("https://example.com")
 
     # veryfy
-    assert short_code is not None
-    url_repo.create.assert_called_once()
+    assert short_code == "1z"
+    url_repo.create.assert_called_once_with("https://example.com",short_code="1z",id=123,policy=DEFAULT_POLICY)
     stats_repo.create.assert_called_once()
     cache.set_url.assert_called_once()
 
@@ -49,6 +57,26 @@ async def test_shorten_url_existing(service,mock_repos):
     assert short_code == "abc123"
     url_repo.create.assert_not_called()
 
+@pytest.mark.asyncio
+async def test_shorten_url_existing_with_same_policy(service,mock_repos):
+    url_repo,_,_ = mock_repos
+    existing = Mock(short_code="abc123",redirect_status=308,cache_max_age=3600,immutable=False)
+    url_repo.get_by_long_url.return_value = existing
+
+    assert await service.shorten_url("https://example.com",policy=RedirectPolicy(308,3600)) == "abc123"
+    url_repo.create.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_shorten_url_existing_with_other_policy(service,mock_repos):
+    url_repo,_,_ = mock_repos
+    existing = Mock(short_code="abc123",redirect_status=302,cache_max_age=None,immutable=False)
+    url_repo.get_by_long_url.return_value = existing
+
+    with pytest.raises(HTTPException) as exc:
+        await service.shorten_url("https://example.com",policy=RedirectPolicy(301,86400,True))
+    assert exc.value.status_code == 409
+    url_repo.create.assert_not_called()
+
 
 @pytest.mark.asyncio
 async def test_custom_code_invalid_chars(service,mock_repos):
@@ -82,14 +110,14 @@ async def test_resolve_cache_miss(service,mock_repos):
     url_repo,_,cache = mock_repos
     cache.get_url.return_value = None
 
-    mapping = Mock()
+    mapping = mapping_mock()
     mapping.long_url="https://example.com"
     url_repo.get_by_short_code.return_value = mapping
 
     result = await service.resolve_short_code("abc123")
 
     assert result == "https://example.com"
-    cache.set_url.assert_called_once_with("abc123","https://example.com")
+    cache.set_url.assert_called_once_with("abc123","https://example.com",created_at=mapping.created_at)
 
 @pytest.mark.asyncio
 async def test_resolve_not_found(service,mock_repos):
@@ -101,3 +129,195 @@ async def test_resolve_not_found(service,mock_repos):
         await service.resolve_short_code("Not Found")
     assert exc.value.status_code == 404
 
+@pytest.mark.asyncio
+async def test_resolve_not_found_is_negative_cached(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = None
+    url_repo.get_by_short_code.return_value = None
+
+    with pytest.raises(HTTPException):
+        await service.resolve_short_code("missing")
+    cache.set_missing.assert_called_once_with("missing")
+
+@pytest.mark.asyncio
+async def test_resolve_negative_cache_hit(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = MISSING
+
+    with pytest.raises(HTTPException) as exc:
+        await service.resolve_short_code("missing")
+    assert exc.value.status_code == 404
+    url_repo.get_by_short_code.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_resolve_rejected_by_code_filter(mock_repos):
+    url_repo,stats_repo,cache = mock_repos
+    code_filter = Mock()
+    code_filter.may_exist = AsyncMock(return_value=[])
+    service = UrlShortenerService(url_repo,stats_repo,cache,code_filter)
+
+    with pytest.raises(HTTPException) as exc:
+        await service.resolve_short_code("unknown")
+    assert exc.value.status_code == 404
+    cache.get_url.assert_not_called()
+    url_repo.get_by_short_code.assert_not_called()
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = None
+
+    async def slow_lookup(short_code):
+        await asyncio.sleep(0.01)
+        mapping = mapping_mock()
+        mapping.long_url = "https://example.com"
+        return mapping
+    url_repo.get_by_short_code.side_effect = slow_lookup
+
+    results = await asyncio.gather(*(service.resolve_short_code("abc123") for _ in range(5)))
+
+    assert results == ["https://example.com"] * 5
+    url_repo.get_by_short_code.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_refresh_ahead_reloads_entry_near_expiry(mock_repos):
+    url_repo,stats_repo,cache = mock_repos
+    service = UrlShortenerService(url_repo,stats_repo,cache,refresh_beta=1.0)
+    cache.get_url_with_ttl.return_value = ("https://old.com",0.0)
+    mapping = mapping_mock()
+    mapping.long_url = "https://new.com"
+    url_repo.get_by_short_code.return_value = mapping
+
+    assert await service.resolve_short_code("abc123") == "https://new.com"
+    cache.set_url.assert_called_once_with("abc123","https://new.com",created_at=mapping.created_at)
+
+@pytest.mark.asyncio
+async def test_refresh_ahead_skipped_with_ttl_left(mock_repos):
+    url_repo,stats_repo,cache = mock_repos
+    service = UrlShortenerService(url_repo,stats_repo,cache,refresh_beta=1.0)
+    cache.get_url_with_ttl.return_value = ("https://cached.com",300.0)
+
+    assert await service.resolve_short_code("abc123") == "https://cached.com"
+    url_repo.get_by_short_code.assert_not_called()
+@pytest.mark.asyncio
+async def test_shorten_many_dedups_and_reuses_existing(service,mock_repos,id_allocator):
+    url_repo,stats_repo,cache = mock_repos
+    url_repo.get_many_by_long_url.return_value = {"https://old.com":"abc"}
+    id_allocator.allocate.return_value = [62,63]
+
+    result = await service.shorten_many([
+        "https://a.com","https://old.com","https://b.com","https://a.com"
+    ])
+
+    assert result == {"https://old.com":"abc","https://a.com":"10","https://b.com":"11"}
+    id_allocator.allocate.assert_called_once_with(2)
+    url_repo.create_many.assert_called_once_with([(62,"https://a.com","10"),(63,"https://b.com","11")])
+    stats_repo.create_many.assert_called_once_with(["10","11"])
+    cache.set_many.assert_called_once_with({"10":"https://a.com","11":"https://b.com"})
+
+@pytest.mark.asyncio
+async def test_shorten_many_all_existing_skips_writes(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    url_repo.get_many_by_long_url.return_value = {"https://old.com":"abc"}
+
+    assert await service.shorten_many(["https://old.com"]) == {"https://old.com":"abc"}
+    url_repo.create_many.assert_not_called()
+    cache.set_many.assert_not_called()
+@pytest.mark.asyncio
+async def test_resolve_many_fills_misses_with_one_query(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    cache.get_many.return_value = {"a":"https://a.com","gone":MISSING}
+    url_repo.get_many_redirects.return_value = {"b":("https://b.com",DEFAULT_POLICY)}
+
+    results = await service.resolve_many(["a","b","c","gone","a"])
+
+    assert results == {"a":"https://a.com","b":"https://b.com","c":None,"gone":None}
+    url_repo.get_many_redirects.assert_called_once_with(["b","c"])
+    cache.set_many.assert_called_once_with({"b":"https://b.com"})
+    cache.set_missing_many.assert_called_once_with(["c"])
+
+@pytest.fixture
+def replica_service(mock_repos,id_allocator):
+    url_repo,stats_repo,cache = mock_repos
+    read_url_repo = AsyncMock()
+    service = UrlShortenerService(
+        url_repo,stats_repo,cache,id_allocator=id_allocator,
+        read_url_repo=read_url_repo,read_stats_repo=AsyncMock()
+    )
+    return service,read_url_repo
+
+@pytest.mark.asyncio
+async def test_resolve_reads_from_replica(replica_service,mock_repos):
+    service,read_url_repo = replica_service
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = None
+    mapping = mapping_mock()
+    mapping.long_url = "https://replica.com"
+    read_url_repo.get_by_short_code.return_value = mapping
+
+    assert await service.resolve_short_code("rep1") == "https://replica.com"
+    url_repo.get_by_short_code.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_replica_miss_is_confirmed_on_primary(replica_service,mock_repos):
+    service,read_url_repo = replica_service
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = None
+    read_url_repo.get_by_short_code.return_value = None
+    mapping = mapping_mock()
+    mapping.long_url = "https://lagging.com"
+    url_repo.get_by_short_code.return_value = mapping
+
+    assert await service.resolve_short_code("rep2") == "https://lagging.com"
+    cache.set_missing.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_new_code_reads_from_primary(replica_service,mock_repos,id_allocator):
+    service,read_url_repo = replica_service
+    url_repo,_,cache = mock_repos
+    url_repo.get_by_long_url.return_value = None
+    id_allocator.allocate.return_value = [987654]
+    short_code = await service.shorten_url("https://fresh.com")
+
+    cache.get_url.return_value = None
+    mapping = mapping_mock()
+    mapping.long_url = "https://fresh.com"
+    url_repo.get_by_short_code.return_value = mapping
+
+    assert await service.resolve_short_code(short_code) == "https://fresh.com"
+    read_url_repo.get_by_short_code.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_click_series_fills_empty_buckets(service,mock_repos):
+    _,stats_repo,_ = mock_repos
+    stats_repo.get_series.return_value = {datetime(2026,10,17,10):5}
+
+    series = await service.get_click_series(
+        "abc123","hour",start=datetime(2026,10,17,9,30),end=datetime(2026,10,17,11,59)
+    )
+
+    assert series == [
+        (datetime(2026,10,17,9),0),
+        (datetime(2026,10,17,10),5),
+        (datetime(2026,10,17,11),0),
+    ]
+    stats_repo.get_series.assert_called_once_with(
+        "abc123","hour",datetime(2026,10,17,9),datetime(2026,10,17,12)
+    )
+
+@pytest.mark.asyncio
+async def test_click_series_rejects_too_many_buckets(service):
+    with pytest.raises(HTTPException) as exc:
+        await service.get_click_series("abc123","minute",start=datetime(2026,1,1),end=datetime(2026,2,1))
+    assert exc.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_resolve_redirect_decodes_policy(service,mock_repos):
+    url_repo,_,cache = mock_repos
+    cache.get_url.return_value = None
+    mapping = Mock(long_url="https://example.com",redirect_status=308,cache_max_age=3600,immutable=False)
+    url_repo.get_by_short_code.return_value = mapping
+
+    assert await service.resolve_redirect("abc123") == ("https://example.com",RedirectPolicy(308,3600))
+    entry = cache.set_url.call_args.args[1]
+    cache.get_url.return_value = entry
+    assert await service.resolve_short_code("abc123") == "https://example.com"
@@ -0,0 +1,58 @@
+"""
+Exports every mapping with its click stats, like GET /export but straight
+from the database, for inventories too large to pull over HTTP.
+
+    # gzipped CSV
+    python -m tools.export --gzip --output url_mappings.csv.gz
+
+    # NDJSON to stdout, resuming after the last id of an earlier run
+    python -m tools.export --format ndjson --after-id 1048576
+
+Uses DATABASE_URL and, when set, DATABASE_SHARD_URLS like the app. Rows are
+read in keyset pages on id and written as they arrive, so memory stays flat.
+"""
+import argparse
+import asyncio
+import sys
+
+from database import get_engine, get_session_local
+from repository.sharded import ShardedUrlRepository
+from repository.url import BATCH_SIZE, UrlRepository
+from services.export import ExportEncoder, encode_export, export_pages
+from sharding import close_shards, init_shards, shard_sessions_factory
+
+
+async def run(args):
+    router = await init_shards(get_session_local())
+    if router is not None:
+        session_factory,repository = shard_sessions_factory(router,get_session_local()),ShardedUrlRepository
+    else:
+        session_factory,repository = get_session_local(),UrlRepository
+    output = open(args.output,"wb") if args.output else sys.stdout.buffer
+    try:
+        async with session_factory() as session:
+            pages = export_pages(repository(session),args.after_id,args.batch_size)
+            async for chunk in encode_export(pages,ExportEncoder(args.format,args.gzip)):
+                output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        else:
+            output.flush()
+        await close_shards()
+        await get_engine().dispose()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format",choices=("csv","ndjson"),default="csv")
+    parser.add_argument("--gzip",action="store_true",help="gzip the output")
+    parser.add_argument("--after-id",type=int,default=0,help="export only mappings with a larger id")
+    parser.add_argument("--batch-size",type=int,default=BATCH_SIZE,help=f"rows per page, at most {BATCH_SIZE}")
+    parser.add_argument("--output",help="write here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Moves hash slots of short codes between shards while the app keeps serving.
+
+    # move slots 0-255 to shard 2
+    python -m tools.rebalance_shards --slots 0-255 --to 2
+
+    # even out slot ownership, e.g. after appending a shard to DATABASE_SHARD_URLS
+    python -m tools.rebalance_shards --balance
+
+    # show how many slots each shard owns
+    python -m tools.rebalance_shards --status
+
+Uses DATABASE_URL (the directory) and DATABASE_SHARD_URLS like the app.
+For each move:
+
+1. copy the slots' url_mappings and url_stats rows from their owner to the
+   target (click counts include url_stats_shards), remembering the counts;
+2. point the slots at the target in shard_slots with moved_from set, so
+   workers read the target first and fall back to the old shard;
+3. wait --grace seconds so every worker has reloaded the slot map;
+4. copy rows the old shard gained since step 1, add the clicks it counted
+   since the snapshot, move click_rollups and click_events (added into the
+   target's rows), delete the slots' rows there and clear moved_from.
+
+Clicks a worker records on the target for a code that only reached the old
+shard during the grace window are lost, so keep SHARD_MAP_REFRESH short.
+Do not interrupt a run between steps 2 and 4; a slot left with moved_from
+set is reported and must be finished with --resume.
+"""
+import argparse
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import build_engine, get_engine, get_session_local
+from models.database import Base, ClickRollup, ShardSlot, UrlMapping, UrlStats, UrlStatsShard, click_events
+from repository.stats import StatsRepository
+from sharding import SLOT_COUNT, ShardRouter, slot_for
+
+MAPPING_COLUMNS = tuple(column.name for column in UrlMapping.__table__.columns)
+
+
+def parse_slots(spec:str)->list[int]:
+    """
+    "0-3,8" -> [0, 1, 2, 3, 8]
+    """
+    slots = set()
+    for part in spec.split(","):
+        start,_,end = part.partition("-")
+        slots.update(range(int(start),int(end or start) + 1))
+    if not slots or min(slots) < 0 or max(slots) >= SLOT_COUNT:
+        raise ValueError(f"slots must be within 0-{SLOT_COUNT - 1}")
+    return sorted(slots)
+
+def balance_plan(owners:list[int],shard_count:int)->dict[int,list[int]]:
+    """
+    Fewest slot moves that leave every shard owning SLOT_COUNT / shard_count
+    slots (give or take one). Returns target shard -> slots to move there.
+    """
+    quota = [SLOT_COUNT // shard_count + (1 if shard < SLOT_COUNT % shard_count else 0) for shard in range(shard_count)]
+    owned:dict[int,list[int]] = {shard:[] for shard in range(shard_count)}
+    for slot,shard in enumerate(owners):
+        owned[shard].append(slot)
+    surplus = [slot for shard,slots in owned.items() for slot in slots[quota[shard]:]]
+    plan = {}
+    for shard,slots in owned.items():
+        need = quota[shard] - len(slots)
+        if need > 0:
+            plan[shard],surplus = surplus[:need],surplus[need:]
+    return plan
+
+
+async def scan(session:AsyncSession,slots:set[int],batch_size:int)->AsyncIterator[list[dict]]:
+    """
+    Yields batches of url_mappings rows in the given slots with their total
+    click counts, walking the table in id order.
+    """
+    last_id = None
+    while True:
+        stmt = select(*(getattr(UrlMapping,name) for name in MAPPING_COLUMNS)).order_by(UrlMapping.id).limit(batch_size)
+        if last_id is not None:
+            stmt = stmt.where(UrlMapping.id > last_id)
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        batch = [dict(row._mapping) for row in rows if slot_for(row.short_code) in slots]
+        if not batch:
+            continue
+        codes = [row["short_code"] for row in batch]
+        totals = {code:[0,None] for code in codes}
+        stats = await session.execute(
+            select(UrlStats.short_code,UrlStats.click_count,UrlStats.last_clicked_at).where(UrlStats.short_code.in_(codes))
+        )
+        shards = await session.execute(
+            select(
+                UrlStatsShard.short_code,
+                func.sum(UrlStatsShard.click_count),
+                func.max(UrlStatsShard.last_clicked_at)
+            ).where(UrlStatsShard.short_code.in_(codes)).group_by(UrlStatsShard.short_code)
+        )
+        for code,clicks,clicked_at in [*stats,*shards]:
+            total = totals[code]
+            total[0] += clicks or 0
+            if clicked_at is not None and (total[1] is None or clicked_at > total[1]):
+                total[1] = clicked_at
+        for row in batch:
+            row["click_count"],row["last_clicked_at"] = totals[row["short_code"]]
+        yield batch
+
+def _insert(session:AsyncSession,table):
+    dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+def _insert_ignore(session:AsyncSession,table):
+    return _insert(session,table).on_conflict_do_nothing()
+
+async def copy_rows(target:AsyncSession,rows:list[dict]):
+    await target.execute(_insert_ignore(target,UrlMapping.__table__),[
+        {name:row[name] for name in MAPPING_COLUMNS} for row in rows
+    ])
+    await target.execute(_insert_ignore(target,UrlStats.__table__),[
+        {
+            "short_code":row["short_code"],
+            "click_count":row["click_count"],
+            "last_clicked_at":row["last_clicked_at"]
+        }
+        for row in rows
+    ])
+
+async def move_analytics(source:AsyncSession,target:AsyncSession,codes:list[str]):
+    """
+    Adds the source's rollups and raw events for codes into the target. The
+    target only holds what was counted there after the flip, so sums are exact.
+    """
+    rollups = (await source.execute(select(ClickRollup.__table__).where(ClickRollup.short_code.in_(codes)))).all()
+    if rollups:
+        stmt = _insert(target,ClickRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["short_code","granularity","bucket_start"],
+            set_={"click_count":ClickRollup.__table__.c.click_count + stmt.excluded.click_count}
+        )
+        await target.execute(stmt,[dict(row._mapping) for row in rollups])
+    events = (await source.execute(select(click_events).where(click_events.c.short_code.in_(codes)))).all()
+    if events:
+        await StatsRepository(target).append_click_events([tuple(row) for row in events])
+
+async def delete_rows(source:AsyncSession,codes:list[str]):
+    await source.execute(delete(click_events).where(click_events.c.short_code.in_(codes)))
+    for model in (ClickRollup,UrlStatsShard,UrlStats,UrlMapping):
+        await source.execute(delete(model).where(model.short_code.in_(codes)))
+
+
+async def copy_slots(router:ShardRouter,source:int,target:int,slots:set[int],batch_size:int)->dict[str,int]:
+    snapshot = {}
+    async with router.session_factories[source]() as src, router.session_factories[target]() as dst:
+        async for rows in scan(src,slots,batch_size):
+            await copy_rows(dst,rows)
+            await dst.commit()
+            snapshot.update({row["short_code"]:row["click_count"] for row in rows})
+    return snapshot
+
+async def drain_slots(router:ShardRouter,source:int,target:int,slots:set[int],snapshot:dict[str,int],batch_size:int)->int:
+    moved = 0
+    async with router.session_factories[source]() as src, router.session_factories[target]() as dst:
+        async for rows in scan(src,slots,batch_size):
+            late = [row for row in rows if row["short_code"] not in snapshot]
+            if late:
+                await copy_rows(dst,late)
+            deltas = {
+                row["short_code"]:(row["click_count"] - snapshot[row["short_code"]],row["last_clicked_at"] or datetime.utcnow())
+                for row in rows
+                if row["short_code"] in snapshot and row["click_count"] > snapshot[row["short_code"]]
+            }
+            if deltas:
+                await StatsRepository(dst).increment_clicks(deltas)
+            await move_analytics(src,dst,[row["short_code"] for row in rows])
+            await dst.commit()
+            await delete_rows(src,[row["short_code"] for row in rows])
+            await src.commit()
+            moved += len(rows)
+    return moved
+
+async def set_slots(router:ShardRouter,slots:list[int],**values):
+    async with router.directory_factory() as session:
+        await session.execute(update(ShardSlot).where(ShardSlot.slot.in_(slots)).values(**values))
+        await session.commit()
+    await router.load()
+
+async def move(router:ShardRouter,slots:list[int],target:int,grace:float,batch_size:int):
+    by_source:dict[int,set[int]] = {}
+    for slot in slots:
+        if router.owners[slot] != target:
+            by_source.setdefault(router.owners[slot],set()).add(slot)
+    for source,source_slots in sorted(by_source.items()):
+        print(f"shard {source} -> {target}: copying {len(source_slots)} slots")
+        snapshot = await copy_slots(router,source,target,source_slots,batch_size)
+        await set_slots(router,list(source_slots),shard=target,moved_from=source)
+        print(f"shard {source} -> {target}: flipped, waiting {grace}s for workers to reload")
+        await asyncio.sleep(grace)
+        moved = await drain_slots(router,source,target,source_slots,snapshot,batch_size)
+        await set_slots(router,list(source_slots),moved_from=None)
+        print(f"shard {source} -> {target}: moved {moved} mappings")
+
+async def resume(router:ShardRouter,batch_size:int):
+    """
+    Finishes slots left with moved_from set. Click deltas cannot be
+    reconstructed without the snapshot, so the old shard's rows are copied
+    only if missing on the target and its late clicks are dropped.
+    """
+    pending:dict[tuple[int,int],set[int]] = {}
+    for slot,previous in router.moved_from.items():
+        pending.setdefault((previous,router.owners[slot]),set()).add(slot)
+    for (source,target),slots in pending.items():
+        snapshot = {}
+        async with router.session_factories[source]() as src:
+            async for rows in scan(src,slots,batch_size):
+                snapshot.update({row["short_code"]:row["click_count"] for row in rows})
+        moved = await drain_slots(router,source,target,slots,snapshot,batch_size)
+        await set_slots(router,list(slots),moved_from=None)
+        print(f"shard {source} -> {target}: resumed, moved {moved} mappings")
+
+def status(router:ShardRouter):
+    counts = Counter(router.owners)
+    for shard in range(len(router.engines)):
+        print(f"shard {shard}: {counts.get(shard,0)} slots")
+    if router.moved_from:
+        print(f"{len(router.moved_from)} slots still draining; run with --resume")
+
+
+async def run(args):
+    urls = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS","").split(",") if url.strip()]
+    if not urls:
+        raise SystemExit("DATABASE_SHARD_URLS is not set")
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    router = ShardRouter([build_engine(url) for url in urls],get_session_local())
+    try:
+        for engine in router.engines:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        await router.seed()
+        await router.load()
+
+        if args.status:
+            status(router)
+            return
+        if args.resume:
+            await resume(router,args.batch_size)
+            return
+        if router.moved_from:
+            raise SystemExit(f"{len(router.moved_from)} slots are mid-move; run with --resume first")
+        if args.balance:
+            for target,slots in balance_plan(router.owners,len(router.engines)).items():
+                await move(router,slots,target,args.grace,args.batch_size)
+        else:
+            if args.to is None or args.slots is None:
+                raise SystemExit("--slots and --to are required without --balance")
+            if not 0 <= args.to < len(router.engines):
+                raise SystemExit(f"--to must be a shard between 0 and {len(router.engines) - 1}")
+            await move(router,parse_slots(args.slots),args.to,args.grace,args.batch_size)
+        status(router)
+    finally:
+        await router.stop()
+        await get_engine().dispose()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--slots",help="slots to move, e.g. 0-255,300")
+    action.add_argument("--balance",action="store_true",help="spread slots evenly over all shards")
+    action.add_argument("--resume",action="store_true",help="finish slots left mid-move")
+    action.add_argument("--status",action="store_true",help="print slot ownership and exit")
+    parser.add_argument("--to",type=int,help="target shard index for --slots")
+    parser.add_argument("--grace",type=float,default=float(os.getenv("SHARD_MAP_REFRESH","5")) * 3,
+                        help="seconds to wait after flipping slots (default 3x SHARD_MAP_REFRESH)")
+    parser.add_argument("--batch-size",type=int,default=1000)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
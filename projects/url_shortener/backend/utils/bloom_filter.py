@@ -0,0 +1,36 @@
+import hashlib
+import math
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Answers "definitely not present" or "possibly present". Positions are
+    derived from a single blake2b digest with double hashing, so each lookup
+    costs one hash regardless of the number of probes.
+
+    Args:
+        capacity (int): Expected number of items.
+        error_rate (float): Target false-positive rate at capacity.
+    """
+    def __init__(self,capacity:int,error_rate:float=0.01):
+        capacity = max(capacity,1)
+        self.size = max(8,math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1,round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self,item:str):
+        digest = hashlib.blake2b(item.encode(),digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8],"little")
+        h2 = int.from_bytes(digest[8:],"little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self,item:str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self,item:str)->bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
@@ -0,0 +1,20 @@
+import hashlib
+import os
+
+# keyed so fingerprints cannot be reversed by hashing candidate IPs; share it across workers
+FINGERPRINT_KEY = os.getenv("VISITOR_FINGERPRINT_KEY","url-shortener").encode()
+
+def visitor_fingerprint(client_ip:str,user_agent:str,key:bytes=FINGERPRINT_KEY)->str:
+    """
+    Hashes a client's IP and User-Agent into an opaque visitor id.
+
+    Args:
+        client_ip (str): The client address as seen by the app.
+        user_agent (str): The User-Agent header, or "".
+        key (bytes): Secret mixed into the hash.
+
+    Returns:
+        str: 32 hex characters; the raw IP is never stored.
+    """
+    digest = hashlib.blake2b(f"{client_ip}\n{user_agent}".encode(),digest_size=16,key=key[:64])
+    return digest.hexdigest()
@@ -0,0 +1,91 @@
+import hashlib
+import heapq
+import math
+from array import array
+
+class CountMinSketch:
+    """
+    Count-Min sketch over strings.
+
+    Estimates never undercount; with width = e/epsilon and
+    depth = ln(1/delta) they overcount by more than epsilon * total with
+    probability at most delta. Row positions come from one blake2b digest
+    with double hashing, as in BloomFilter.
+
+    Args:
+        width (int): Counters per row.
+        depth (int): Number of rows.
+    """
+    def __init__(self,width:int=2048,depth:int=4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array("q",bytes(8 * width)) for _ in range(depth)]
+
+    @classmethod
+    def for_error(cls,epsilon:float,delta:float)->"CountMinSketch":
+        return cls(math.ceil(math.e / epsilon),math.ceil(math.log(1 / delta)))
+
+    def _positions(self,item:str):
+        digest = hashlib.blake2b(item.encode(),digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8],"little")
+        h2 = int.from_bytes(digest[8:],"little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self,item:str,n:int=1)->int:
+        """
+        Counts item n times and returns its new estimate.
+        """
+        self.total += n
+        estimate = None
+        for row,pos in zip(self._rows,self._positions(item)):
+            row[pos] += n
+            estimate = row[pos] if estimate is None else min(estimate,row[pos])
+        return estimate
+
+    def estimate(self,item:str)->int:
+        return min(row[pos] for row,pos in zip(self._rows,self._positions(item)))
+
+
+class HeavyHitters:
+    """
+    The k most frequent items of a stream in bounded memory: a Count-Min
+    sketch counts everything and a min-heap keeps the k items with the
+    highest estimates.
+
+    The heap is updated lazily - raising an item's count pushes a new entry
+    and stale ones are skipped when they surface - so add() is O(depth + log k).
+    """
+    def __init__(self,k:int=100,width:int=2048,depth:int=4):
+        self.k = k
+        self.sketch = CountMinSketch(width,depth)
+        self.top:dict[str,int] = {}
+        self._heap:list[tuple[int,str]] = []
+
+    def add(self,item:str,n:int=1):
+        estimate = self.sketch.add(item,n)
+        if item in self.top:
+            self.top[item] = estimate
+            heapq.heappush(self._heap,(estimate,item))
+            if len(self._heap) > 4 * self.k:
+                self._heap = [(count,key) for key,count in self.top.items()]
+                heapq.heapify(self._heap)
+            return
+        if len(self.top) < self.k:
+            self.top[item] = estimate
+            heapq.heappush(self._heap,(estimate,item))
+            return
+        # drop entries whose item was evicted or has been counted up since
+        while self._heap[0][1] not in self.top or self.top[self._heap[0][1]] != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if estimate > self._heap[0][0]:
+            _,evicted = heapq.heapreplace(self._heap,(estimate,item))
+            del self.top[evicted]
+            self.top[item] = estimate
+
+    def estimate(self,item:str)->int:
+        return self.sketch.estimate(item)
+
+    def most_common(self,n:int|None=None)->list[tuple[str,int]]:
+        ranked = sorted(self.top.items(),key=lambda entry:entry[1],reverse=True)
+        return ranked if n is None else ranked[:n]
@@ -0,0 +1,24 @@
+import os
+from typing import Optional
+
+def worker_count()->int:
+    """
+    Worker processes serving the app; serve.py exports WEB_CONCURRENCY to them.
+    """
+    return max(1,int(os.getenv("WEB_CONCURRENCY") or 1))
+
+def per_worker_pool_size(size_env:str,budget_env:str,default:Optional[int])->Optional[int]:
+    """
+    The connection pool size for one worker process.
+
+    size_env pins it outright. Otherwise budget_env is the total number of
+    connections all workers together may open to one server, split evenly
+    between them (at least one each). With neither set, default.
+    """
+    size = os.getenv(size_env)
+    if size:
+        return int(size)
+    budget = os.getenv(budget_env)
+    if budget:
+        return max(1,int(budget) // worker_count())
+    return default
@@ -0,0 +1,60 @@
+import os
+from typing import NamedTuple, Optional
+
+PERMANENT_STATUSES = (301,308)
+# what browsers may keep a permanent redirect for when the mapping sets no max_age
+PERMANENT_MAX_AGE = int(os.getenv("REDIRECT_PERMANENT_MAX_AGE","86400"))
+IMMUTABLE_MAX_AGE = 31_536_000
+
+class RedirectPolicy(NamedTuple):
+    """
+    How a short code's redirect may be cached by browsers and CDNs.
+
+    Attributes:
+        status (int): 301, 302, 307 or 308.
+        max_age (int | None): Seconds the redirect may be cached. None keeps
+            temporary redirects uncached, so every click reaches the app.
+        immutable (bool): The target will never change; cached for a year
+            unless max_age says otherwise.
+    """
+    status:int = 302
+    max_age:Optional[int] = None
+    immutable:bool = False
+
+    @property
+    def cacheable(self)->bool:
+        return self.immutable or bool(self.max_age) or self.status in PERMANENT_STATUSES
+
+    def headers(self)->dict[str,str]:
+        if not self.cacheable:
+            return {"Cache-Control":"no-store"}
+        max_age = self.max_age or (IMMUTABLE_MAX_AGE if self.immutable else PERMANENT_MAX_AGE)
+        # no Vary of our own: the target depends only on the path, and the CORS
+        # middleware already adds Vary: Origin for the headers it echoes
+        return {"Cache-Control":f"public, max-age={max_age}" + (", immutable" if self.immutable else "")}
+
+
+DEFAULT_POLICY = RedirectPolicy()
+
+def policy_of(url_mapping)->RedirectPolicy:
+    return RedirectPolicy(
+        url_mapping.redirect_status or 302,
+        url_mapping.cache_max_age,
+        bool(url_mapping.immutable)
+    )
+
+def encode_entry(long_url:str,policy:RedirectPolicy=DEFAULT_POLICY)->str:
+    """
+    The cache value for a mapping. Default-policy mappings are cached as the
+    bare long URL, so existing entries stay valid; others get a
+    "@status;max_age;immutable;" prefix, which no http(s) URL starts with.
+    """
+    if policy == DEFAULT_POLICY:
+        return long_url
+    return f"@{policy.status};{policy.max_age or ''};{int(policy.immutable)};{long_url}"
+
+def decode_entry(entry:str)->tuple[str,RedirectPolicy]:
+    if not entry.startswith("@"):
+        return entry,DEFAULT_POLICY
+    status,max_age,immutable,long_url = entry[1:].split(";",3)
+    return long_url,RedirectPolicy(int(status),int(max_age) if max_age else None,immutable == "1")
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Per-key call coalescing for coroutines.
+
+    The first caller for a key runs the loader; concurrent callers for the
+    same key await the leader's result instead of running their own. If the
+    leader is cancelled, one of the waiters takes over.
+    """
+    def __init__(self):
+        self._calls:dict[Hashable,asyncio.Future] = {}
+
+    def in_flight(self,key:Hashable)->bool:
+        return key in self._calls
+
+    async def do(self,key:Hashable,fn:Callable[[],Awaitable[T]])->T:
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # leader was cancelled - retry and possibly become the new leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # mark retrieved so an unshared failure does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
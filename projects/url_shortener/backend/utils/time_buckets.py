@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+GRANULARITIES = {
+    "minute":timedelta(minutes=1),
+    "hour":timedelta(hours=1),
+    "day":timedelta(days=1),
+}
+
+def bucket_start(ts:datetime,granularity:str)->datetime:
+    """
+    Truncates ts to the start of its minute, hour or day bucket.
+    """
+    if granularity == "minute":
+        return ts.replace(second=0,microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0,second=0,microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0,minute=0,second=0,microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+def to_naive_utc(ts:datetime)->datetime:
+    """
+    Click timestamps are naive UTC (datetime.utcnow()); aware inputs are converted.
+    """
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+def month_start(ts:datetime,offset:int=0)->datetime:
+    month = ts.year * 12 + ts.month - 1 + offset
+    return datetime(month // 12,month % 12 + 1,1)
@@ -0,0 +1,30 @@
+import functools
+from contextlib import nullcontext
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+_tracer = trace.get_tracer("url_shortener") if trace is not None else None
+
+def span(name:str,**attributes):
+    """
+    Context manager for an OpenTelemetry span, or a no-op when the
+    opentelemetry package is not installed.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name,attributes=attributes)
+
+def traced(name:str):
+    """
+    Wraps an async function in a span named name.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args,**kwargs):
+            with span(name):
+                return await fn(*args,**kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,31 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+def normalize_url(long_url:str)->str:
+    """
+    Normalize a URL for deduplication.
+
+    Scheme and host are case-insensitive, so they are lowercased; userinfo,
+    path, query and fragment are left untouched.
+
+    Args:
+        long_url (str): The URL to normalize.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(long_url.strip())
+    userinfo,sep,host = parts.netloc.rpartition("@")
+    return urlunsplit((
+        parts.scheme.lower(),
+        f"{userinfo}{sep}{host.lower()}",
+        parts.path,
+        parts.query,
+        parts.fragment
+    ))
+
+def url_digest(long_url:str)->str:
+    """
+    Fixed-width SHA-256 hex digest of the normalized URL, used as the dedup key.
+    """
+    return hashlib.sha256(normalize_url(long_url).encode()).hexdigest()